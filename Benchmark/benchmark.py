@@ -0,0 +1,634 @@
+import os
+import json
+import shutil
+import tempfile
+import subprocess
+import time
+import random
+import tracemalloc
+import argparse
+import itertools
+from datetime import datetime, timedelta
+
+import pandas as pd
+import numpy as np
+
+#---------------------------------------------------------------------------------------------
+import sys
+
+# Add the root directory of the project to the PYTHONPATH to import the modules of the pipeline
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+#---------------------------------------------------------------------------------------------
+
+from Node_classifier.node_classifier import NodeClassifier
+from Preprocessor.Preprocessor import Preprocessor
+from Light_intensity_recommender.Light_intensity_recommender import LightIntensityRecommender
+from Light_intensity_recommender.parallel_recommender import ParallelRecommender
+
+# Stages of the pipeline that can be benchmarked (in execution order):
+#   "preprocessing": Preprocessor.preprocess_data from the raw spider data, without the stage cache
+#   "preprocessing_cached": the same with the stage cache filled by a previous run
+#   "recommendation", "recommendation_batched" and "recommendation_parallel": the LightIntensityRecommender
+#   per zone, in batched mode and on a pool of processes (ParallelRecommender)
+BENCHMARK_STAGES = ["classification", "preprocessing", "preprocessing_cached", "recommendation", "recommendation_batched", "recommendation_parallel"]
+
+# Stage whose output is needed by each stage
+STAGE_REQUIREMENTS = {
+    "classification": None,
+    "preprocessing": "classification",
+    "preprocessing_cached": "classification",
+    "recommendation": "preprocessing",
+    "recommendation_batched": "preprocessing",
+    "recommendation_parallel": "preprocessing"
+}
+
+# Columns of the results file
+RESULTS_COLUMNS = ["timestamp", "version", "label", "nodes", "zones", "zone_shape", "events", "engine",
+                   "stage", "items", "seconds", "items_per_second", "peak_memory_mb"]
+
+
+class SyntheticCity():
+    """
+    Generates a synthetic municipality with the same folder structure as the project (node inventory, zones,
+    events and sky data), so every module of the pipeline can be run over it with its default relative paths.
+    """
+
+    def __init__(self, workspace_path, n_nodes=10000, n_zones=10, zone_shape="rectangle", events_per_zone=5,
+                 light_ratio=0.98, seed=0):
+        # Folder where the synthetic municipality is generated
+        self.workspace_path = workspace_path
+
+        # Size of the municipality
+        self.n_nodes = n_nodes
+        self.n_zones = n_zones
+        self.events_per_zone = events_per_zone
+        self.light_ratio = light_ratio # Fraction of the nodes that are lights (the rest are boxes)
+
+        # Shape of the zones: "rectangle" (tl, tr, ll, lr vertices) or "polygon" (GeoJSON Polygon)
+        if zone_shape not in ["rectangle", "polygon"]:
+            raise ValueError(f"Unknown zone shape '{zone_shape}'. Use 'rectangle' or 'polygon'")
+        self.zone_shape = zone_shape
+
+        self.rng = np.random.default_rng(seed)
+
+        # Area of the municipality (around Canyelles)
+        self.lat_min, self.lat_max = 41.265, 41.300
+        self.lon_min, self.lon_max = 1.700, 1.750
+
+        # Day of the data (the day used by the Preprocessor in debug mode)
+        self.date = datetime(year=2023, month=6, day=26)
+
+    def generate(self,) -> None:
+        """
+        Generates all the input data of the synthetic municipality in the workspace folder.
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        """
+
+        # Create the folders of the modules (the spider data folders are left empty)
+        for folder in [os.path.join("Node_classifier", "input_data"), os.path.join("Node_classifier", "output_data"),
+                       os.path.join("Preprocessor", "temp_data"), os.path.join("SkyInfo_Spiders", "data"),
+                       os.path.join("LightPrice_Spiders", "data"), os.path.join("RSS_Spiders", "data"),
+                       os.path.join("Event_generator", "data")]:
+            os.makedirs(os.path.join(self.workspace_path, folder), exist_ok=True)
+
+        # Zones and node inventory (input of the NodeClassifier)
+        zones_file = os.path.join(self.workspace_path, "Node_classifier", "input_data", "zone_coordinates.json")
+        with open(zones_file, "w") as f:
+            json.dump(self.generate_zones(), f, indent=4)
+
+        nodes_file = os.path.join(self.workspace_path, "Node_classifier", "input_data", "nodes.csv")
+        self.generate_nodes().to_csv(nodes_file, index=False)
+
+        # Events (as scraped by the RSS spiders)
+        events_file = os.path.join(self.workspace_path, "RSS_Spiders", "data", "google_events.csv")
+        self.generate_events().to_csv(events_file, index=False)
+
+        # Sky data (as scraped by the SkyInfo and LightPrice spiders), preprocessed by the Preprocessor as the real data
+        for file_path, df in self.generate_sky_data().items():
+            # The weather spider saves the index of the rows and the light prices are saved in latin1
+            df.to_csv(os.path.join(self.workspace_path, file_path), index=os.path.basename(file_path).startswith("weather_"),
+                      encoding="latin1" if file_path.endswith("light_prices.csv") else None)
+
+    def generate_zones(self,) -> dict:
+        """
+        Splits the area of the municipality in a grid and creates a zone in each of the first n_zones cells.
+        The rectangle zones fill their cell and the polygon zones are irregular polygons inscribed in it.
+
+        Parameters:
+            None
+
+        Returns:
+            dict: Zones in the format of zone_coordinates.json.
+        """
+
+        n_rows = int(np.ceil(np.sqrt(self.n_zones)))
+        n_cols = int(np.ceil(self.n_zones / n_rows))
+        lat_step = (self.lat_max - self.lat_min) / n_rows
+        lon_step = (self.lon_max - self.lon_min) / n_cols
+
+        zones = {}
+        for i in range(self.n_zones):
+            row, col = divmod(i, n_cols)
+            lat_min = self.lat_min + row * lat_step
+            lon_min = self.lon_min + col * lon_step
+            lat_max = lat_min + lat_step
+            lon_max = lon_min + lon_step
+
+            if self.zone_shape == "rectangle":
+                zones[f"zone_{i}"] = {
+                    "tl": {"lat": round(lat_max, 6), "lon": round(lon_min, 6)},
+                    "ll": {"lat": round(lat_min, 6), "lon": round(lon_min, 6)},
+                    "tr": {"lat": round(lat_max, 6), "lon": round(lon_max, 6)},
+                    "lr": {"lat": round(lat_min, 6), "lon": round(lon_max, 6)}
+                }
+            else:
+                # Vertices around the center of the cell at random angles and distances
+                n_vertices = int(self.rng.integers(6, 13))
+                angles = np.sort(self.rng.uniform(0, 2 * np.pi, n_vertices))
+                radius = self.rng.uniform(0.6, 1.0, n_vertices)
+                lats = (lat_min + lat_max) / 2 + radius * lat_step / 2 * np.sin(angles)
+                lons = (lon_min + lon_max) / 2 + radius * lon_step / 2 * np.cos(angles)
+
+                # GeoJSON positions are [lon, lat] and the ring is closed
+                ring = [[round(lon, 6), round(lat, 6)] for lat, lon in zip(lats, lons)]
+                zones[f"zone_{i}"] = {"type": "Polygon", "coordinates": [ring + [ring[0]]]}
+
+        return zones
+
+    def generate_nodes(self,) -> pd.DataFrame:
+        """
+        Generates the node inventory: lights and boxes uniformly distributed over the municipality.
+
+        Parameters:
+            None
+
+        Returns:
+            pd.DataFrame: Nodes with the columns of nodes.csv (id, type, ebox_id, lat, lon).
+        """
+
+        ids = [f"SN{i:010X}" for i in range(self.n_nodes)]
+        types = np.where(self.rng.random(self.n_nodes) < self.light_ratio, "light", "box")
+
+        return pd.DataFrame({
+            "id": ids,
+            "type": types,
+            "ebox_id": [f"SB{i // 50:010X}" for i in range(self.n_nodes)], # 50 nodes per box
+            "lat": np.round(self.rng.uniform(self.lat_min, self.lat_max, self.n_nodes), 6),
+            "lon": np.round(self.rng.uniform(self.lon_min, self.lon_max, self.n_nodes), 6)
+        })
+
+    def generate_events(self,) -> pd.DataFrame:
+        """
+        Generates events_per_zone events per zone (on average) at random locations of the municipality.
+
+        Parameters:
+            None
+
+        Returns:
+            pd.DataFrame: Events with the columns of google_events.csv (Title, Schedule, Location, Description, lat, lon).
+        """
+
+        n_events = self.events_per_zone * self.n_zones
+        schedules = ["18:00-20:00", "19:30-23:00", "22:30-01:15", "00:30-02:00", "20:00-04:00", "10:15-22:45"]
+
+        return pd.DataFrame({
+            "Title": [f"Open air concert number {i} of the municipal band" for i in range(n_events)],
+            "Schedule": self.rng.choice(schedules, n_events),
+            "Location": ["Main square of the town"] * n_events,
+            "Description": ["A free music concert for all the neighbours of the town with food and drinks"] * n_events,
+            "lat": self.rng.uniform(self.lat_min, self.lat_max, n_events),
+            "lon": self.rng.uniform(self.lon_min, self.lon_max, n_events)
+        })
+
+    def generate_sky_data(self,) -> dict:
+        """
+        Generates the raw sky data in the format of the spiders: the hourly weather of the day of the data and the
+        next one, the half-hourly weather of the two previous days, the light prices of each hour and the moon
+        and sun data of the days around the day of the data.
+
+        Parameters:
+            None
+
+        Returns:
+            dict: Dictionary path of the file (relative to the workspace) -> DataFrame with the columns of the spider file.
+        """
+
+        days = [self.date, self.date + timedelta(days=1)]
+        previous_days = [self.date - timedelta(days=2), self.date - timedelta(days=1)]
+        conditions = ["Fair", "Partly Cloudy", "Mostly Cloudy", "Cloudy", "Light Rain", "Rain", "Fog"]
+
+        def weather(times, conditions):
+            # Readings with units, as in wunderground.com
+            n = len(times)
+            return pd.DataFrame({
+                "Date": [t.strftime("%Y-%m-%d") for t in times],
+                "Hour": [t.strftime("%I:%M %p") for t in times],
+                "temp_farenheit": [f"{value} °F" for value in self.rng.integers(30, 90, n)],
+                "dew_point_farenheit": [f"{value} °F" for value in self.rng.integers(30, 60, n)],
+                "humidity_percent": [f"{value} %" for value in self.rng.integers(40, 100, n)],
+                "wind": self.rng.choice(["N", "NE", "E", "SE", "S", "SW", "W", "NW"], n),
+                "wind_vel": [f"{value} mph" for value in self.rng.integers(0, 20, n)],
+                "wind_gust": ["0 mph"] * n,
+                "pressure_inches": [f"{value:.2f} in" for value in self.rng.uniform(29.5, 30.5, n)],
+                "precip_inches": [f"{value:.2f} in" for value in self.rng.exponential(0.05, n)],
+                "condition": self.rng.choice(conditions, n)
+            })
+
+        # Hourly weather of the next days and half-hourly weather of the previous days (history of the weather spider)
+        hours = [day + timedelta(hours=h) for day in days for h in range(24)]
+        weather_next = weather(hours, conditions)
+        weather_previous = weather([day + timedelta(minutes=30 * m) for day in previous_days for m in range(48)], conditions + ["Light Snow"])
+
+        light_prices = pd.DataFrame({
+            "Date": [h.strftime("%Y-%m-%d") for h in hours],
+            "hour_range": [f"{h.hour:02d}:00 - {(h.hour + 1) % 24:02d}:00" for h in hours],
+            "light_price_kwh": [f"{value:.5f} EUR/kWh" for value in self.rng.uniform(0.05, 0.25, len(hours))]
+        })
+
+        # Days of the moon phases of the year
+        moon_phases = pd.DataFrame({
+            "Year": [2023] * 3,
+            "New Moon": ["19 May", "18 Jun", "17 Jul"], "First Quarter": ["27 May", "26 Jun", "25 Jul"],
+            "Full Moon": ["4 Jun", "3 Jul", "1 Aug"], "Third Quarter": ["10 Jun", "10 Jul", "8 Aug"]
+        })
+
+        # Daily moon and sun data of the week around the day of the data
+        week = [self.date + timedelta(days=k) for k in range(-6, 8)]
+        n_days = len(week)
+        ymd = {"Year": [d.year for d in week], "Month": [d.month for d in week], "Day": [d.day for d in week]}
+
+        moonrise_moonset = pd.DataFrame({
+            **ymd,
+            "Moonrise_left": ["-"] * n_days,
+            "Moonset": [f"{hour:02d}:{minute:02d}" for hour, minute in zip(self.rng.integers(0, 12, n_days), self.rng.integers(0, 60, n_days))],
+            "Moonrise_right": [f"{hour:02d}:{minute:02d}" for hour, minute in zip(self.rng.integers(12, 24, n_days), self.rng.integers(0, 60, n_days))],
+            "Time": ["12:00"] * n_days,
+            "Illumination": [f"{value:.1f}%" for value in self.rng.uniform(0, 100, n_days)],
+            "Distance (km)": [f"{value // 1000},{value % 1000:03d}" for value in self.rng.integers(356000, 406000, n_days)]
+        })
+
+        sunrise_sunset = pd.DataFrame({
+            **ymd,
+            "Sunrise": ["06:17"] * n_days, "Sunset": ["21:28"] * n_days, "Length": ["15:11:13"] * n_days, "Diff.": ["+0:05"] * n_days,
+            "Start_civil_twilight": ["05:46"] * n_days, "End_civil_twilight": ["21:59"] * n_days,
+            "Start_nautical_twilight": ["05:08"] * n_days, "End_nautical_twilight": ["22:37"] * n_days,
+            "Start_astronomical_twilight": ["04:24"] * n_days, "End_astronomical_twilight": ["23:21"] * n_days,
+            "solar_noon_Time": ["13:52"] * n_days
+        })
+
+        skyinfo_data_path = os.path.join("SkyInfo_Spiders", "data")
+        return {
+            os.path.join(skyinfo_data_path, "weather_next.csv"): weather_next,
+            os.path.join(skyinfo_data_path, "weather_previous.csv"): weather_previous,
+            os.path.join(skyinfo_data_path, "moon_phases.csv"): moon_phases,
+            os.path.join(skyinfo_data_path, "moonrise_moonset.csv"): moonrise_moonset,
+            os.path.join(skyinfo_data_path, "sunrise_sunset.csv"): sunrise_sunset,
+            os.path.join("LightPrice_Spiders", "data", "light_prices.csv"): light_prices
+        }
+
+
+class Benchmark():
+    """
+    Times the stages of the pipeline (classification, preprocessing and recommendation) over synthetic
+    municipalities and appends the throughput and peak memory of each stage to a results file.
+    """
+
+    def __init__(self, results_file=None, label="", engine="index", repeats=1, stages=None,
+                 recommender_params=None, keep_workspace=False, processes=None):
+        # CSV where the results of every run are appended
+        self.results_file = results_file if results_file else os.path.join("Benchmark", "output_data", "benchmark_results.csv")
+
+        # Label of the run and version of the code (to compare the results between versions)
+        self.label = label
+        self.version = self.get_version()
+
+        # Classification engine of the NodeClassifier (see NodeClassifier.classify_nodes)
+        self.engine = engine
+
+        # Each stage is timed repeats times (the fastest time is kept) and run once more to measure its peak memory
+        self.repeats = repeats
+
+        self.stages = stages if stages else BENCHMARK_STAGES
+        self.recommender_params = recommender_params if recommender_params else ["light price", "moon", "snow", "rain", "cloud"]
+
+        # Keep the generated municipalities (in temporary folders) after the benchmark
+        self.keep_workspace = keep_workspace
+
+        # Number of worker processes of the parallel recommendation (by default the number of CPUs)
+        self.processes = processes
+
+        # Results of the runs of this session
+        self.df_results = pd.DataFrame(columns=RESULTS_COLUMNS)
+
+    def get_version(self,) -> str:
+        """
+        Returns the version of the code: the git commit (with "-dirty" if there are uncommitted changes)
+        or "unknown" if it is not a git repository.
+
+        Parameters:
+            None
+
+        Returns:
+            str: Version of the code.
+        """
+
+        try:
+            return subprocess.check_output(["git", "describe", "--always", "--dirty"], cwd=project_root,
+                                           stderr=subprocess.DEVNULL, text=True).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return "unknown"
+
+    def measure(self, function) -> tuple:
+        """
+        Runs a stage repeats times to get its time and once more with tracemalloc to get its peak memory
+        (tracing the allocations slows down the stage, so both measures are taken in different runs).
+        Only the allocations of the current process are traced (not the ones of the workers of the parallel recommendation).
+
+        Parameters:
+            function (callable): Function that runs the stage and returns the number of processed items.
+
+        Returns:
+            tuple: Number of processed items, fastest time in seconds and peak memory in MB.
+        """
+
+        seconds = []
+        for _ in range(self.repeats):
+            start = time.perf_counter()
+            items = function()
+            seconds.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            function()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return items, min(seconds), peak / 1024**2
+
+    def run_classification(self,) -> int:
+        """
+        Classifies the nodes of the municipality of the current folder and saves them.
+
+        Parameters:
+            None
+
+        Returns:
+            int: Number of classified nodes.
+        """
+
+        node_clasif = NodeClassifier()
+        node_clasif.get_input_data()
+        n_nodes = len(node_clasif.df)
+        node_clasif.classify_nodes(self.engine)
+        node_clasif.save_output_data()
+
+        return n_nodes
+
+    def run_preprocessing(self, use_stage_cache=False) -> int:
+        """
+        Preprocesses the raw data of the municipality of the current folder (classified nodes, events and sky data)
+        with Preprocessor.preprocess_data and saves the processed data.
+
+        Parameters:
+            use_stage_cache (bool): Use the cache of the preprocessing stages.
+
+        Returns:
+            int: Number of preprocessed zone-hours.
+        """
+
+        # The events of each zone are sampled at random: the same sample in every run
+        random.seed(0)
+
+        # The events are in English, so they are not sent to the translation service
+        preprocessor = Preprocessor(mode="debug", events_source="google", translation_backend="identity", use_stage_cache=use_stage_cache)
+        preprocessor.get_input_data()
+        preprocessor.preprocess_data()
+        preprocessor.save_output_data()
+
+        return sum(len(df) for _, df in preprocessor.df_next_list)
+
+    def run_preprocessing_cached(self,) -> int:
+        """
+        Preprocesses the raw data of the municipality of the current folder with the stage cache (filled by a previous run).
+
+        Parameters:
+            None
+
+        Returns:
+            int: Number of preprocessed zone-hours.
+        """
+
+        return self.run_preprocessing(use_stage_cache=True)
+
+    def run_recommendation(self, batched=False) -> int:
+        """
+        Recommends the light intensity of every zone and hour of the municipality of the current folder.
+
+        Parameters:
+            batched (bool): Compute all the zones in one frame (batched mode of the LightIntensityRecommender).
+
+        Returns:
+            int: Number of recommended zone-hours.
+        """
+
+        light_intensity_recommender = LightIntensityRecommender(batched=batched)
+        light_intensity_recommender.get_input_data()
+        light_intensity_recommender.calculate_recommended_light_intensity(self.recommender_params)
+        light_intensity_recommender.calculate_intensity_savings()
+        light_intensity_recommender.calculate_co2_consumption()
+        light_intensity_recommender.save_output_data()
+
+        return sum(len(df) for df, _ in light_intensity_recommender.df_list)
+
+    def run_recommendation_batched(self,) -> int:
+        """
+        Recommends the light intensity of every zone and hour of the municipality of the current folder in batched mode.
+
+        Parameters:
+            None
+
+        Returns:
+            int: Number of recommended zone-hours.
+        """
+
+        return self.run_recommendation(batched=True)
+
+    def run_recommendation_parallel(self,) -> int:
+        """
+        Recommends the light intensity of every zone and hour of the municipality of the current folder
+        on a pool of processes (ParallelRecommender, shards of zones).
+
+        Parameters:
+            None
+
+        Returns:
+            int: Number of recommended zone-hours.
+        """
+
+        LightIntensityRecommender().get_input_data()
+        parallel_recommender = ParallelRecommender(self.recommender_params, processes=self.processes)
+        parallel_recommender.recommend_zones()
+
+        return sum(timing["hours"] for timing in parallel_recommender.timings.values())
+
+    def run_city(self, city: SyntheticCity) -> pd.DataFrame:
+        """
+        Generates a synthetic municipality and benchmarks the stages over it. The stages are run inside
+        the workspace folder of the municipality, as they read and write their data relative to the current folder.
+
+        Parameters:
+            city (SyntheticCity): Municipality to benchmark.
+
+        Returns:
+            pd.DataFrame: Results of the stages (one row per stage).
+        """
+
+        city.generate()
+
+        stage_functions = {
+            "classification": self.run_classification,
+            "preprocessing": self.run_preprocessing,
+            "preprocessing_cached": self.run_preprocessing_cached,
+            "recommendation": self.run_recommendation,
+            "recommendation_batched": self.run_recommendation_batched,
+            "recommendation_parallel": self.run_recommendation_parallel
+        }
+
+        # Stages to run: the benchmarked stages and the stages whose output they need
+        run_stages = set()
+        for stage in self.stages:
+            while stage is not None and stage not in run_stages:
+                run_stages.add(stage)
+                stage = STAGE_REQUIREMENTS[stage]
+
+        results = []
+        current_dir = os.getcwd()
+        os.chdir(city.workspace_path)
+        try:
+            # The stages always run in order, as they need the output of the previous ones
+            for stage in [stage for stage in BENCHMARK_STAGES if stage in run_stages]:
+                if stage not in self.stages:
+                    stage_functions[stage]()
+                    continue
+
+                # Fill the stage cache before timing the cached preprocessing
+                if stage == "preprocessing_cached":
+                    self.run_preprocessing(use_stage_cache=True)
+
+                items, seconds, peak_memory = self.measure(stage_functions[stage])
+                results.append({
+                    "timestamp": datetime.now().isoformat(timespec="seconds"),
+                    "version": self.version,
+                    "label": self.label,
+                    "nodes": city.n_nodes,
+                    "zones": city.n_zones,
+                    "zone_shape": city.zone_shape,
+                    "events": city.events_per_zone * city.n_zones,
+                    "engine": self.engine,
+                    "stage": stage,
+                    "items": items,
+                    "seconds": round(seconds, 4),
+                    "items_per_second": round(items / seconds, 1) if seconds > 0 else np.nan,
+                    "peak_memory_mb": round(peak_memory, 2)
+                })
+                print(f"  {stage}: {items} items in {round(seconds, 3)} s, peak memory {round(peak_memory, 1)} MB")
+
+        finally:
+            os.chdir(current_dir)
+
+        return pd.DataFrame(results, columns=RESULTS_COLUMNS)
+
+    def run(self, nodes_list: list, zones_list: list, zone_shape="rectangle", events_per_zone=5, seed=0) -> pd.DataFrame:
+        """
+        Benchmarks a synthetic municipality for each combination of number of nodes and number of zones
+        and appends the results to the results file.
+
+        Parameters:
+            nodes_list (list): Numbers of nodes of the municipalities.
+            zones_list (list): Numbers of zones of the municipalities.
+            zone_shape (str): Shape of the zones ("rectangle" or "polygon").
+            events_per_zone (int): Average number of events per zone.
+            seed (int): Seed of the generator of the municipalities.
+
+        Returns:
+            pd.DataFrame: Results of all the runs of this session.
+        """
+
+        for n_nodes, n_zones in itertools.product(nodes_list, zones_list):
+            print(f"Benchmarking a municipality with {n_nodes} nodes and {n_zones} {zone_shape} zones...")
+
+            workspace_path = tempfile.mkdtemp(prefix="synthetic_city_")
+            try:
+                city = SyntheticCity(workspace_path, n_nodes, n_zones, zone_shape, events_per_zone, seed=seed)
+                df_city = self.run_city(city)
+            finally:
+                if self.keep_workspace:
+                    print(f"  Municipality kept in {workspace_path}")
+                else:
+                    shutil.rmtree(workspace_path, ignore_errors=True)
+
+            self.save_results(df_city)
+            self.df_results = pd.concat([self.df_results, df_city], ignore_index=True)
+
+        return self.df_results
+
+    def save_results(self, df: pd.DataFrame) -> None:
+        """
+        Appends results to the results file (creating it with its header if it does not exist).
+
+        Parameters:
+            df (pd.DataFrame): Results to append.
+
+        Returns:
+            None
+        """
+
+        os.makedirs(os.path.dirname(self.results_file) or ".", exist_ok=True)
+        header = not os.path.isfile(self.results_file)
+        df.to_csv(self.results_file, mode="a", index=False, header=header)
+
+
+def run_benchmark():
+    """
+    Function to run the benchmark of the pipeline over synthetic municipalities.
+
+    Parameters:
+        None
+
+    Returns:
+        None
+    """
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", help="Numbers of nodes of the synthetic municipalities", nargs='+', type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--zones", help="Numbers of zones of the synthetic municipalities", nargs='+', type=int, default=[10])
+    parser.add_argument("--zone_shape", help="Shape of the zones", choices=["rectangle", "polygon"], default="rectangle")
+    parser.add_argument("--events_per_zone", help="Average number of events per zone", type=int, default=5)
+    parser.add_argument("--stages", help="Stages to benchmark", nargs='+', choices=BENCHMARK_STAGES, default=BENCHMARK_STAGES)
+    parser.add_argument("--engine", help="Classification engine of the NodeClassifier", choices=["index", "numpy", "python"], default="index")
+    parser.add_argument("--repeats", help="Number of timed runs of each stage (the fastest is kept)", type=int, default=1)
+    parser.add_argument("--processes", help="Number of worker processes of the parallel recommendation (by default the number of CPUs)", type=int, default=None)
+    parser.add_argument("--label", help="Label of the run saved with the results", type=str, default="")
+    parser.add_argument("--seed", help="Seed of the generator of the municipalities", type=int, default=0)
+    parser.add_argument("--results_file", help="CSV file where the results are appended", type=str,
+                        default=os.path.join("Benchmark", "output_data", "benchmark_results.csv"))
+    parser.add_argument("--keep_workspace", help="Keep the generated municipalities", action="store_true")
+
+    args = parser.parse_args()
+
+    benchmark = Benchmark(os.path.abspath(args.results_file), args.label, args.engine, args.repeats, args.stages,
+                          keep_workspace=args.keep_workspace, processes=args.processes)
+    df_results = benchmark.run(args.nodes, args.zones, args.zone_shape, args.events_per_zone, args.seed)
+
+    print(df_results[["nodes", "zones", "stage", "items", "seconds", "items_per_second", "peak_memory_mb"]].to_string(index=False))
+
+if __name__ == "__main__":
+    run_benchmark()
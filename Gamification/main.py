@@ -40,6 +40,7 @@ from Preprocessor.Preprocessor import Preprocessor
 
 #recommender imports
 from Light_intensity_recommender.Light_intensity_recommender import LightIntensityRecommender
+from Light_intensity_recommender.parallel_recommender import ParallelRecommender
 
 #visualizer imports
 from Visualizer.Visualizer import Visualizer
@@ -49,7 +50,8 @@ import argparse
 import multiprocessing
 
 class Gamification():
-    def __init__(self, mode, events_source, recommender_params, plots_results):
+    def __init__(self, mode, events_source, recommender_params, plots_results, incremental_classification=False, classification_chunk_size=None, save_preprocessor_temp_data=False,
+                 preprocessor_stage_cache=False, recommender_batched=False, recommender_processes=None):
         #Mode debug or prod
         self.mode = mode
 
@@ -62,6 +64,24 @@ class Gamification():
         # Display results if True
         self.plot_results = plots_results  
 
+        # Only classify the nodes added or moved since the last run if True
+        self.incremental_classification = incremental_classification
+
+        # Classify the nodes in chunks of this number of rows (streaming) if not None
+        self.classification_chunk_size = classification_chunk_size
+
+        # Save the intermediate data of the Preprocessor as CSV files in its temp_data folder if True (debug)
+        self.save_preprocessor_temp_data = save_preprocessor_temp_data
+
+        # Load the outputs of the Preprocessor stages whose inputs have not changed from its stage cache if True
+        self.preprocessor_stage_cache = preprocessor_stage_cache
+
+        # Compute the recommendations of all the zones in one frame (batched mode of the recommender) if True
+        self.recommender_batched = recommender_batched
+
+        # Compute the recommendations of the zones in shards on this number of processes (parallel mode of the recommender) if not None
+        self.recommender_processes = recommender_processes
+
 
     def run_scrapies(self,):
 
@@ -85,12 +105,12 @@ class Gamification():
             process.join()
 
     def run_node_classifier(self,):
-        node_classifier.main()
+        node_classifier.main(incremental=self.incremental_classification, chunk_size=self.classification_chunk_size)
 
 
     def run_preprocessor(self,):
         print("Preprocessing extracted data...")
-        preprocessor = Preprocessor(self.mode, self.events_source)
+        preprocessor = Preprocessor(self.mode, self.events_source, write_temp_data=self.save_preprocessor_temp_data, use_stage_cache=self.preprocessor_stage_cache)
         preprocessor.get_input_data()
         preprocessor.preprocess_data()
         preprocessor.save_output_data()
@@ -99,8 +119,16 @@ class Gamification():
 
     def run_light_intensity_recommender(self,):
         print("Running light intensity recommender...")
-        light_intensity_recommender = LightIntensityRecommender()
+        light_intensity_recommender = LightIntensityRecommender(batched=self.recommender_batched)
         light_intensity_recommender.get_input_data()
+
+        if self.recommender_processes:
+            parallel_recommender = ParallelRecommender(self.recommender_params, processes=self.recommender_processes)
+            parallel_recommender.recommend_zones()
+            print(parallel_recommender.report())
+            print("Ready-to-use light intensity recommendations.\n")
+            return
+
         light_intensity_recommender.calculate_recommended_light_intensity(self.recommender_params)
         light_intensity_recommender.calculate_intensity_savings()
         light_intensity_recommender.calculate_co2_consumption()
@@ -117,8 +145,10 @@ class Gamification():
             visualizer.save_output_data()
             print("Visualizations on the recommendations obtained.\n")
 
-def main(mode, events_source, recommender_params, plot_results):
-    gamification = Gamification(mode, events_source, recommender_params, plot_results)
+def main(mode, events_source, recommender_params, plot_results, incremental_classification=False, classification_chunk_size=None, save_preprocessor_temp_data=False,
+         preprocessor_stage_cache=False, recommender_batched=False, recommender_processes=None):
+    gamification = Gamification(mode, events_source, recommender_params, plot_results, incremental_classification, classification_chunk_size, save_preprocessor_temp_data,
+                                preprocessor_stage_cache, recommender_batched, recommender_processes)
     gamification.run_scrapies()
     gamification.run_node_classifier()
     gamification.run_preprocessor()
@@ -132,6 +162,12 @@ if __name__ == "__main__":
     parser.add_argument("--events_source", help="Indicates the way to obtain the events (google or generator)", type=str, default="google")
     parser.add_argument("--recommender_params", help="List of the features to use in recommender", nargs='+', default=["light price", "moon", "snow", "rain", "cloud"])
     parser.add_argument("--plot_results", help="A boolean parameter", action='store_true', default=True) # Plot results by default, if you don't want to plot results use --no_plot_results
+    parser.add_argument("--incremental_classification", help="Only classify the nodes added or moved since the last run", action='store_true', default=False)
+    parser.add_argument("--classification_chunk_size", help="Classify the nodes in chunks of this number of rows (streaming mode)", type=int, default=None)
+    parser.add_argument("--save_preprocessor_temp_data", help="Save the intermediate data of the Preprocessor as CSV files (debug)", action='store_true', default=False)
+    parser.add_argument("--preprocessor_stage_cache", help="Reuse the cached outputs of the Preprocessor stages whose inputs have not changed", action='store_true', default=False)
+    parser.add_argument("--recommender_batched", help="Compute the recommendations of all the zones in one frame", action='store_true', default=False)
+    parser.add_argument("--recommender_processes", help="Compute the recommendations of the zones in shards on this number of processes", type=int, default=None)
 
 
     args = parser.parse_args()
@@ -139,6 +175,13 @@ if __name__ == "__main__":
     events_source = args.events_source
     recommender_params = args.recommender_params
     plot_results = args.plot_results
+    incremental_classification = args.incremental_classification
+    classification_chunk_size = args.classification_chunk_size
+    save_preprocessor_temp_data = args.save_preprocessor_temp_data
+    preprocessor_stage_cache = args.preprocessor_stage_cache
+    recommender_batched = args.recommender_batched
+    recommender_processes = args.recommender_processes
 
     # Call to the main function
-    main(mode, events_source, recommender_params, plot_results)
+    main(mode, events_source, recommender_params, plot_results, incremental_classification, classification_chunk_size, save_preprocessor_temp_data,
+         preprocessor_stage_cache, recommender_batched, recommender_processes)
@@ -7,25 +7,54 @@ import pandas as pd
 from datetime import datetime, timedelta
 import numpy as np
 
+from Preprocessor.processed_data_store import ProcessedDataStore, read_last_run
+from Light_intensity_recommender.rule_engine import IntensityRuleEngine
+from Light_intensity_recommender.price_statistics import PriceStatistics, PRICE_NORMALIZATIONS
+
+# Columns of the previous weather data used by the recommender (for the snow score)
+PREVIOUS_COLUMNS = ["condition", "temp_celsius", "Year", "Month", "Day", "Hour"]
+
 class LightIntensityRecommender:
     """
     A class for recommending light intensity levels based on various factors and calculating energy savings.
     """
 
-    def __init__(self):
+    def __init__(self, explanations=True, price_normalization="mean_max", batched=False):
         """
         Constructor to set up input and output data paths and initialize a list to store DataFrames.
+
+        Parameters:
+            explanations (bool): Build the explanation of the recommendation of each hour ("recommended_intensity_explanation").
+            price_normalization (str): The normalization of the price score (see PRICE_NORMALIZATIONS in price_statistics.py).
+            batched (bool): Stack the hours of all the zones in one frame with the zone of each row and compute the
+                            recommendations, savings and CO2 consumption of all of them at once (split by zone when saving).
         """
         self.input_data_path = os.path.join("Light_intensity_recommender", "input_data")
         self.output_data_path = os.path.join("Light_intensity_recommender", "output_data")
 
+        # Store of processed data of the Preprocessor copied to the input_data folder (see processed_data_store.py)
+        self.processed_data_store = ProcessedDataStore(os.path.join(self.input_data_path, "processed_data"))
+
         self.df_list = []
 
+        # Build the explanations of the recommendations (only on demand, the intensities do not need them)
+        self.explanations = explanations
+
+        # Normalization of the price score and statistics of the light prices of the last run (shared by all the zones)
+        self.price_normalization = price_normalization
+        self.price_statistics = None
+
+        # Batched mode: frame with the hours of all the zones ("zone" column) and if the recommended intensity of each zone has decimals
+        self.batched = batched
+        self.df_batch = None
+        self.zone_decimals = None
+
     #GET INPUT DATA
     def get_input_data(self):
         """
         Method to get input data from the "Preprocessor/output_data" folder 
-        and copy it to the "input_data" folder.
+        and copy it to the "input_data" folder. Only the data of the last run of the Preprocessor is copied
+        (the day and the output format recorded in "last_run.json").
         
         Parameters:
             None
@@ -43,8 +72,36 @@ class LightIntensityRecommender:
         if not os.path.exists(self.input_data_path):
             os.makedirs(self.input_data_path)
 
-        # Copy all files from the "output_data" folder of Preprocessor to the "input_data" folder of Light Intensity Recommender
-        self.copy_files_to_input_data(preprocessed_data_path)
+        # Remove the processed data of previous runs (the CSV files of the zones and the store)
+        for file_name in os.listdir(self.input_data_path):
+            if file_name.startswith("processed_data_") and file_name.endswith(".csv"):
+                os.remove(os.path.join(self.input_data_path, file_name))
+        shutil.rmtree(self.processed_data_store.store_path, ignore_errors=True)
+
+        # Output format and days of the last run of the Preprocessor (None for the output folders of older versions)
+        last_run = read_last_run(preprocessed_data_path)
+        preprocessed_data_store = ProcessedDataStore(os.path.join(preprocessed_data_path, "processed_data"))
+
+        if last_run is None:
+            # Copy all files from the "output_data" folder of Preprocessor and the last day of its store (if any)
+            self.copy_files_to_input_data(preprocessed_data_path)
+            dates = preprocessed_data_store.dates()
+            if dates:
+                preprocessed_data_store.copy_date(dates[-1], self.processed_data_store.store_path)
+            return
+
+        # The recommendations are made for the last day of the run (a single day in daily mode)
+        date = last_run["dates"][-1]
+
+        if last_run["output_format"] == "parquet":
+            # Copy the day of the run from the store (a later day of an earlier run may be in the store)
+            preprocessed_data_store.copy_date(date, self.processed_data_store.store_path)
+        elif last_run["date_range"]:
+            # The CSV files of each day of a date-range run are in the folder of the day
+            self.copy_files_to_input_data(os.path.join(preprocessed_data_path, date))
+        else:
+            # The store (if any) is from an older run, so only the CSV files are copied
+            self.copy_files_to_input_data(preprocessed_data_path)
 
     # >> UTILS GIP
     def copy_files_to_input_data(self, source_dir):
@@ -66,270 +123,183 @@ class LightIntensityRecommender:
                     shutil.copy2(src_file, dst_file)
     
 
-    #CALCULATE RECOMMENDED LIGHT INTENSITY
-    def calculate_recommended_light_intensity(self, args):
+    # >> UTILS GIP
+    def read_processed_data(self, date=None, zones=None):
         """
-        Method to calculate recommended light intensity levels based on various factors.
+        Method to read the processed data of the Preprocessor: from the store of processed data if it has been
+        copied to the input_data folder (only the partitions of the day and the columns used by the recommender),
+        or else from the CSV files of each zone.
 
         Parameters:
-            args (list): A list of strings specifying the factors to consider for intensity calculation (e.g., ["moon", "rain", "cloud"]).
+            date (str, optional): The day of the store to read ("YYYY-MM-DD"). By default the last day of the store.
+            zones (list, optional): The zones to read. By default all the zones.
 
         Returns:
-            None
+            tuple: The previous weather data (DataFrame) and a list of (zone, DataFrame) with the data of each zone.
         """
 
+        store = self.processed_data_store
+        dates = store.dates()
+        if dates:
+            date = date if date else dates[-1]
+
+            # The sky data is read once for all the zones
+            df_sky = store.read_sky(date)
+            df_previous = store.read_previous(date, PREVIOUS_COLUMNS)
+
+            zones_data = []
+            for zone in store.zones(date) if zones is None else zones:
+                zones_data.append((zone, store.read_zone_data(date, zone, df_sky=df_sky)))
+
+            return df_previous, zones_data
+
         # Read the previous processed_data_previous.csv file
         csv_file = os.path.join(self.input_data_path, "processed_data_previous.csv")
         df_previous = pd.read_csv(csv_file)
 
+        zones_data = []
         for file_name in os.listdir(self.input_data_path):
-            if file_name.endswith(".csv") and not "previous" in file_name:
+            if file_name.endswith(".csv") and "_next_" in file_name:
                 # Extract the zone from the file name
                 zone = (os.path.splitext(file_name)[0]).split("_next_")[1]
+                if zones is not None and zone not in zones:
+                    continue
                 file_path = os.path.join(self.input_data_path, file_name)
-                df_next = pd.read_csv(file_path)
+                zones_data.append((zone, pd.read_csv(file_path)))
 
-                # Create lists to append recommended intensity and explanation for all hours/luminaires
-                real_intensity_list = []
-                recommended_intensity_list = []
-                recommended_intensity_explanation_list = []
-                
-                # Iterate over each row of the dataset (hour-zone)
-                for index, row in df_next.iterrows():
-                    recommended_intensity = 100 # Initiate recommended intensity
-                    real_intensity = float(100) # Real intensity its 100
-                    recommended_intensity_explanation = "" # Initiate recommended intensity explanation
-                    
-                    # Check if artificial light is needed
-                    if not row["needs_artif_light"]:
-                        real_intensity = float(0)
-                        recommended_intensity = 0
-                        recommended_intensity_explanation += f'No artificial light needed, recommended intensity: 0\n'
-
-                    else:
-                        # Check various parameters and adjust the recommended intensity accordingly                       
-                        
-                        # Check if there are events
-                        if pd.notna(row["events_titles"]):
-                            recommended_intensity += 20
-                            recommended_intensity_explanation += f'There is an event in this zone and hour, recommended intensity increases by 20%\n'
-
-
-                        # Check if light price is high and adjust the recommended intensity
-                        if row["upper_light_price_mean"]:
-                            if "light price" in args:
-                                price_score = self.calc_price_score(df_next, index, row)
-                                recommended_intensity -= 10*price_score
-                                recommended_intensity_explanation += f'The price of light is high at this hour, recommended intensity decreases by {10*price_score}%\n'
-
-
-                        # Check if it is night and adjust the recommended intensity based on moon illumination
-                        if row["is_night"]:
-                            #We can reduce intensity depending on the moon ilumination - phase
-                            if "moon" in args:
-                                moon_score = self.calc_moon_score(df_next, index, row)
-                                recommended_intensity -= 10*moon_score
-                                recommended_intensity_explanation += f'It is night and the moon is {row["moon_phase"]}, recommended intensity decreases by {10*moon_score}%\n'
-                        
-                        # Adjust intensity based on weather data (e.g., snow, rain, cloud)
-                        if "snow" in args:
-                            df1 = df_previous[["condition", "temp_celsius", "Year", "Month", "Day", "Hour"]]
-                            df2 = df_next[["condition", "temp_celsius", "Year", "Month", "Day", "Hour"]]
-                            df_condition = pd.concat([df1, df2])
-                            df_condition = df_condition.reset_index(drop=True)
-
-                            snow_score = self.calc_snow_score(df_condition, index+len(df1), row)
-                            if snow_score:
-                                recommended_intensity -= 10*snow_score
-                                recommended_intensity_explanation += f'It has snowed the last few days and it affects the lighting of the streets, recommended intensity decreases by {10*snow_score}%\n'
-
-                        if "rain" in args:
-                            rain_score = self.calc_rain_score(df_next, index, row)
-                            if rain_score:
-                                recommended_intensity += 10*rain_score
-                                recommended_intensity_explanation += f'It is raining {row["precip_mm"]} mm/h in this zone and hour, recommended intensity increases by {10*rain_score}%\n'
-
-                        if "cloud" in args:
-                            cloud_score = self.calc_cloud_score(df_next, index, row)
-                            if cloud_score:
-                                recommended_intensity += 10*cloud_score
-                                recommended_intensity_explanation += f'The sky is {row["condition"]} in this zone and hour, recommended intensity increases by {10*cloud_score}%\n'
-
-                    #Temp module ++1% 
-                    #Humidity module ++1%
-                    #Pressure module ++1%
-
-                    if recommended_intensity > 100: 
-                        recommended_intensity = 100
-
-                    recommended_intensity_list.append(recommended_intensity)
-                    real_intensity_list.append(real_intensity)
-                    recommended_intensity_explanation_list.append(recommended_intensity_explanation)
-
-                # Save intensity and dataframe
-                df_next['real_intensity'] = real_intensity_list
-                df_next['recommended_intensity'] = recommended_intensity_list
-                df_next['recommended_intensity_explanation'] = recommended_intensity_explanation_list
-                self.df_list.append((df_next, zone))
-                
-    def calc_price_score(self, df, index, row):
+        return df_previous, zones_data
+
+    # >> UTILS GIP
+    def read_processed_batch(self, date=None, zones=None):
         """
-        Method to calculate the price score for adjusting recommended intensity based on light price.
+        Method to read the processed data of all the zones in one frame, with the zone of each row in the "zone" column:
+        from the store of processed data (the sky data is read once and joined with the events of all the zones at once)
+        or else from the CSV files of each zone.
 
         Parameters:
-            df (DataFrame): DataFrame containing the data for the current zone.
-            index (int): Index of the current row in the DataFrame.
-            row (Series): The current row of the DataFrame.
+            date (str, optional): The day of the store to read ("YYYY-MM-DD"). By default the last day of the store.
+            zones (list, optional): The zones to read. By default all the zones.
 
         Returns:
-            float: The calculated price score.
+            tuple: The previous weather data (DataFrame) and the data of each hour of each zone (DataFrame).
         """
 
-        mean_light_price = df["light_price_kwh"].mean()
-        min_light_price = df["light_price_kwh"].min()
-        max_light_price = df["light_price_kwh"].max()
+        store = self.processed_data_store
+        dates = store.dates()
+        if dates:
+            date = date if date else dates[-1]
 
-        diff_max = max_light_price - mean_light_price
+            return store.read_previous(date, PREVIOUS_COLUMNS), store.read_zones_data(date, zones)
 
-        diff_act = row["light_price_kwh"] - mean_light_price
+        df_previous, zones_data = self.read_processed_data(zones=zones)
 
-        price_score = diff_act / diff_max
-        
-        if price_score < 0:
-            price_score = 0
+        if not zones_data:
+            return df_previous, pd.DataFrame(columns=["zone"])
 
-        return price_score
-    
-    def calc_moon_score(self, df, index, row):
-        """
-        Method to calculate the moon score for adjusting recommended intensity based on moon illumination.
+        # The zones are stacked column by column: all the files must have the same columns (as the ones of the Preprocessor)
+        if any(set(df_next.columns) != set(zones_data[0][1].columns) for _, df_next in zones_data):
+            raise ValueError("The processed data of the zones has different columns, it can not be batched (use batched=False)")
 
-        Parameters:
-            df (DataFrame): DataFrame containing the data for the current zone.
-            index (int): Index of the current row in the DataFrame.
-            row (Series): The current row of the DataFrame.
+        # The columns are in the order of the first zone with events (the zones without events have the events columns in another order)
+        columns = next((list(df_next.columns) for _, df_next in zones_data if df_next["events_titles"].notna().any()), list(zones_data[0][1].columns))
 
-        Returns:
-            float: The calculated moon score.
-        """
+        # The zone of the rows is the one of the name of the file
+        for zone, df_next in zones_data:
+            df_next["zone"] = zone
+        df_batch = pd.concat([df_next for _, df_next in zones_data], ignore_index=True)
+        df_batch = df_batch[columns + [column for column in df_batch.columns if column not in columns]]
 
-        return (row["moon_illumination_percent"]*0.33*row["moon_phase_mult"]) / 100
+        return df_previous, df_batch
 
-    def calc_snow_score(self, df, index, row):
+    #CALCULATE RECOMMENDED LIGHT INTENSITY
+    def calculate_recommended_light_intensity(self, args, date=None):
         """
-        Method to calculate the snow score for adjusting recommended intensity based on snow conditions.
+        Method to calculate recommended light intensity levels based on various factors. The rules are applied
+        to all the hours of each zone at once (see rule_engine.py).
 
         Parameters:
-            df (DataFrame): DataFrame containing the data for the current zone.
-            index (int): Index of the current row in the DataFrame.
-            row (Series): The current row of the DataFrame.
+            args (list): A list of strings specifying the factors to consider for intensity calculation (e.g., ["moon", "rain", "cloud"]).
+            date (str, optional): The day of the store of processed data to use ("YYYY-MM-DD"). By default the last day.
 
         Returns:
-            int: The calculated snow score (1 if snow is decisive, 0 otherwise).
+            None
         """
 
-        snow_is_decisive = False
+        if self.batched:
+            self.calculate_batch_recommended_light_intensity(args, date)
+            return
 
-        start_index = max(0, index - 72)  # Starting index of slider range
-        end_index = index - 1  # end index of slider range
-        
-        # Check if any of the rows contain the substring "snow" in the column "condition"
-        condition_contains_snow = df.loc[start_index:end_index, 'condition'].str.contains('snow').any()
+        # Read the processed data of the previous days and of each zone
+        df_previous, zones_data = self.read_processed_data(date)
 
-        if condition_contains_snow:
-            #Get index from the hour it snowed
-            first_snow_index = df.loc[start_index:end_index, 'condition'].str.contains('snow').idxmax()
+        # The zones share the tariff: the statistics of the light prices are computed once for all of them
+        self.price_statistics = PriceStatistics(zones_data[0][1]["light_price_kwh"], self.price_normalization) if zones_data else None
 
-            #Average temperatures from the time it snowed to the current time
-            mean_temp = df.loc[first_snow_index:end_index, 'temp_celsius'].mean()
+        rule_engine = IntensityRuleEngine(args, self.price_statistics)
 
-            #If mean temperature is < 10, It means that there is snow on the ground
-            if mean_temp < 10:
-                snow_is_decisive = True
+        for zone, df_next in zones_data:
+            # Compute the real and recommended intensity (and the explanation) of every hour of the zone
+            df_recommended = rule_engine.recommend(df_next, df_previous, explanations=self.explanations)
 
-        # Assign a score
-        if snow_is_decisive:
-            score = 1 ##################### ! ! ! #####################
-        
-        else:
-            score = 0 ##################### ! ! ! #####################
+            # Save intensity and dataframe
+            for column in df_recommended.columns:
+                df_next[column] = df_recommended[column]
+            self.df_list.append((df_next, zone))
 
-      
-        """
-        Tambien deberiamos mirar tema de cuantos dias a nevado.  .  .  .   .  .  .  .  .     .    .  . . . .. 
+    def calculate_batch_recommended_light_intensity(self, args, date=None):
         """
-
-        return score
-    
-
-    def calc_rain_score(self, df, index, row):
-        """
-        Method to calculate the rain score for adjusting recommended intensity based on rain conditions.
+        Method to calculate the recommended light intensity of all the zones in one pass (batched mode): the hours
+        of every zone are stacked in one frame and the rules are applied to all of them at once (see rule_engine.py).
 
         Parameters:
-            df (DataFrame): DataFrame containing the data for the current zone.
-            index (int): Index of the current row in the DataFrame.
-            row (Series): The current row of the DataFrame.
+            args (list): A list of strings specifying the factors to consider for intensity calculation (e.g., ["moon", "rain", "cloud"]).
+            date (str, optional): The day of the store of processed data to use ("YYYY-MM-DD"). By default the last day.
 
         Returns:
-            float: The calculated rain score.
+            None
         """
 
-        precip = row["precip_mm"]
+        # Read the processed data of the previous days and of all the zones
+        df_previous, df_batch = self.read_processed_batch(date)
 
-        if precip < 0.5 : # Very light rain
-            score = 0   ##################### ! ! ! #####################
-        
-        elif precip < 2.5: # Light rain
-            score = 0.2 ##################### ! ! ! #####################
-
-        elif precip < 7.6: # Moderate rain
-            score = 0.4 ##################### ! ! ! #####################
-
-        elif precip < 15: # Moderately heavy rain
-            score = 0.6 ##################### ! ! ! #####################
-
-        elif precip < 30: # Heavy rain
-            score = 0.8 ##################### ! ! ! #####################
+        self.recommend_batch(args, df_previous, df_batch)
 
-        else: #Very heavy rain
-            score = 1   ##################### ! ! ! #####################
-
-        
-        #row["precip_percent"]  <- check?
-    
+    def recommend_batch(self, args, df_previous, df_batch, price_statistics=None):
         """
-        #Lluvia muy ligera: Menos de 0.5 mm/h
-        #Lluvia ligera: 0.5 mm/h - 2.5 mm/h
-        #Lluvia moderada: 2.5 mm/h - 7.6 mm/h
-        #Lluvia moderadamente intensa: 7.6 mm/h - 15 mm/h
-        #Lluvia intensa: 15 mm/h - 30 mm/h
-        #Lluvia muy intensa: Más de 30 mm/h
-        """ 
-
-        return score
-        
-    
-    def calc_cloud_score(self, df, index, row):
-        """
-        Method to calculate the cloud score for adjusting recommended intensity based on cloud cover.
+        Method to calculate the recommended light intensity of the hours of a frame with several zones stacked
+        ("zone" column), kept in self.df_batch.
 
         Parameters:
-            df (DataFrame): DataFrame containing the data for the current zone.
-            index (int): Index of the current row in the DataFrame.
-            row (Series): The current row of the DataFrame.
+            args (list): A list of strings specifying the factors to consider for intensity calculation (e.g., ["moon", "rain", "cloud"]).
+            df_previous (pd.DataFrame): The weather data of the previous days.
+            df_batch (pd.DataFrame): The processed data of each hour of the zones.
+            price_statistics (PriceStatistics, optional): The statistics of the light prices of the run. By default they
+                                                          are computed with the prices of the first zone.
 
         Returns:
-            float: The calculated cloud score.
+            None
         """
-        try:
-            score = row["cloud_cover_percent"] * 0.01 #Calculate cloud score
-        
-        except:
-            score = 0
-            
-        return score
-    
+
+        # The zones share the tariff: the statistics of the light prices are computed with the prices of the first zone
+        if price_statistics is None and len(df_batch):
+            first_zone = df_batch["zone"].values[:1]
+            price_statistics = PriceStatistics(df_batch.loc[df_batch["zone"].isin(first_zone), "light_price_kwh"], self.price_normalization)
+        self.price_statistics = price_statistics
+
+        rule_engine = IntensityRuleEngine(args, self.price_statistics)
+
+        if len(df_batch):
+            df_recommended, self.zone_decimals = rule_engine.recommend_batch(df_batch, df_previous, explanations=self.explanations)
+            for column in df_recommended.columns:
+                df_batch[column] = df_recommended[column]
+        else:
+            # No zones: empty intensities
+            df_batch["real_intensity"] = pd.Series(dtype=float)
+            df_batch["recommended_intensity"] = pd.Series(dtype=float)
+            self.zone_decimals = pd.Series(dtype=bool)
+
+        self.df_batch = df_batch
+                
 
     #CALCULATE ENERGY SAVING
     def calculate_intensity_savings(self,):
@@ -349,6 +319,10 @@ class LightIntensityRecommender:
             None
         """
 
+        if self.batched:
+            self.calculate_batch_intensity_savings()
+            return
+
         #Temporary list to save the modified zone/iluminaire df
         df_list_temp = []
         #Temporary list to save savings summary
@@ -385,6 +359,36 @@ class LightIntensityRecommender:
 
         
 
+    def calculate_batch_intensity_savings(self,):
+        """
+        Method to calculate the energy savings of every hour of all the zones at once (batched mode), and the
+        savings of each zone and of the entire municipality.
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        """
+
+        df_batch = self.df_batch
+
+        # Savings of each hour
+        df_batch["savings"] = df_batch["real_intensity"].values - df_batch["recommended_intensity"].values.astype(float)
+
+        # Savings of each zone (added in the order of the hours, as the savings of each zone of calculate_intensity_savings)
+        zone_codes, zones = pd.factorize(df_batch["zone"], sort=False)
+        zone_rows = np.argsort(zone_codes, kind="stable")
+        savings = df_batch["savings"].values
+        zone_savings = [sum(savings[rows].tolist()) for rows in np.split(zone_rows, np.cumsum(np.bincount(zone_codes, minlength=len(zones)))[:-1])] if len(zones) else []
+
+        # Calculate savings for the entire municipality
+        savings_summary_list = list(zip(zones, zone_savings))
+        savings_summary_list.append(("total", sum(zone_savings)))
+
+        # Create df attribute class to store the df of savings per zone and municipality
+        self.df_savings_summary = pd.DataFrame(savings_summary_list, columns=["zone", "zone_savings"])
+
     # >> UTILS CIS
     def intensity_savings_formula(self, df):
         """
@@ -433,6 +437,13 @@ class LightIntensityRecommender:
         factor_emision_co2 = 0.5 #de momento
         horas = 1 #de momento
 
+        if self.batched:
+            # Calculate CO2 consumption for the real and recommended intensity of all the hours at once
+            df_batch = self.df_batch
+            df_batch['real_CO2_consumption'] = self.co2_consumption_formula(1, df_batch['real_intensity'].values, potencia_en_kw, horas, factor_emision_co2)
+            df_batch['recommended_CO2_consumption'] = self.co2_consumption_formula(1, df_batch['recommended_intensity'].values, potencia_en_kw, horas, factor_emision_co2)
+            return
+
         for i, df_zone in enumerate(self.df_list):
 
             df = df_zone[0]
@@ -501,10 +512,38 @@ class LightIntensityRecommender:
             None
         """
 
+        # Save the csv of each zone
+        self.save_zones_output_data()
+        
+        # Save saving summary by zone csv
+        file_name = f'savings_summary.csv'
+        dst_file = os.path.join(self.output_data_path, file_name)
+        self.df_savings_summary.to_csv(dst_file, index=False)
+
+
+
+
+    # >> UTILS SOD
+    def save_zones_output_data(self):
+        """
+        Method to save the DataFrame of each zone (recommended light intensity and energy savings) to a CSV file
+        in the "output_data" folder.
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        """
+
         # Check if the "output_data" folder exists, if not, create it
         if not os.path.exists(self.output_data_path):
             os.makedirs(self.output_data_path)
 
+        # Batched mode: split the frame of all the zones by zone
+        if self.batched:
+            self.df_list = self.split_batch()
+
         # Iter individual df zones list (save individual zone csv's)
         for df_zone in self.df_list:
 
@@ -514,13 +553,28 @@ class LightIntensityRecommender:
             file_name = f'recommended_light_intensity_{zone}.csv'
             dst_file = os.path.join(self.output_data_path, file_name)
             df.to_csv(dst_file, index=False)   
-        
-        # Save saving summary by zone csv
-        file_name = f'savings_summary.csv'
-        dst_file = os.path.join(self.output_data_path, file_name)
-        self.df_savings_summary.to_csv(dst_file, index=False)
 
+    # >> UTILS SOD
+    def split_batch(self,) -> list:
+        """
+        Method to split the frame of all the zones (batched mode) in the DataFrame of each zone, with the recommended
+        intensity of the zones without decimals as integers (the same DataFrames as the ones of the zones computed one by one).
+
+        Parameters:
+            None
+
+        Returns:
+            list: A list of (DataFrame, zone) with the data of each zone.
+        """
+
+        df_list = []
+        for zone, df in self.df_batch.groupby("zone", sort=False):
+            df = df.reset_index(drop=True)
+            if not self.zone_decimals[zone]:
+                df["recommended_intensity"] = df["recommended_intensity"].astype(np.int64)
+            df_list.append((df, zone))
 
+        return df_list
 
 
 #test
@@ -541,11 +595,13 @@ def run_intensity_recommender():
     
     parser = argparse.ArgumentParser()
     parser.add_argument("--params", help="List of the municipalities the user wants to preprocess", nargs='+', default=["light price", "moon", "snow", "rain", "cloud", "events"])
+    parser.add_argument("--batched", help="Compute the recommendations of all the zones in one frame", action='store_true', default=False)
+    parser.add_argument("--price_normalization", help="Normalization of the price score", choices=PRICE_NORMALIZATIONS, default="mean_max")
     
     args = parser.parse_args()
     params = args.params
 
-    light_intensity_recommender = LightIntensityRecommender()
+    light_intensity_recommender = LightIntensityRecommender(price_normalization=args.price_normalization, batched=args.batched)
     light_intensity_recommender.get_input_data()
     light_intensity_recommender.calculate_recommended_light_intensity(params)
     light_intensity_recommender.calculate_intensity_savings()
@@ -0,0 +1,375 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+
+import pandas as pd
+import pyarrow as pa
+
+from Preprocessor.processed_data_store import ProcessedDataStore
+from Light_intensity_recommender.Light_intensity_recommender import LightIntensityRecommender, PREVIOUS_COLUMNS
+from Light_intensity_recommender.price_statistics import PriceStatistics
+
+
+def write_shared_table(df, file_path):
+    """
+    Writes a DataFrame to an uncompressed Arrow IPC file, that the workers map in memory instead of receiving a copy.
+
+    Parameters:
+        df (pd.DataFrame): The data.
+        file_path (str): The path of the file.
+
+    Returns:
+        None
+    """
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(file_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+def read_shared_table(file_path) -> pd.DataFrame:
+    """
+    Maps in memory an Arrow IPC file written with write_shared_table and converts it to a DataFrame
+    (with the same values as the tables of the store of processed data).
+
+    Parameters:
+        file_path (str): The path of the file.
+
+    Returns:
+        pd.DataFrame: The data.
+    """
+
+    table = pa.ipc.open_file(pa.memory_map(file_path, "r")).read_all()
+
+    return ProcessedDataStore().table_to_pandas(table)
+
+def recommend_zone_shard(shard, working_dir, zones, params, shared_paths, date, price_statistics, explanations, price_normalization) -> dict:
+    """
+    Worker of a shard of zones of a municipality: computes the recommendations, savings and CO2 consumption of the zones
+    (batched mode of the LightIntensityRecommender) and saves the CSV file of each zone. The data shared by all the zones
+    (sky data and previous weather data) is read from the Arrow files mapped in memory.
+
+    Parameters:
+        shard (str): Name of the shard.
+        working_dir (str): The folder of the municipality (the paths of the recommender are relative to it).
+        zones (list): The zones of the shard.
+        params (list): The factors to consider for intensity calculation.
+        shared_paths (dict): Paths of the Arrow files of the shared data ("previous" and, with the store, "sky").
+        date (str): The day of the store of processed data, or None to read the CSV files of the zones.
+        price_statistics (PriceStatistics): The statistics of the light prices of the municipality.
+        explanations (bool): Build the explanation of the recommendation of each hour.
+        price_normalization (str): The normalization of the price score.
+
+    Returns:
+        dict: The shard, its status, number of zones and hours, the process, its start (epoch seconds) and duration
+              and the savings of each zone (list of (zone, savings)).
+    """
+
+    result = {"shard": shard, "status": "ok", "zones": len(zones), "hours": 0, "pid": os.getpid(), "start": time.time(), "seconds": 0.0, "savings": []}
+
+    start = time.perf_counter()
+    try:
+        os.chdir(working_dir)
+
+        recommender = LightIntensityRecommender(explanations=explanations, price_normalization=price_normalization, batched=True)
+
+        df_previous = read_shared_table(shared_paths["previous"])
+        if date is not None:
+            df_batch = recommender.processed_data_store.read_zones_data(date, zones, df_sky=read_shared_table(shared_paths["sky"]))
+        else:
+            _, df_batch = recommender.read_processed_batch(zones=zones)
+        result["hours"] = len(df_batch)
+
+        recommender.recommend_batch(params, df_previous, df_batch, price_statistics)
+        recommender.calculate_intensity_savings()
+        recommender.calculate_co2_consumption()
+        recommender.save_zones_output_data()
+
+        # Savings of each zone (without the total of the shard)
+        result["savings"] = list(recommender.df_savings_summary.itertuples(index=False, name=None))[:-1]
+
+    except Exception as e:
+        # An error in one shard does not stop the rest (its zones are left out of the savings summary)
+        result["status"] = f"error: {e}"
+
+    result["seconds"] = time.perf_counter() - start
+
+    return result
+
+def recommend_municipality(shard, municipality_path, params, explanations, price_normalization) -> dict:
+    """
+    Worker of a municipality: runs the LightIntensityRecommender (batched mode) in the folder of the municipality,
+    from the processed data of its Preprocessor to its output files.
+
+    Parameters:
+        shard (str): Name of the shard.
+        municipality_path (str): The folder of the municipality (the paths of the recommender are relative to it).
+        params (list): The factors to consider for intensity calculation.
+        explanations (bool): Build the explanation of the recommendation of each hour.
+        price_normalization (str): The normalization of the price score.
+
+    Returns:
+        dict: The shard, its status, number of zones and hours, the process, its start (epoch seconds) and duration
+              and the savings of each zone (list of (zone, savings)).
+    """
+
+    result = {"shard": shard, "status": "ok", "zones": 0, "hours": 0, "pid": os.getpid(), "start": time.time(), "seconds": 0.0, "savings": []}
+
+    start = time.perf_counter()
+    try:
+        os.chdir(municipality_path)
+
+        recommender = LightIntensityRecommender(explanations=explanations, price_normalization=price_normalization, batched=True)
+        recommender.get_input_data()
+        recommender.calculate_recommended_light_intensity(params)
+        recommender.calculate_intensity_savings()
+        recommender.calculate_co2_consumption()
+        recommender.save_output_data()
+
+        result["savings"] = list(recommender.df_savings_summary.itertuples(index=False, name=None))[:-1]
+        result["zones"] = len(result["savings"])
+        result["hours"] = len(recommender.df_batch)
+
+    except Exception as e:
+        # An error in one municipality does not stop the rest
+        result["status"] = f"error: {e}"
+
+    result["seconds"] = time.perf_counter() - start
+
+    return result
+
+
+class ParallelRecommender:
+    """
+    Runs the LightIntensityRecommender on a pool of processes, with the work split in shards: groups of zones of a
+    municipality (recommend_zones) or whole municipalities (recommend_municipalities). Each shard is computed in batched
+    mode by a worker, that saves the output files of its zones, so only the savings and the timing of each shard are sent
+    back. The data shared by the zones of a municipality (sky, weather and price data) is written once to Arrow files that
+    the workers map in memory, and the statistics of the light prices are computed once for all the shards.
+    The process, start and duration of each shard are recorded in "timings".
+    """
+
+    def __init__(self, params, processes=None, zones_per_shard=None, explanations=True, price_normalization="mean_max"):
+        """
+        Parameters:
+            params (list): The factors to consider for intensity calculation (e.g., ["moon", "rain", "cloud"]).
+            processes (int, optional): Number of worker processes. By default the number of CPUs.
+            zones_per_shard (int, optional): Number of zones of each shard of a municipality. By default the zones are
+                                             split in one shard per process.
+            explanations (bool): Build the explanation of the recommendation of each hour.
+            price_normalization (str): The normalization of the price score (see PRICE_NORMALIZATIONS in price_statistics.py).
+        """
+
+        self.params = params
+        self.processes = processes if processes else os.cpu_count()
+        self.zones_per_shard = zones_per_shard
+        self.explanations = explanations
+        self.price_normalization = price_normalization
+
+        # Status, number of zones and hours, process, start (seconds since the start of the run) and duration in seconds of each shard of the last run
+        self.timings = {}
+
+        # Duration in seconds of the last run
+        self.total_seconds = 0.0
+
+        # Savings of each zone and of the entire municipality of the last run of recommend_zones (or of each municipality of recommend_municipalities)
+        self.df_savings_summary = None
+        self.savings_summaries = {}
+
+    def recommend_zones(self, date=None) -> pd.DataFrame:
+        """
+        Computes the recommendations of the zones of the municipality of the current folder (from the processed data
+        in the input_data folder of the recommender) in shards of zones, and saves the output files. An error in one
+        shard does not stop the rest: the zones of the failed shards are left out of the savings summary and their
+        output files are removed (see the status of the shards in "timings").
+
+        Parameters:
+            date (str, optional): The day of the store of processed data to use ("YYYY-MM-DD"). By default the last day.
+
+        Returns:
+            pd.DataFrame: The savings of each zone and of the entire municipality.
+        """
+
+        recommender = LightIntensityRecommender(explanations=self.explanations, price_normalization=self.price_normalization, batched=True)
+        store = recommender.processed_data_store
+
+        shared_dir = tempfile.mkdtemp(prefix="recommender_shared_")
+        try:
+            shared_paths = {"previous": os.path.join(shared_dir, "previous.arrow")}
+
+            dates = store.dates()
+            if dates:
+                # Store of processed data: the sky data of the day is shared by all the zones
+                date = date if date else dates[-1]
+                zones = store.zones(date)
+                df_sky = store.read_sky(date)
+                df_previous = store.read_previous(date, PREVIOUS_COLUMNS)
+
+                shared_paths["sky"] = os.path.join(shared_dir, "sky.arrow")
+                write_shared_table(df_sky, shared_paths["sky"])
+                prices = df_sky["light_price_kwh"]
+            else:
+                # CSV files of each zone (in the order of the folder, as the LightIntensityRecommender)
+                date = None
+                zones = [(os.path.splitext(file_name)[0]).split("_next_")[1] for file_name in os.listdir(recommender.input_data_path)
+                         if file_name.endswith(".csv") and "_next_" in file_name]
+                df_previous = pd.read_csv(os.path.join(recommender.input_data_path, "processed_data_previous.csv"))
+
+                prices = pd.read_csv(os.path.join(recommender.input_data_path, f"processed_data_next_{zones[0]}.csv"),
+                                     usecols=["light_price_kwh"])["light_price_kwh"] if zones else None
+
+            write_shared_table(df_previous, shared_paths["previous"])
+
+            # The zones share the tariff: the statistics of the light prices are computed once for all the shards
+            price_statistics = PriceStatistics(prices, self.price_normalization) if zones else None
+
+            # Consecutive groups of zones
+            zones_per_shard = self.zones_per_shard if self.zones_per_shard else max(1, -(-len(zones) // self.processes))
+            shards = {f"zones_{i + 1}-{min(i + zones_per_shard, len(zones))}": zones[i:i + zones_per_shard] for i in range(0, len(zones), zones_per_shard)}
+
+            os.makedirs(recommender.output_data_path, exist_ok=True)
+            working_dir = os.getcwd()
+
+            results = self.run_shards(recommend_zone_shard, [(shard, working_dir, shard_zones, self.params, shared_paths, date, price_statistics,
+                                                              self.explanations, self.price_normalization) for shard, shard_zones in shards.items()])
+        finally:
+            shutil.rmtree(shared_dir, ignore_errors=True)
+
+        # The output files of the zones of the failed shards may be incomplete
+        for result in results:
+            if result["status"] != "ok":
+                for zone in shards[result["shard"]]:
+                    file_path = os.path.join(recommender.output_data_path, f"recommended_light_intensity_{zone}.csv")
+                    if os.path.isfile(file_path):
+                        os.remove(file_path)
+
+        # Savings of each zone of the successful shards (in the order of the zones) and of the entire municipality
+        savings_summary_list = [zone_savings for result in results if result["status"] == "ok" for zone_savings in result["savings"]]
+        savings_summary_list.append(("total", sum(zone_savings for _, zone_savings in savings_summary_list)))
+        self.df_savings_summary = pd.DataFrame(savings_summary_list, columns=["zone", "zone_savings"])
+        self.df_savings_summary.to_csv(os.path.join(recommender.output_data_path, "savings_summary.csv"), index=False)
+
+        return self.df_savings_summary
+
+    def recommend_municipalities(self, municipality_paths) -> dict:
+        """
+        Computes the recommendations of several municipalities, one shard per municipality. Each municipality is a
+        folder with the structure of the project (the processed data of its Preprocessor in "Preprocessor/output_data"),
+        where the output files of its recommendations are saved. An error in one municipality does not stop the rest
+        (see the status of the shards in "timings").
+
+        Parameters:
+            municipality_paths (list): The folders of the municipalities.
+
+        Returns:
+            dict: Dictionary municipality (name of the folder) -> DataFrame with the savings of each zone and of the entire municipality.
+        """
+
+        municipality_paths = [os.path.abspath(municipality_path) for municipality_path in municipality_paths]
+        shards = {os.path.basename(municipality_path.rstrip(os.sep)): municipality_path for municipality_path in municipality_paths}
+        if len(shards) < len(municipality_paths):
+            raise ValueError("The folders of the municipalities must have different names")
+
+        results = self.run_shards(recommend_municipality, [(shard, municipality_path, self.params, self.explanations, self.price_normalization)
+                                                           for shard, municipality_path in shards.items()])
+
+        self.savings_summaries = {}
+        for result in results:
+            if result["status"] != "ok":
+                continue
+            savings_summary_list = result["savings"] + [("total", sum(zone_savings for _, zone_savings in result["savings"]))]
+            self.savings_summaries[result["shard"]] = pd.DataFrame(savings_summary_list, columns=["zone", "zone_savings"])
+
+        return self.savings_summaries
+
+    def run_shards(self, worker, shards_args) -> list:
+        """
+        Runs the shards on the pool of processes and records their timings.
+
+        Parameters:
+            worker (callable): The function of the workers (recommend_zone_shard or recommend_municipality).
+            shards_args (list): The arguments of the worker for each shard (the first one is the name of the shard).
+
+        Returns:
+            list: The results of the shards, in the order of shards_args.
+        """
+
+        self.timings = {}
+        start = time.time()
+        start_counter = time.perf_counter()
+
+        results = []
+        if shards_args:
+            with multiprocessing.Pool(min(self.processes, len(shards_args))) as pool:
+                results = pool.starmap(worker, shards_args, chunksize=1)
+
+        self.total_seconds = time.perf_counter() - start_counter
+
+        for result in results:
+            self.timings[result["shard"]] = {"status": result["status"], "zones": result["zones"], "hours": result["hours"], "pid": result["pid"],
+                                             "start": result["start"] - start, "seconds": result["seconds"]}
+
+        return results
+
+    def report(self,) -> str:
+        """
+        Returns a table with the zones, hours, process, start, duration and status of each shard of the last run.
+
+        Parameters:
+            None
+
+        Returns:
+            str: The report of the timings of the shards.
+        """
+
+        width = max([len("Shard")] + [len(shard) for shard in self.timings])
+
+        lines = [f"{'Shard':<{width}}  {'Zones':>5}  {'Hours':>7}  {'PID':>7}  {'Start (s)':>9}  {'Time (s)':>8}  Status"]
+        for shard, timing in self.timings.items():
+            lines.append(f"{shard:<{width}}  {timing['zones']:>5}  {timing['hours']:>7}  {timing['pid']:>7}  {timing['start']:>9.3f}  {timing['seconds']:>8.3f}  {timing['status']}")
+
+        failed_shards = [shard for shard, timing in self.timings.items() if timing["status"] != "ok"]
+        if failed_shards:
+            lines.append(f"Failed shards (left out of the savings summary): {', '.join(failed_shards)}")
+
+        shards_seconds = sum(timing["seconds"] for timing in self.timings.values())
+        lines.append(f"Total: {self.total_seconds:.3f} s ({shards_seconds:.3f} s of shards, {self.processes} processes)")
+
+        return "\n".join(lines)
+
+
+def run_parallel_recommender():
+    """
+    Function to run the light intensity recommender on a pool of processes: sharding the zones of the municipality
+    of the current folder or, if they are indicated, sharding several municipalities.
+
+    Parameters:
+        None
+
+    Returns:
+        None
+    """
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--params", help="List of the features to use in recommender", nargs='+', default=["light price", "moon", "snow", "rain", "cloud", "events"])
+    parser.add_argument("--processes", help="Number of worker processes (by default the number of CPUs)", type=int, default=None)
+    parser.add_argument("--zones_per_shard", help="Number of zones of each shard (by default one shard per process)", type=int, default=None)
+    parser.add_argument("--municipalities", help="Folders of the municipalities to recommend (one shard per municipality)", nargs='+', default=None)
+
+    args = parser.parse_args()
+
+    parallel_recommender = ParallelRecommender(args.params, processes=args.processes, zones_per_shard=args.zones_per_shard)
+
+    if args.municipalities:
+        parallel_recommender.recommend_municipalities(args.municipalities)
+    else:
+        LightIntensityRecommender().get_input_data()
+        parallel_recommender.recommend_zones()
+
+    print(parallel_recommender.report())
+
+if __name__ == "__main__":
+    run_parallel_recommender()
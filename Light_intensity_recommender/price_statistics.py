@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+
+# Normalizations of the price score:
+#   "mean_max": how much higher the price is than the mean, relative to the difference between the maximum and the mean
+#   "min_max": position of the price between the minimum and the maximum
+#   "percentile": how much higher the price is than the median, relative to the difference between the 95th percentile
+#                 and the median (limited to 1, so the outliers do not stretch the scale)
+PRICE_NORMALIZATIONS = ["mean_max", "min_max", "percentile"]
+
+
+class PriceStatistics:
+    """
+    Statistics of the light prices of a run (mean, minimum, maximum and percentiles), computed once and shared
+    by all the zones (the zones have the same tariff), and the price score of each hour computed from them.
+    """
+
+    def __init__(self, prices, normalization="mean_max", percentiles=(5, 25, 50, 75, 95)):
+        """
+        Parameters:
+            prices (pd.Series): The light price of each hour ("light_price_kwh").
+            normalization (str): The normalization of the price score (see PRICE_NORMALIZATIONS).
+            percentiles (tuple): The percentiles of the prices to compute.
+        """
+
+        if normalization not in PRICE_NORMALIZATIONS:
+            raise ValueError(f"Unknown price normalization '{normalization}'. Use one of {PRICE_NORMALIZATIONS}")
+        self.normalization = normalization
+
+        prices = pd.Series(prices)
+        self.mean = prices.mean()
+        self.min = prices.min()
+        self.max = prices.max()
+
+        # Percentile -> price (the median and the 95th percentile are always computed for the "percentile" normalization)
+        quantiles = sorted(set(percentiles) | {50, 95})
+        self.percentiles = dict(zip(quantiles, prices.quantile([quantile / 100 for quantile in quantiles]).values))
+
+    def price_score(self, prices) -> np.ndarray:
+        """
+        Computes the price score of each hour with the normalization of the statistics. With the "mean_max"
+        normalization the prices lower than the mean get negative scores (the recommender does not apply them).
+
+        Parameters:
+            prices (pd.Series or np.ndarray): The light price of each hour.
+
+        Returns:
+            np.ndarray: The price score of each hour.
+        """
+
+        prices = np.asarray(prices, dtype=float)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if self.normalization == "mean_max":
+                return (prices - self.mean) / (self.max - self.mean)
+
+            if self.normalization == "min_max":
+                return (prices - self.min) / (self.max - self.min)
+
+            median = self.percentiles[50]
+            return np.minimum((prices - median) / (self.percentiles[95] - median), 1)
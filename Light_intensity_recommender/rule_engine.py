@@ -0,0 +1,374 @@
+import numpy as np
+import pandas as pd
+
+from Light_intensity_recommender.price_statistics import PriceStatistics
+
+
+class IntensityRuleEngine:
+    """
+    Vectorized engine of the rules of the LightIntensityRecommender. Each adjustment of the recommended intensity
+    (events, light price, moon, snow, rain and cloud) is computed for all the hours of a zone at once as a column,
+    the adjustments are combined in the order of the rules and the result is clipped to 100. The explanations of
+    the recommendations are only built if they are requested.
+
+    The values are the same as the ones of the rules applied hour by hour: the recommended intensity is an integer
+    column unless an adjustment with decimals is applied (and not clipped) in some hour.
+    """
+
+    def __init__(self, params, price_statistics=None):
+        # Factors to consider (e.g. ["light price", "moon", "snow", "rain", "cloud"]). The events are always considered
+        self.params = params
+
+        # Statistics of the light prices of the run, shared by all the zones (see price_statistics.py).
+        # If they are not given, they are computed from the prices of each zone
+        self.price_statistics = price_statistics
+
+        # Weather (conditions, temperatures and number of previous hours) of the last snow scores computed and the scores
+        self.snow_weather = None
+        self.snow_scores = None
+
+    def recommend(self, df_next, df_previous, explanations=True) -> pd.DataFrame:
+        """
+        Computes the real and recommended intensity of each hour of a zone.
+
+        Parameters:
+            df_next (pd.DataFrame): The processed data of each hour of the zone.
+            df_previous (pd.DataFrame): The weather data of the previous days (for the snow score).
+            explanations (bool): Build the explanation of the recommendation of each hour.
+
+        Returns:
+            pd.DataFrame: The "real_intensity", "recommended_intensity" and (if requested) "recommended_intensity_explanation"
+                          of each hour, with the index of df_next.
+        """
+
+        real_intensity, recommended_intensity, has_decimals, explanation = self.intensities(df_next, df_previous, explanations)
+
+        df_recommended = pd.DataFrame({"real_intensity": real_intensity}, index=df_next.index)
+        if has_decimals.any():
+            df_recommended["recommended_intensity"] = recommended_intensity
+        else:
+            df_recommended["recommended_intensity"] = recommended_intensity.astype(np.int64)
+
+        if explanations:
+            df_recommended["recommended_intensity_explanation"] = explanation
+
+        return df_recommended
+
+    def recommend_batch(self, df_batch, df_previous, explanations=True, zone_column="zone"):
+        """
+        Computes the real and recommended intensity of each hour of all the zones at once, from a frame with the hours
+        of every zone stacked and the zone of each row in zone_column. The results are the same as the ones of recommend
+        for each zone: the snow score is computed over the weather of each zone and the type of the recommended intensity
+        of each zone (integer or with decimals) is returned apart, as the batch column has decimals if any zone has them.
+
+        Parameters:
+            df_batch (pd.DataFrame): The processed data of each hour of all the zones.
+            df_previous (pd.DataFrame): The weather data of the previous days (for the snow score).
+            explanations (bool): Build the explanation of the recommendation of each hour.
+            zone_column (str): The column with the zone of each row.
+
+        Returns:
+            tuple: A DataFrame with the "real_intensity", "recommended_intensity" and (if requested) "recommended_intensity_explanation"
+                   of each hour, with the index of df_batch, and a Series zone -> True if the recommended intensity of the zone has decimals.
+        """
+
+        zone_codes, zones = pd.factorize(df_batch[zone_column], sort=False)
+
+        real_intensity, recommended_intensity, has_decimals, explanation = self.intensities(df_batch, df_previous, explanations, zone_codes)
+
+        df_recommended = pd.DataFrame({"real_intensity": real_intensity, "recommended_intensity": recommended_intensity}, index=df_batch.index)
+
+        if explanations:
+            df_recommended["recommended_intensity_explanation"] = explanation
+
+        zone_decimals = pd.Series(np.bincount(zone_codes, weights=has_decimals, minlength=len(zones)) > 0, index=zones)
+
+        return df_recommended, zone_decimals
+
+    def intensities(self, df_next, df_previous, explanations=True, zone_codes=None):
+        """
+        Applies the adjustments of the rules to all the hours.
+
+        Parameters:
+            df_next (pd.DataFrame): The processed data of each hour of the zone (or of all the zones).
+            df_previous (pd.DataFrame): The weather data of the previous days (for the snow score).
+            explanations (bool): Build the explanation of the recommendation of each hour.
+            zone_codes (np.ndarray, optional): The zone of each hour (codes), if the hours of several zones are stacked.
+
+        Returns:
+            tuple: The real intensity, the recommended intensity, the hours whose recommended intensity has decimals
+                   and the explanation (or None) of each hour (arrays).
+        """
+
+        # Hours that need artificial light (the other hours are off: real and recommended intensity 0)
+        needs_light = df_next["needs_artif_light"].astype(bool).values
+        real_intensity = np.where(needs_light, 100.0, 0.0)
+        recommended_intensity = np.where(needs_light, 100.0, 0.0)
+
+        # Hours whose recommended intensity has decimals (an adjustment with decimals has been applied)
+        has_decimals = np.zeros(len(df_next), dtype=bool)
+
+        explanation = np.where(needs_light, "", "No artificial light needed, recommended intensity: 0\n").astype(object)
+
+        # Apply the adjustments of the rules in order: (hours, change of the intensity, decimals, explanation)
+        for applied, change, change_decimals, explain in self.adjustments(df_next, df_previous, zone_codes):
+            applied = applied & needs_light
+            recommended_intensity = np.where(applied, recommended_intensity + change, recommended_intensity)
+            has_decimals |= applied & change_decimals
+
+            if explanations and applied.any():
+                explanation[applied] = explanation[applied] + explain(applied)
+
+        # The recommended intensity can not be higher than 100
+        clipped = recommended_intensity > 100
+        recommended_intensity[clipped] = 100
+        has_decimals &= ~clipped
+
+        return real_intensity, recommended_intensity, has_decimals, explanation if explanations else None
+
+    def adjustments(self, df_next, df_previous, zone_codes=None):
+        """
+        Computes the adjustments of the recommended intensity of the rules of the params, in the order they are applied.
+
+        Parameters:
+            df_next (pd.DataFrame): The processed data of each hour of the zone (or of all the zones).
+            df_previous (pd.DataFrame): The weather data of the previous days (for the snow score).
+            zone_codes (np.ndarray, optional): The zone of each hour (codes), if the hours of several zones are stacked.
+
+        Returns:
+            list: For each adjustment, a tuple with the hours where it is applied (array of bools), the change of the
+                  intensity of each hour (array), the hours where the change has decimals (array of bools) and a function
+                  that returns the explanations of the hours where it is applied.
+        """
+
+        n_hours = len(df_next)
+        adjustments = []
+
+        # Check if there are events (+20%)
+        has_events = df_next["events_titles"].notna().values
+        adjustments.append((has_events, np.full(n_hours, 20.0), np.zeros(n_hours, dtype=bool),
+                            lambda applied: 'There is an event in this zone and hour, recommended intensity increases by 20%\n'))
+
+        # Check if light price is high and adjust the recommended intensity
+        if "light price" in self.params:
+            price_score, price_decimals = self.calc_price_score(df_next)
+            price_change = 10*price_score
+            adjustments.append((df_next["upper_light_price_mean"].astype(bool).values, -price_change, price_decimals,
+                                lambda applied: 'The price of light is high at this hour, recommended intensity decreases by ' +
+                                                number_strings(price_change[applied], price_decimals[applied]) + '%\n'))
+
+        # Check if it is night and adjust the recommended intensity based on moon illumination
+        if "moon" in self.params:
+            moon_change = 10*self.calc_moon_score(df_next)
+            adjustments.append((df_next["is_night"].astype(bool).values, -moon_change, np.ones(n_hours, dtype=bool),
+                                lambda applied: 'It is night and the moon is ' + df_next["moon_phase"].astype(str).values[applied] +
+                                                ', recommended intensity decreases by ' + number_strings(moon_change[applied], True) + '%\n'))
+
+        # Adjust intensity based on weather data (e.g., snow, rain, cloud)
+        if "snow" in self.params:
+            if zone_codes is None:
+                snow_change = 10*self.calc_snow_score(df_next, df_previous)
+            else:
+                snow_change = 10*self.calc_batch_snow_score(df_next, df_previous, zone_codes)
+            adjustments.append((snow_change != 0, -snow_change, np.zeros(n_hours, dtype=bool),
+                                lambda applied: 'It has snowed the last few days and it affects the lighting of the streets, recommended intensity decreases by ' +
+                                                number_strings(snow_change[applied], False) + '%\n'))
+
+        if "rain" in self.params:
+            rain_score = self.calc_rain_score(df_next)
+            rain_change = 10*rain_score
+            rain_decimals = rain_score != 1
+            adjustments.append((rain_score != 0, rain_change, rain_decimals,
+                                lambda applied: 'It is raining ' + number_strings(df_next["precip_mm"].values[applied], True) +
+                                                ' mm/h in this zone and hour, recommended intensity increases by ' +
+                                                number_strings(rain_change[applied], rain_decimals[applied]) + '%\n'))
+
+        if "cloud" in self.params and "cloud_cover_percent" in df_next.columns:
+            cloud_change = 10*self.calc_cloud_score(df_next)
+            adjustments.append((cloud_change != 0, cloud_change, np.ones(n_hours, dtype=bool),
+                                lambda applied: 'The sky is ' + df_next["condition"].astype(str).values[applied] +
+                                                ' in this zone and hour, recommended intensity increases by ' +
+                                                number_strings(cloud_change[applied], True) + '%\n'))
+
+        return adjustments
+
+    def calc_price_score(self, df):
+        """
+        Calculates the price score of each hour with the statistics of the light prices of the run (by default,
+        how much higher the light price is than the mean price, relative to the difference between the maximum
+        and the mean price). The hours with a negative score (prices lower than the mean) get a score of 0.
+
+        Parameters:
+            df (pd.DataFrame): The data of each hour of the zone.
+
+        Returns:
+            tuple: The price score of each hour (array) and the hours where it has decimals (array of bools).
+        """
+
+        # Without the statistics of the run they are computed from the prices of the hours given
+        price_statistics = self.price_statistics
+        if price_statistics is None:
+            price_statistics = PriceStatistics(df["light_price_kwh"])
+
+        price_score = price_statistics.price_score(df["light_price_kwh"].values)
+
+        # The prices lower than the mean get a score of 0
+        lower = price_score < 0
+        price_score[lower] = 0
+
+        return price_score, ~lower
+
+    def calc_moon_score(self, df):
+        """
+        Calculates the moon score of each hour, based on the moon illumination and phase.
+
+        Parameters:
+            df (pd.DataFrame): The data of each hour of the zone.
+
+        Returns:
+            np.ndarray: The moon score of each hour.
+        """
+
+        return (df["moon_illumination_percent"].values*0.33*df["moon_phase_mult"].values) / 100
+
+    def calc_snow_score(self, df_next, df_previous):
+        """
+        Calculates the snow score of each hour: 1 if it has snowed in the previous 72 hours (of the previous
+        and next weather data) and the mean temperature since the first snow of those hours is lower than 10
+        degrees (there is snow on the ground), 0 otherwise.
+
+        The hours with snow and the temperatures are accumulated once (cumulative sums), so the score of every
+        hour is looked up in constant time and the cost is linear in the length of the weather series. The zones
+        share the weather, so the scores are computed once and reused while the weather does not change.
+
+        Parameters:
+            df_next (pd.DataFrame): The data of each hour of the zone.
+            df_previous (pd.DataFrame): The weather data of the previous days.
+
+        Returns:
+            np.ndarray: The snow score of each hour.
+        """
+
+        # Weather of the previous days followed by the weather of the hours of the zone
+        condition = np.concatenate([df_previous["condition"].values, df_next["condition"].values]).astype(object)
+        temp_celsius = np.concatenate([df_previous["temp_celsius"].values, df_next["temp_celsius"].values]).astype(float)
+
+        # Reuse the scores of the last zone if the weather is the same
+        if self.snow_weather is not None and np.array_equal(self.snow_weather[0], condition) and \
+                np.array_equal(self.snow_weather[1], temp_celsius, equal_nan=True) and self.snow_weather[2] == len(df_previous):
+            return self.snow_scores
+
+        n_hours = len(condition)
+        is_snow = pd.Series(condition).str.contains('snow').fillna(False).values.astype(bool)
+
+        # Hours of the slider range of each hour of the zone (the 72 previous hours): [start_index, index)
+        index = np.arange(len(df_previous), n_hours)
+        start_index = np.maximum(0, index - 72)
+
+        # First hour with snow from each hour on (n_hours if it does not snow again)
+        next_snow = np.minimum.accumulate(np.where(is_snow, np.arange(n_hours), n_hours)[::-1])[::-1]
+        first_snow_index = next_snow[start_index]
+        has_snowed = first_snow_index < index
+
+        # Average temperatures from the time it snowed to the current time (the missing temperatures are skipped)
+        is_temp = ~np.isnan(temp_celsius)
+        temp_sum = np.concatenate([[0.0], np.cumsum(np.where(is_temp, temp_celsius, 0.0))])
+        temp_count = np.concatenate([[0], np.cumsum(is_temp)])
+
+        first_snow_index = np.minimum(first_snow_index, index)
+        n_temps = temp_count[index] - temp_count[first_snow_index]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean_temp = (temp_sum[index] - temp_sum[first_snow_index]) / n_temps
+
+        # The cumulative sums can round the last decimals: the means next to the limit are computed directly
+        for i in np.flatnonzero(has_snowed & (n_temps > 0) & (np.abs(mean_temp - 10) < 1e-6)):
+            temps = temp_celsius[first_snow_index[i]:index[i]]
+            mean_temp[i] = temps[~np.isnan(temps)].mean()
+
+        #If mean temperature is < 10, It means that there is snow on the ground
+        snow_score = (has_snowed & (n_temps > 0) & (mean_temp < 10)).astype(float)
+
+        self.snow_weather = (condition, temp_celsius, len(df_previous))
+        self.snow_scores = snow_score
+
+        return snow_score
+
+    def calc_batch_snow_score(self, df_batch, df_previous, zone_codes):
+        """
+        Calculates the snow score of each hour of several zones stacked: the score of the hours of each zone
+        is computed over the weather of the zone (see calc_snow_score), reusing the scores of the zones with the same weather.
+
+        Parameters:
+            df_batch (pd.DataFrame): The data of each hour of all the zones.
+            df_previous (pd.DataFrame): The weather data of the previous days.
+            zone_codes (np.ndarray): The zone of each hour (codes from 0).
+
+        Returns:
+            np.ndarray: The snow score of each hour.
+        """
+
+        snow_score = np.zeros(len(df_batch))
+        df_weather = df_batch[["condition", "temp_celsius"]]
+
+        # Rows of each zone, in the order of the batch
+        zone_rows = np.argsort(zone_codes, kind="stable")
+        for rows in np.split(zone_rows, np.cumsum(np.bincount(zone_codes))[:-1]):
+            snow_score[rows] = self.calc_snow_score(df_weather.iloc[rows], df_previous)
+
+        return snow_score
+
+    def calc_rain_score(self, df):
+        """
+        Calculates the rain score of each hour, based on the precipitation:
+
+        #Lluvia muy ligera: Menos de 0.5 mm/h
+        #Lluvia ligera: 0.5 mm/h - 2.5 mm/h
+        #Lluvia moderada: 2.5 mm/h - 7.6 mm/h
+        #Lluvia moderadamente intensa: 7.6 mm/h - 15 mm/h
+        #Lluvia intensa: 15 mm/h - 30 mm/h
+        #Lluvia muy intensa: Más de 30 mm/h
+
+        Parameters:
+            df (pd.DataFrame): The data of each hour of the zone.
+
+        Returns:
+            np.ndarray: The rain score of each hour (the hours without precipitation data get the score of very heavy rain).
+        """
+
+        precip = df["precip_mm"].values.astype(float)
+
+        return np.select(
+            [precip < 0.5, precip < 2.5, precip < 7.6, precip < 15, precip < 30],
+            [0, 0.2, 0.4, 0.6, 0.8],
+            default=1
+        )
+
+    def calc_cloud_score(self, df):
+        """
+        Calculates the cloud score of each hour, based on the cloud cover.
+
+        Parameters:
+            df (pd.DataFrame): The data of each hour of the zone.
+
+        Returns:
+            np.ndarray: The cloud score of each hour.
+        """
+
+        return df["cloud_cover_percent"].values.astype(float) * 0.01
+
+
+def number_strings(values, decimals) -> np.ndarray:
+    """
+    Formats numbers as in the explanations: with decimals (e.g. "2.0") or as integers (e.g. "10").
+
+    Parameters:
+        values (np.ndarray): The numbers.
+        decimals (bool or np.ndarray): If each number is formatted with decimals.
+
+    Returns:
+        np.ndarray: The formatted numbers (object array of strings).
+    """
+
+    decimals = np.broadcast_to(decimals, np.shape(values))
+
+    return np.array([str(value) if with_decimals else str(int(value)) for value, with_decimals in zip(values.tolist(), decimals)], dtype=object)
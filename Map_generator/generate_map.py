@@ -6,15 +6,24 @@ import pandas as pd
 import shutil
 from typing import List
 
+#---------------------------------------------------------------------------------------------
+import sys
+
+# Add the root directory of the project to the PYTHONPATH to import the shared ZoneIndex
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+#---------------------------------------------------------------------------------------------
+
+from Node_classifier.zone_index import ZoneIndex
+from Node_classifier.node_classifier import read_classified_nodes
+
 class MapGenerator():
 
     def __init__(self,):
         # Path to the input data folder
         self.input_data_path = os.path.join("Map_generator", "input_data")
 
-        # File name for the classified nodes CSV file
-        self.nodes_file_name = "classified_nodes.csv"
-
         # File name for the zone coordinates JSON file
         self.zone_coordinates_file_name = 'zone_coordinates.json'
 
@@ -27,6 +36,9 @@ class MapGenerator():
         # A dictionary to store zone coordinates (to be read from the JSON file)
         self.zone_coordinates_dict = {}
 
+        # Spatial index over the zones (shared with the NodeClassifier and the Preprocessor)
+        self.zone_index = None
+
         # A pandas DataFrame to store node zones information
         self.nodes_zones = pd.DataFrame() # < - id    type    ebox_id     lat     lon   zone
 
@@ -34,9 +46,9 @@ class MapGenerator():
     #GET INPUT DATA
     def get_input_data(self):
         """
-        Copy NodeClassifier csv output data to MapGenerator input data.
+        Copy NodeClassifier output data to MapGenerator input data.
 
-        Read the csv with the list of the nodes and their respective coordinates and
+        Read the classified nodes (parquet or csv) with their respective coordinates and
         the json containing the coordinates vertices of the zones of the municipality   
 
         Parameters:
@@ -58,15 +70,17 @@ class MapGenerator():
         # Copy all the files from the "output_data" folders of the NodeClassifier to the "input_data" folder of the MapGenerator
         self.copy_files_to_input_data(node_classifier_data_path)
 
-        #Get csv of Nodes info
-        csv_file = os.path.join(self.input_data_path, self.nodes_file_name)
-        self.nodes_zones = pd.read_csv(csv_file) 
+        #Get the classified nodes info
+        self.nodes_zones = read_classified_nodes(self.input_data_path, columns=["id", "type", "ebox_id", "lat", "lon", "zone"])
 
         # Get json of Zone clasifications for Canyelles
         json_file = os.path.join(self.input_data_path, self.zone_coordinates_file_name)
         with open(json_file) as f:
             self.zone_coordinates_dict = json.load(f)
 
+        # Build the spatial index over the zones
+        self.zone_index = ZoneIndex(self.zone_coordinates_dict)
+
     
     # >> UTILS GIP
     def copy_files_to_input_data(self, source_dir):
@@ -154,10 +168,10 @@ class MapGenerator():
             dict: A dictionary mapping each zone to its assigned color in RGB format (as a string "rgb(r, g, b)").
         """
         
-        colors = self.generate_bright_colors(len(self.zone_coordinates_dict))
+        colors = self.generate_bright_colors(len(self.zone_index.zone_names))
 
         zone_colors = {}
-        for key, color in zip(self.zone_coordinates_dict.keys(), colors):
+        for key, color in zip(self.zone_index.zone_names, colors):
             zone_colors[key] = color
 
         return zone_colors
@@ -175,7 +189,7 @@ class MapGenerator():
         """
 
         # Group the data of the nodes by zone
-        groups = self.nodes_zones.groupby("zone")
+        groups = self.nodes_zones.groupby("zone", observed=True)
 
         # Iterate over each group (zone) and their respective node coordinates
         for zone, df in groups:
@@ -195,6 +209,29 @@ class MapGenerator():
         
         return map
 
+    def plot_zones_on_map(self, map, zone_colors: dict):
+        """
+        Draws the outline of each zone of the ZoneIndex on the map.
+
+        Parameters:
+            map (Folium.Map): The map object on which the zones will be drawn.
+            zone_colors (dict): A dictionary that maps each zone to its assigned color in RGB format (as a string "rgb(r, g, b)").
+
+        Returns:
+            Folium.Map: The map object with the zones drawn.
+        """
+
+        for zone in self.zone_index.zone_names:
+            folium.Polygon(
+                locations=self.zone_index.zone_outlines(zone), # Rectangle vertices or polygon rings (with holes)
+                color=zone_colors[zone], # Assign the corresponding color to the zone
+                weight=1,
+                fill=False,
+                tooltip=zone,
+            ).add_to(map) # Add the zone outline to the map
+
+        return map
+
     def generate_html_map(self) -> None:
         """
         Stores in a .html the map with the ploted nodes
@@ -208,14 +245,17 @@ class MapGenerator():
 
         print("Generating map...")
 
-        # Get a reference for the map:
-        map_reference = self.nodes_zones.loc[2211][["lat", "lon"]].values
+        # Get a reference for the map (center of the zones):
+        map_reference = self.zone_index.center()
 
         # Generate the colors:
         zone_colors = self.assign_colors()
 
         map = folium.Map(map_reference, zoom_start=14)
 
+        # Draw the zones on the map
+        map = self.plot_zones_on_map(map, zone_colors)
+
         # Plot the coordinates of nodes on the map using zone_colors
         self.map = self.plot_coordinates_on_map_zones(map, zone_colors)
 
@@ -1,18 +1,50 @@
 import os
 import pandas as pd
+import numpy as np
 import json
 import shutil
+import copy
+import hashlib
+import time
+import argparse
+import multiprocessing
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+#---------------------------------------------------------------------------------------------
+import sys
+
+# Add the root directory of the project to the PYTHONPATH to import the ZoneIndex
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+#---------------------------------------------------------------------------------------------
+
+from Node_classifier.zone_index import ZoneIndex, DEFAULT_ZONE_EXCLUSIONS
+
+# Formats in which the classified nodes can be saved
+CLASSIFIED_NODES_FORMATS = ["parquet", "csv"]
+
+# Columns of the classified nodes stored as categories in the parquet output
+CLASSIFIED_NODES_CATEGORICAL_COLUMNS = ["type", "zone"]
 
 class NodeClassifier():
 
-    def __init__(self,):
+    def __init__(self, input_data_path=None, output_data_path=None, output_format="parquet"):
         # Paths for input and output data folders, and file names
-        self.input_data_path = os.path.join("Node_classifier", "input_data")
+        # (by default the ones of the municipality of the Node_classifier folder)
+        self.input_data_path = input_data_path if input_data_path else os.path.join("Node_classifier", "input_data")
         self.nodes_file_name = "nodes.csv"
         self.zone_coordinates_file_name = 'zone_coordinates.json'
 
-        self.output_data_path = os.path.join("Node_classifier", "output_data")
-        self.output_file_name = "classified_nodes.csv"
+        self.output_data_path = output_data_path if output_data_path else os.path.join("Node_classifier", "output_data")
+
+        # Format of the classified nodes: "parquet" (typed columns: float lat/lon and categorical type/zone)
+        # or "csv" (legacy format, with the coordinates of each node as a dictionary string)
+        if output_format not in CLASSIFIED_NODES_FORMATS:
+            raise ValueError(f"Unknown output format '{output_format}'. Use 'parquet' or 'csv'")
+        self.output_format = output_format
+        self.output_file_name = f"classified_nodes.{output_format}"
 
         # DataFrames and dictionary to store data
         self.df = pd.DataFrame()        # < - id    type    ebox_id     lat     lon    
@@ -29,6 +61,23 @@ class NodeClassifier():
                                                     # }
                                         #      }
 
+        # Zones whose rectangle overlaps other zones that must be carved out of it.
+        # A device inside "south" only belongs to "south" if it is not in "field2" or "turistic"
+        self.zone_exclusions = copy.deepcopy(DEFAULT_ZONE_EXCLUSIONS)
+
+        # Spatial index over the zones (built in get_input_data)
+        self.zone_index = None
+
+        # Number of reused and classified nodes of the last incremental classification
+        self.incremental_stats = {}
+
+        # Number of read nodes, saved lights and lights without zone of the last streaming classification
+        self.streaming_stats = {}
+
+        # Maximum number of nodes checked at once by the vectorized classificator
+        # (bounds the size of the nodes x zones boolean matrix)
+        self.vectorized_chunk_size = 100000
+
     def get_input_data(self,) -> None:
         """
         Reads the CSV with the list of nodes and their respective coordinates and
@@ -46,15 +95,33 @@ class NodeClassifier():
         self.df = pd.read_csv(csv_file) 
 
         # Get JSON of Zone clasifications for Canyelles
+        self.get_zone_coordinates()
+
+    def get_zone_coordinates(self,) -> None:
+        """
+        Reads the JSON containing the coordinates vertices of the zones of the municipality
+        and builds the spatial index over them.
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        """
+
         json_file = os.path.join(self.input_data_path, self.zone_coordinates_file_name)
         with open(json_file) as f:
-            self.zone_coordinates_dict = json.load(f)
+            self.zone_coordinates_dict = ZoneIndex.normalize_zones(json.load(f))
+
+        # Build the spatial index over the zones
+        self.build_zone_index()
         
         # Strucure of the zone_coordinates_dict:
             # tr: top right coordinate
             # tl: top left coordinate
             # lr: lower right coordinate
             # ll: lower left coordinate
+            # or a GeoJSON Polygon / MultiPolygon geometry ({"type": ..., "coordinates": [[[lon, lat], ...]]})
 
     def create_coordinates_dict(self,row: pd.Series) -> dict:
         """
@@ -77,13 +144,21 @@ class NodeClassifier():
         zone
 
         Parameters:
-            zone_coordinates (dict): A dictionary containing the four vertices coordinates of the zone.
+            zone_coordinates (dict): A dictionary containing the four vertices coordinates of the zone
+                                     or its GeoJSON Polygon / MultiPolygon geometry.
             device_coordinates (dict): A dictionary containing the lat and lon of the device.
 
         Returns:
             bool: True if the device coordinates are in the zone, False otherwise.
         """
 
+        # Polygon zones: check the device with the point-in-polygon kernel
+        rings = ZoneIndex.geometry_rings(zone_coordinates)
+        if rings is not None:
+            lat = np.array([device_coordinates["lat"]], dtype=float)
+            lon = np.array([device_coordinates["lon"]], dtype=float)
+            return bool(ZoneIndex.points_in_rings(lat, lon, rings)[0])
+
         # Extract zone coordinates
         tr = zone_coordinates["tr"]
         tl = zone_coordinates["tl"]
@@ -119,16 +194,18 @@ class NodeClassifier():
         """
 
         zone_out = "Unknown"
+        zone_exclusions = self.active_zone_exclusions()
 
         for zone in self.zone_coordinates_dict.keys():
-            if zone == "south":
-                # First, check if the device is in the south rectangle but not in the tourist zone or football field
+            if zone in zone_exclusions:
+                # First, check if the device is in the zone rectangle but not in its excluded zones
+                # (e.g. in the south rectangle but not in the tourist zone or football field)
                 if (
-                        (self.device_in_zone(self.zone_coordinates_dict["south"], device_coordinates) &
-                        (self.device_in_zone(self.zone_coordinates_dict["field2"], device_coordinates) == False) &
-                        (self.device_in_zone(self.zone_coordinates_dict["turistic"], device_coordinates) == False))
+                        self.device_in_zone(self.zone_coordinates_dict[zone], device_coordinates) and
+                        not any(self.device_in_zone(self.zone_coordinates_dict[excluded], device_coordinates)
+                                for excluded in zone_exclusions[zone])
                     ):
-                    zone_out = "south"
+                    zone_out = zone
 
             else: # Any other zone
                 if self.device_in_zone(self.zone_coordinates_dict[zone], device_coordinates):
@@ -137,31 +214,403 @@ class NodeClassifier():
         # If we have not returned anything return "Unknown"
         return zone_out
 
-    def classify_nodes(self,):
+    def active_zone_exclusions(self,) -> dict:
+        """
+        Returns the zone exclusions that apply to the loaded zones: the zone and all its excluded zones
+        must be defined as rectangles (polygon zones describe their own holes).
+
+        Parameters:
+            None
+
+        Returns:
+            dict: Dictionary mapping a zone to the list of zones to carve out of it.
+        """
+
+        def is_rectangle(zone):
+            return zone in self.zone_coordinates_dict and ZoneIndex.geometry_rings(self.zone_coordinates_dict[zone]) is None
+
+        return {zone: excluded_zones for zone, excluded_zones in self.zone_exclusions.items()
+                if is_rectangle(zone) and all(is_rectangle(excluded) for excluded in excluded_zones)}
+
+    def build_zone_index(self,) -> None:
+        """
+        Builds the spatial index (ZoneIndex) over the zones of zone_coordinates_dict.
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        """
+
+        self.zone_index = ZoneIndex(self.zone_coordinates_dict, self.zone_exclusions)
+
+    def zone_classificator_vectorized(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """
+        Vectorized version of zone_classificator. Checks all the devices against all the zone rectangles
+        (bounding boxes for the polygon zones, refined with the point-in-polygon kernel) at once and returns
+        the zone of each device, following the same precedence rules: the last zone of zone_coordinates_dict
+        that contains the device wins, and the zones in zone_exclusions only match if the device is not
+        inside any of their excluded zones. If there is no match the zone is 'Unknown'.
+
+        Parameters:
+            lats (np.ndarray): Latitudes of the devices.
+            lons (np.ndarray): Longitudes of the devices.
+
+        Returns:
+            np.ndarray: Array of strings with the zone name of each device.
+        """
+
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+
+        if self.zone_index is None:
+            self.build_zone_index()
+
+        # Limits of every zone, in the order of zone_coordinates_dict
+        zone_names = self.zone_index.zone_names
+        lat_min, lat_max = self.zone_index.lat_min, self.zone_index.lat_max
+        lon_min, lon_max = self.zone_index.lon_min, self.zone_index.lon_max
+        exclusions = self.zone_index.exclusions
+        n_zones = len(zone_names)
+
+        # The last position is used for the devices without zone
+        zone_labels = np.array(zone_names + ["Unknown"], dtype=object)
+        zones_out = np.empty(len(lats), dtype=object)
+
+        # Classify the devices in chunks to bound the memory of the nodes x zones matrix
+        for start in range(0, len(lats), self.vectorized_chunk_size):
+            end = start + self.vectorized_chunk_size
+            lat = lats[start:end, None]
+            lon = lons[start:end, None]
+
+            # Matrix (devices x zones) indicating if each device is inside each zone rectangle (bounding box)
+            inside = (lat_min <= lat) & (lat <= lat_max) & (lon_min <= lon) & (lon <= lon_max)
+
+            # Check the devices inside the bounding box of the polygon zones with the point-in-polygon kernel
+            self.zone_index.refine_inside(inside, np.arange(n_zones), lats[start:end], lons[start:end])
+
+            # Apply the exclusions over the raw rectangle matches
+            if exclusions:
+                raw_inside = inside.copy()
+                for zone_pos, excluded_pos in exclusions.items():
+                    inside[:, zone_pos] &= ~raw_inside[:, excluded_pos].any(axis=1)
+
+            # The last matching zone wins (same as overwriting zone_out in the loop of zone_classificator)
+            last_match = n_zones - 1 - np.argmax(inside[:, ::-1], axis=1)
+            zone_pos = np.where(inside.any(axis=1), last_match, n_zones)
+
+            zones_out[start:end] = zone_labels[zone_pos]
+
+        return zones_out
+
+    def classify_nodes(self, engine="index"):
         """
         Creates a new column in the nodes dataframe that contains the zone 
         in which we have classified the node.
 
         Parameters:
-            None
+            engine (str): "index" to classify all the nodes at once only checking the candidate zones of the
+                          ZoneIndex, "numpy" to check all the nodes against all the zones at once with
+                          zone_classificator_vectorized or "python" to classify them one by one with zone_classificator.
 
         Returns:
             None
         """
 
-        # Create a new column with coordinates as a dictionary
-        self.df["coordinates"] = self.df.apply(lambda row: self.create_coordinates_dict(row), axis=1)
+        if engine == "python":
+            # Create a new column with coordinates as a dictionary
+            self.df["coordinates"] = self.df.apply(lambda row: self.create_coordinates_dict(row), axis=1)
 
-        # Apply the zone_classificator to classify nodes
-        self.df["zone"] = self.df["coordinates"].apply(lambda coord: self.zone_classificator(coord))
+            # Apply the zone_classificator to classify nodes
+            self.df["zone"] = self.df["coordinates"].apply(lambda coord: self.zone_classificator(coord))
+
+        else:
+            # Create a new column with coordinates as a dictionary (without building a Series per row).
+            # The parquet output keeps lat and lon as float columns, so it is only needed for the csv output
+            if self.output_format == "csv":
+                self.df["coordinates"] = [{'lat': lat, 'lon': lon} for lat, lon in zip(self.df["lat"], self.df["lon"])]
+
+            # Classify all the nodes at once
+            self.df["zone"] = self.classify_coordinates(self.df["lat"].values, self.df["lon"].values, engine)
 
         # Keep only the lights in the DataFrame
         self.df = self.df.loc[self.df["type"] == "light"]
 
+    def classify_coordinates(self, lats: np.ndarray, lons: np.ndarray, engine="index") -> np.ndarray:
+        """
+        Returns the zone of each pair of coordinates using the selected classification engine.
+
+        Parameters:
+            lats (np.ndarray): Latitudes of the devices.
+            lons (np.ndarray): Longitudes of the devices.
+            engine (str): "index", "numpy" or "python" (see classify_nodes).
+
+        Returns:
+            np.ndarray: Array of strings with the zone name of each device.
+        """
+
+        if engine != "python" and self.zone_index is None:
+            self.build_zone_index()
+
+        if engine == "index":
+            return self.zone_index.classify(lats, lons)
+        elif engine == "numpy":
+            return self.zone_classificator_vectorized(lats, lons)
+        elif engine == "python":
+            return np.array([self.zone_classificator({'lat': lat, 'lon': lon}) for lat, lon in zip(lats, lons)], dtype=object)
+        else:
+            raise ValueError(f"Unknown classification engine '{engine}'. Use 'index', 'numpy' or 'python'")
+
+    def coordinates_hash(self, df: pd.DataFrame) -> pd.Series:
+        """
+        Returns a hash of the lat and lon of each node, used to detect the nodes that have been moved.
+
+        Parameters:
+            df (pd.DataFrame): DataFrame with the lat and lon columns.
+
+        Returns:
+            pd.Series: A uint64 hash per row.
+        """
+
+        return pd.util.hash_pandas_object(df[["lat", "lon"]].astype(float), index=False)
+
+    def file_hash(self, file_path: str) -> str:
+        """
+        Returns the SHA-256 hash of the contents of a file.
+
+        Parameters:
+            file_path (str): Path of the file.
+
+        Returns:
+            str: Hexadecimal digest of the file.
+        """
+
+        with open(file_path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def previous_classification_is_reusable(self,) -> bool:
+        """
+        Checks if the result of the last run (classified_nodes file in the output_data folder) can be reused:
+        it has to exist and the zone coordinates used to obtain it (the copy of zone_coordinates.json saved
+        in the output_data folder) must be the same as the current ones.
+
+        Parameters:
+            None
+
+        Returns:
+            bool: True if the previous classification can be reused, False otherwise.
+        """
+
+        previous_file = os.path.join(self.output_data_path, self.output_file_name)
+        previous_zones_file = os.path.join(self.output_data_path, self.zone_coordinates_file_name)
+        zones_file = os.path.join(self.input_data_path, self.zone_coordinates_file_name)
+
+        if not (os.path.isfile(previous_file) and os.path.isfile(previous_zones_file)):
+            return False
+
+        # If the geometry of the zones has changed all the nodes must be reclassified
+        return self.file_hash(previous_zones_file) == self.file_hash(zones_file)
+
+    def classify_nodes_incremental(self, engine="index"):
+        """
+        Incremental version of classify_nodes. Reuses the zones of the last run (classified_nodes file in the
+        output_data folder), keyed by the node id and a hash of its coordinates, and only classifies the nodes that
+        have been added or moved since then. If there is no previous run or the zone coordinates have changed,
+        all the nodes are classified. The result is the same as the one of classify_nodes.
+
+        Parameters:
+            engine (str): Classification engine used for the new or moved nodes (see classify_nodes).
+
+        Returns:
+            None
+        """
+
+        if not self.previous_classification_is_reusable():
+            self.classify_nodes(engine)
+            self.incremental_stats = {"reused": 0, "classified": len(self.df), "full_run": True}
+            return
+
+        # Zones of the last run keyed by node id and coordinates hash
+        previous_file = os.path.join(self.output_data_path, self.output_file_name)
+        df_previous = read_classified_nodes_file(previous_file, columns=["id", "lat", "lon", "zone"])
+        df_previous["coordinates_hash"] = self.coordinates_hash(df_previous).values
+        df_previous = df_previous.drop_duplicates(subset=["id", "coordinates_hash"])[["id", "coordinates_hash", "zone"]]
+
+        # Only the lights are kept in the output, so only the lights need a zone
+        self.df = self.df.loc[self.df["type"] == "light"].copy()
+        df_keys = pd.DataFrame({"id": self.df["id"].values, "coordinates_hash": self.coordinates_hash(self.df).values})
+        zones = df_keys.merge(df_previous, on=["id", "coordinates_hash"], how="left")["zone"].values.astype(object)
+
+        # Classify the nodes that were not in the last run or have been moved
+        to_classify = pd.isna(zones)
+        if to_classify.any():
+            zones[to_classify] = self.classify_coordinates(self.df["lat"].values[to_classify], self.df["lon"].values[to_classify], engine)
+
+        if self.output_format == "csv":
+            self.df["coordinates"] = [{'lat': lat, 'lon': lon} for lat, lon in zip(self.df["lat"], self.df["lon"])]
+        self.df["zone"] = zones
+
+        self.incremental_stats = {"reused": int((~to_classify).sum()), "classified": int(to_classify.sum()), "full_run": False}
+
+    def infer_nodes_dtypes(self, csv_file: str, chunk_size: int) -> dict:
+        """
+        Reads the nodes CSV in chunks (without keeping them) to find the dtype of each column that
+        pandas infers when reading the whole file at once. Each chunk is inferred on its own, so the
+        dtypes of all the chunks are unified (e.g. an int column with missing values in one chunk is a float column).
+
+        Parameters:
+            csv_file (str): Path of the nodes CSV.
+            chunk_size (int): Number of rows per chunk.
+
+        Returns:
+            dict: Dictionary column -> dtype to read every chunk with.
+        """
+
+        # Kinds of dtype found in each column (i: int, f: float, b: bool, O: object...)
+        column_kinds = {}
+        for chunk in pd.read_csv(csv_file, chunksize=chunk_size):
+            for column, dtype in chunk.dtypes.items():
+                column_kinds.setdefault(column, set()).add(dtype.kind)
+
+        dtypes = {}
+        for column, kinds in column_kinds.items():
+            if kinds == {"i"}:
+                dtypes[column] = "int64"
+            elif kinds <= {"i", "f"}:
+                dtypes[column] = "float64"
+            elif kinds == {"b"}:
+                dtypes[column] = "bool"
+            else:
+                dtypes[column] = "object"
+
+        return dtypes
+
+    def classify_nodes_streaming(self, chunk_size=100000, engine="index"):
+        """
+        Streaming version of classify_nodes + save_output_data for node inventories that do not fit in memory.
+        Reads the nodes CSV in chunks of chunk_size rows, classifies each chunk and appends the lights to
+        the classified_nodes file (one row group per chunk in parquet), so the peak memory only depends on chunk_size.
+        The saved nodes are the same as the ones saved by the in-memory path (get_input_data + classify_nodes +
+        save_output_data), and in csv the output file is byte-identical.
+
+        Parameters:
+            chunk_size (int): Number of nodes read and classified at once. Default is 100000.
+            engine (str): Classification engine (see classify_nodes).
+
+        Returns:
+            None
+        """
+
+        # Only the zones are loaded in memory
+        if self.zone_index is None:
+            self.get_zone_coordinates()
+
+        csv_file = os.path.join(self.input_data_path, self.nodes_file_name)
+        dtypes = self.infer_nodes_dtypes(csv_file, chunk_size)
+
+        # Write to a temporary file and replace the output at the end, so a failed run
+        # does not leave a partial classified_nodes file behind
+        dst_file = os.path.join(self.output_data_path, self.output_file_name)
+        tmp_file = dst_file + ".tmp"
+
+        n_nodes = 0
+        n_lights = 0
+        n_unknown = 0
+        header = True
+        if self.output_format == "parquet":
+            # All the row groups must have the same schema, so it is fixed from the dtypes of the whole file
+            schema = self.columnar_schema(dtypes)
+            writer = pq.ParquetWriter(tmp_file, schema)
+        else:
+            f = open(tmp_file, "w", newline="")
+
+        try:
+            for chunk in pd.read_csv(csv_file, chunksize=chunk_size, dtype=dtypes):
+                n_nodes += len(chunk)
+
+                # Same steps as classify_nodes
+                if self.output_format == "csv":
+                    chunk["coordinates"] = [{'lat': lat, 'lon': lon} for lat, lon in zip(chunk["lat"], chunk["lon"])]
+                chunk["zone"] = self.classify_coordinates(chunk["lat"].values, chunk["lon"].values, engine)
+                chunk = chunk.loc[chunk["type"] == "light"]
+
+                if self.output_format == "parquet":
+                    writer.write_table(pa.Table.from_pandas(self.columnar_nodes(chunk), schema=schema, preserve_index=False))
+                else:
+                    chunk.to_csv(f, index=False, header=header)
+                header = False
+
+                n_lights += len(chunk)
+                n_unknown += int((chunk["zone"] == "Unknown").sum())
+
+            # Empty inventory: only the header (the parquet writer always writes the schema)
+            if header and self.output_format == "csv":
+                columns = list(pd.read_csv(csv_file, nrows=0).columns) + ["coordinates", "zone"]
+                pd.DataFrame(columns=columns).to_csv(f, index=False)
+
+        finally:
+            if self.output_format == "parquet":
+                writer.close()
+            else:
+                f.close()
+
+        os.replace(tmp_file, dst_file)
+
+        # Copy zone_coordinates.json to the output_data folder
+        src_file = os.path.join(self.input_data_path, self.zone_coordinates_file_name)
+        dst_file = os.path.join(self.output_data_path, self.zone_coordinates_file_name)
+        shutil.copy2(src_file, dst_file)
+
+        self.streaming_stats = {"nodes": n_nodes, "lights": n_lights, "unknown": n_unknown}
+
+    def columnar_nodes(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Returns the classified nodes with the types of the parquet output: float lat and lon, categorical
+        type and zone, and without the coordinates dictionary column (it can be rebuilt from lat and lon).
+
+        Parameters:
+            df (pd.DataFrame): Classified nodes.
+
+        Returns:
+            pd.DataFrame: Classified nodes with typed columns.
+        """
+
+        df = df.drop(columns="coordinates", errors="ignore")
+        dtypes = {"lat": "float64", "lon": "float64"}
+        dtypes.update({column: "category" for column in CLASSIFIED_NODES_CATEGORICAL_COLUMNS})
+
+        return df.astype(dtypes)
+
+    def columnar_schema(self, dtypes: dict) -> pa.Schema:
+        """
+        Returns the arrow schema of the parquet output for nodes read with the given dtypes
+        (see infer_nodes_dtypes), with the zone column added at the end.
+
+        Parameters:
+            dtypes (dict): Dictionary column -> dtype of the nodes CSV.
+
+        Returns:
+            pa.Schema: Schema of the classified nodes.
+        """
+
+        arrow_types = {"int64": pa.int64(), "float64": pa.float64(), "bool": pa.bool_(), "object": pa.string()}
+
+        fields = []
+        for column, dtype in list(dtypes.items()) + [("zone", "object")]:
+            if column in CLASSIFIED_NODES_CATEGORICAL_COLUMNS:
+                fields.append(pa.field(column, pa.dictionary(pa.int32(), pa.string())))
+            elif column in ["lat", "lon"]:
+                fields.append(pa.field(column, pa.float64()))
+            else:
+                fields.append(pa.field(column, arrow_types[dtype]))
+
+        return pa.schema(fields)
+
     #SAVE OUTPUT DATA
     def save_output_data(self):
         """
-        Saves the classified nodes DataFrame and zone_coordinates.json to the output_data folder.
+        Saves the classified nodes DataFrame (in the output_format) and zone_coordinates.json to the output_data folder.
 
         Parameters:
             None
@@ -172,20 +621,194 @@ class NodeClassifier():
 
         # Save the classified nodes DataFrame
         dst_file = os.path.join(self.output_data_path, self.output_file_name)
-        self.df.to_csv(dst_file, index=False)
+        if self.output_format == "parquet":
+            self.columnar_nodes(self.df).to_parquet(dst_file, index=False)
+        else:
+            self.df.to_csv(dst_file, index=False)
 
         # Copy zone_coordinates.json to the output_data folder
         src_file = os.path.join(self.input_data_path, self.zone_coordinates_file_name)
         dst_file = os.path.join(self.output_data_path, self.zone_coordinates_file_name)
         shutil.copy2(src_file, dst_file)
 
+def classified_nodes_file(data_path: str) -> str:
+    """
+    Returns the path of the classified nodes file saved by the NodeClassifier in a folder. If it has
+    been saved in several formats the most recent one is returned.
+
+    Parameters:
+        data_path (str): Folder with the classified nodes.
+
+    Returns:
+        str: Path of the classified_nodes.parquet or classified_nodes.csv file.
+    """
+
+    files = [os.path.join(data_path, f"classified_nodes.{output_format}") for output_format in CLASSIFIED_NODES_FORMATS]
+    files = [file for file in files if os.path.isfile(file)]
+
+    if not files:
+        raise FileNotFoundError(f"There are no classified nodes in {data_path}")
+
+    return max(files, key=os.path.getmtime)
+
+def read_classified_nodes_file(file_path: str, columns=None) -> pd.DataFrame:
+    """
+    Reads a classified nodes file saved by the NodeClassifier, in parquet or csv (by its extension).
+
+    Parameters:
+        file_path (str): Path of the file.
+        columns (list, optional): Columns to read. Default is all of them.
+
+    Returns:
+        pd.DataFrame: Classified nodes.
+    """
+
+    if file_path.endswith(".parquet"):
+        return pd.read_parquet(file_path, columns=columns)
+
+    return pd.read_csv(file_path, usecols=columns)
+
+def read_classified_nodes(data_path: str, columns=None) -> pd.DataFrame:
+    """
+    Reads the classified nodes saved by the NodeClassifier in a folder (see classified_nodes_file).
+    The parquet file is read without any parsing: lat and lon are floats and type and zone categories.
+
+    Parameters:
+        data_path (str): Folder with the classified nodes.
+        columns (list, optional): Columns to read. Default is all of them.
+
+    Returns:
+        pd.DataFrame: Classified nodes.
+    """
+
+    return read_classified_nodes_file(classified_nodes_file(data_path), columns)
+
 #DEBUG
-def main():
+def main(incremental=False, chunk_size=None):
     print("Classifying nodes in their relevant zone...")
     node_clasif = NodeClassifier()
+    if chunk_size:
+        # Streaming classification (reads, classifies and saves the nodes chunk by chunk)
+        node_clasif.classify_nodes_streaming(chunk_size)
+        print("Classified nodes.\n")
+        return
     node_clasif.get_input_data()
-    node_clasif.classify_nodes()
+    if incremental:
+        node_clasif.classify_nodes_incremental()
+        print(f"Reused {node_clasif.incremental_stats['reused']} nodes and classified {node_clasif.incremental_stats['classified']} nodes.")
+    else:
+        node_clasif.classify_nodes()
     node_clasif.save_output_data()
     print("Classified nodes.\n")
 
-#main()
\ No newline at end of file
+#main()
+
+def classify_municipality(municipality: dict) -> dict:
+    """
+    Classifies the nodes of one municipality (worker of classify_municipalities) and saves them
+    in its own output folder.
+
+    Parameters:
+        municipality (dict): Dictionary with the "name" of the municipality, its "input_data_path" (folder with
+                             nodes.csv and zone_coordinates.json) and optionally its "output_data_path"
+                             (Node_classifier/output_data/{name} by default), "incremental" (bool) and "chunk_size" (int).
+
+    Returns:
+        dict: Summary of the classification (municipality, status, nodes, lights, unknown lights, zones and seconds).
+    """
+
+    name = municipality["name"]
+    output_data_path = municipality.get("output_data_path") or os.path.join("Node_classifier", "output_data", name)
+    summary = {"municipality": name, "status": "ok", "nodes": 0, "lights": 0, "unknown": 0, "zones": 0, "seconds": 0.0}
+
+    start = time.perf_counter()
+    try:
+        os.makedirs(output_data_path, exist_ok=True)
+        node_clasif = NodeClassifier(municipality["input_data_path"], output_data_path)
+
+        if municipality.get("chunk_size"):
+            node_clasif.classify_nodes_streaming(municipality["chunk_size"])
+            summary["nodes"] = node_clasif.streaming_stats["nodes"]
+            summary["lights"] = node_clasif.streaming_stats["lights"]
+            summary["unknown"] = node_clasif.streaming_stats["unknown"]
+        else:
+            node_clasif.get_input_data()
+            summary["nodes"] = len(node_clasif.df)
+            if municipality.get("incremental"):
+                node_clasif.classify_nodes_incremental()
+            else:
+                node_clasif.classify_nodes()
+            node_clasif.save_output_data()
+            summary["lights"] = len(node_clasif.df)
+            summary["unknown"] = int((node_clasif.df["zone"] == "Unknown").sum())
+
+        summary["zones"] = len(node_clasif.zone_index.zone_names)
+
+    except Exception as e:
+        # An error in one municipality does not stop the rest
+        summary["status"] = f"error: {e}"
+
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+
+    return summary
+
+def classify_municipalities(municipalities: list, processes=None, summary_file=None) -> pd.DataFrame:
+    """
+    Classifies the nodes of several municipalities in parallel across a process pool. The classified
+    nodes of each municipality are saved in its own output folder and a summary with the timing and
+    node counts of each municipality is returned (and saved as CSV if summary_file is indicated).
+
+    Parameters:
+        municipalities (list): List of municipality dictionaries (see classify_municipality).
+        processes (int, optional): Number of worker processes. Default is the number of CPUs.
+        summary_file (str, optional): Path of the CSV where the summary is saved.
+
+    Returns:
+        pd.DataFrame: Summary with one row per municipality.
+    """
+
+    start = time.perf_counter()
+
+    with multiprocessing.Pool(processes) as pool:
+        summaries = pool.map(classify_municipality, municipalities, chunksize=1)
+
+    df_summary = pd.DataFrame(summaries, columns=["municipality", "status", "nodes", "lights", "unknown", "zones", "seconds"])
+
+    if summary_file:
+        df_summary.to_csv(summary_file, index=False)
+
+    print(df_summary.to_string(index=False))
+    print(f"Classified {len(municipalities)} municipalities in {round(time.perf_counter() - start, 3)} seconds.\n")
+
+    return df_summary
+
+def run_multi_municipality():
+    """
+    Function to classify the nodes of several municipalities in parallel.
+
+    The municipalities are read from a JSON file with a list of municipality dictionaries (see classify_municipality), e.g.:
+        [{"name": "canyelles", "input_data_path": "Node_classifier/input_data"}, ...]
+
+    Parameters:
+        None
+
+    Returns:
+        None
+    """
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--municipalities", help="JSON file with the list of municipalities to classify", type=str, required=True)
+    parser.add_argument("--processes", help="Number of worker processes (by default the number of CPUs)", type=int, default=None)
+    parser.add_argument("--summary_file", help="CSV file where the summary of the classification is saved", type=str,
+                        default=os.path.join("Node_classifier", "output_data", "classification_summary.csv"))
+
+    args = parser.parse_args()
+
+    with open(args.municipalities) as f:
+        municipalities = json.load(f)
+
+    os.makedirs(os.path.dirname(args.summary_file) or ".", exist_ok=True)
+    classify_municipalities(municipalities, args.processes, args.summary_file)
+
+if __name__ == "__main__":
+    run_multi_municipality()
\ No newline at end of file
@@ -0,0 +1,427 @@
+import json
+import math
+import numpy as np
+
+# Zones whose rectangle overlaps other zones that must be carved out of it.
+# A device inside "south" only belongs to "south" if it is not in "field2" or "turistic"
+DEFAULT_ZONE_EXCLUSIONS = {"south": ["field2", "turistic"]}
+
+class ZoneIndex():
+    """
+    Spatial index over the zones of a municipality. The zones are registered in a uniform grid
+    of cells covering all of them, so each device only has to be checked against the zones whose
+    bounding box overlaps the cell in which the device falls.
+
+    A zone can be defined as an axis-aligned rectangle (tl, tr, ll and lr vertices) or as a GeoJSON
+    Polygon or MultiPolygon geometry (coordinates in [lon, lat] order, holes allowed). Polygon zones are
+    checked with a batched point-in-polygon kernel only for the devices inside their bounding box.
+
+    The index follows the same precedence rules as NodeClassifier.zone_classificator: the last zone
+    (in the order of the zone coordinates dictionary) that contains a device wins, and the rectangle
+    zones with exclusions only match if the device is not inside any of their excluded zones
+    (polygon zones describe their own holes).
+    """
+
+    def __init__(self, zone_coordinates_dict: dict, zone_exclusions: dict = None, cells_per_zone: int = 4):
+        """
+        Builds the index from a zone coordinates dictionary (same structure as zone_coordinates.json).
+
+        Parameters:
+            zone_coordinates_dict (dict): Dictionary with the tl, tr, ll and lr vertices or the GeoJSON geometry
+                                          of each zone (or a GeoJSON FeatureCollection, see normalize_zones).
+            zone_exclusions (dict, optional): Dictionary mapping a zone to the list of zones to carve out of it.
+                                              Default is DEFAULT_ZONE_EXCLUSIONS.
+            cells_per_zone (int, optional): Average number of grid cells per zone. Default is 4.
+        """
+
+        zone_coordinates_dict = self.normalize_zones(zone_coordinates_dict)
+        self.zone_names = list(zone_coordinates_dict.keys())
+
+        # Rings of the polygon zones as (lats, lons) arrays (None for the rectangle zones)
+        self.zone_rings = [self.geometry_rings(zone_coordinates_dict[zone]) for zone in self.zone_names]
+
+        # Latitude and longitude limits of each zone. For the rectangles these are the same vertices
+        # used by NodeClassifier.device_in_zone, for the polygons their bounding box
+        bounds = [self.geometry_bounds(zone_coordinates_dict[zone], rings) for zone, rings in zip(self.zone_names, self.zone_rings)]
+        bounds = np.array(bounds, dtype=float).reshape(-1, 4)
+        self.lat_min, self.lat_max, self.lon_min, self.lon_max = bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3]
+
+        # Positions of the zones to carve out of each rectangle zone (only if all of them are defined as rectangles)
+        zone_exclusions = zone_exclusions if zone_exclusions is not None else DEFAULT_ZONE_EXCLUSIONS
+        is_rectangle = {zone: rings is None for zone, rings in zip(self.zone_names, self.zone_rings)}
+        self.exclusions = {
+            self.zone_names.index(zone): [self.zone_names.index(excluded) for excluded in excluded_zones]
+            for zone, excluded_zones in zone_exclusions.items()
+            if is_rectangle.get(zone, False) and all(is_rectangle.get(excluded, False) for excluded in excluded_zones)
+        }
+
+        self.cells_per_zone = cells_per_zone
+        self.build_grid()
+
+    @classmethod
+    def from_json(cls, json_file: str, zone_exclusions: dict = None, cells_per_zone: int = 4):
+        """
+        Builds the index from a zone coordinates JSON file.
+
+        Parameters:
+            json_file (str): Path to the JSON with the coordinates vertices of the zones.
+            zone_exclusions (dict, optional): Dictionary mapping a zone to the list of zones to carve out of it.
+                                              Default is DEFAULT_ZONE_EXCLUSIONS.
+            cells_per_zone (int, optional): Average number of grid cells per zone. Default is 4.
+
+        Returns:
+            ZoneIndex: The index over the zones of the file.
+        """
+
+        with open(json_file) as f:
+            zone_coordinates_dict = json.load(f)
+
+        return cls(zone_coordinates_dict, zone_exclusions, cells_per_zone)
+
+    @staticmethod
+    def normalize_zones(zone_coordinates) -> dict:
+        """
+        Returns the zones as an ordered dictionary zone name -> geometry. Accepts the zone_coordinates.json
+        structure (zone name -> rectangle vertices or GeoJSON geometry) or a GeoJSON FeatureCollection
+        in which the name of each zone is stored in the "name" (or "zone") property of its feature.
+
+        Parameters:
+            zone_coordinates (dict): The zones loaded from the JSON file.
+
+        Returns:
+            dict: Dictionary zone name -> geometry, in the order of the file.
+        """
+
+        if zone_coordinates.get("type") != "FeatureCollection":
+            return {zone: (geometry["geometry"] if geometry.get("type") == "Feature" else geometry)
+                    for zone, geometry in zone_coordinates.items()}
+
+        zones = {}
+        for feature in zone_coordinates["features"]:
+            properties = feature.get("properties") or {}
+            zone = properties.get("name", properties.get("zone"))
+            if zone is None:
+                raise ValueError("Every feature of the zones FeatureCollection needs a 'name' property")
+            zones[zone] = feature["geometry"]
+
+        return zones
+
+    @staticmethod
+    def geometry_rings(geometry: dict) -> list:
+        """
+        Returns the rings (exterior and holes) of a GeoJSON Polygon or MultiPolygon geometry
+        as a list of (lats, lons) NumPy arrays. Rectangle zones (tl, tr, ll and lr vertices) return None.
+
+        Parameters:
+            geometry (dict): The geometry of the zone.
+
+        Returns:
+            list: List of (lats, lons) tuples, or None for rectangle zones.
+        """
+
+        geometry_type = geometry.get("type")
+
+        if geometry_type is None:
+            return None
+        elif geometry_type == "Polygon":
+            polygons = [geometry["coordinates"]]
+        elif geometry_type == "MultiPolygon":
+            polygons = geometry["coordinates"]
+        else:
+            raise ValueError(f"Unsupported zone geometry '{geometry_type}'. Use rectangle vertices, Polygon or MultiPolygon")
+
+        # GeoJSON stores the positions as [lon, lat]
+        rings = []
+        for polygon in polygons:
+            for ring in polygon:
+                ring = np.asarray(ring, dtype=float)
+                rings.append((ring[:, 1], ring[:, 0]))
+
+        return rings
+
+    @staticmethod
+    def geometry_bounds(geometry: dict, rings: list) -> tuple:
+        """
+        Returns the latitude and longitude limits of a zone.
+
+        Parameters:
+            geometry (dict): The geometry of the zone.
+            rings (list): The rings of the zone returned by geometry_rings (None for rectangle zones).
+
+        Returns:
+            tuple: (lat_min, lat_max, lon_min, lon_max)
+        """
+
+        if rings is None:
+            return (geometry["ll"]["lat"], geometry["tl"]["lat"], geometry["tl"]["lon"], geometry["tr"]["lon"])
+
+        lats = np.concatenate([ring_lats for ring_lats, _ in rings])
+        lons = np.concatenate([ring_lons for _, ring_lons in rings])
+
+        return (lats.min(), lats.max(), lons.min(), lons.max())
+
+    @staticmethod
+    def points_in_rings(lats: np.ndarray, lons: np.ndarray, rings: list) -> np.ndarray:
+        """
+        Batched point-in-polygon kernel (even-odd rule). For every edge of the rings, toggles the devices
+        whose horizontal ray crosses it, so holes and the parts of a multipolygon are handled at once.
+
+        Parameters:
+            lats (np.ndarray): Latitudes of the devices.
+            lons (np.ndarray): Longitudes of the devices.
+            rings (list): List of (lats, lons) arrays of the rings of the zone.
+
+        Returns:
+            np.ndarray: Boolean array indicating if each device is inside the zone.
+        """
+
+        inside = np.zeros(len(lats), dtype=bool)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for ring_lats, ring_lons in rings:
+                # Edges from each vertex (i) to the previous one (j)
+                prev_lats = np.roll(ring_lats, 1)
+                prev_lons = np.roll(ring_lons, 1)
+
+                for lat_i, lon_i, lat_j, lon_j in zip(ring_lats, ring_lons, prev_lats, prev_lons):
+                    # The edge spans the latitude of the device and the crossing point is east of the device
+                    spans = (lat_i > lats) != (lat_j > lats)
+                    crossing_lon = (lon_j - lon_i) * (lats - lat_i) / (lat_j - lat_i) + lon_i
+                    inside ^= spans & (lons < crossing_lon)
+
+        return inside
+
+    def refine_inside(self, inside: np.ndarray, zone_positions: np.ndarray, lats: np.ndarray, lons: np.ndarray) -> None:
+        """
+        Refines (in place) a devices x zones bounding box match matrix with the point-in-polygon
+        kernel for the polygon zones. Only the devices inside the bounding box of each zone are checked.
+
+        Parameters:
+            inside (np.ndarray): Boolean matrix (devices x zones) with the bounding box matches.
+            zone_positions (np.ndarray): Position of the zone of each column of the matrix.
+            lats (np.ndarray): Latitudes of the devices (one per row of the matrix).
+            lons (np.ndarray): Longitudes of the devices (one per row of the matrix).
+
+        Returns:
+            None
+        """
+
+        for column, zone_pos in enumerate(zone_positions):
+            rings = self.zone_rings[zone_pos]
+            if rings is None:
+                continue
+
+            # Bounding box prefilter
+            rows = np.flatnonzero(inside[:, column])
+            if len(rows) > 0:
+                inside[rows, column] = self.points_in_rings(lats[rows], lons[rows], rings)
+
+    def build_grid(self,) -> None:
+        """
+        Splits the bounding box of all the zones in a uniform grid and registers each zone
+        in every cell its bounding box overlaps. The cell -> zones relation is stored in
+        compressed form (cell_start offsets over the cell_zones array).
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        """
+
+        n_zones = len(self.zone_names)
+
+        # Bounding box of the whole municipality
+        if n_zones > 0:
+            self.bounds = (self.lat_min.min(), self.lat_max.max(), self.lon_min.min(), self.lon_max.max())
+        else:
+            self.bounds = (0.0, 0.0, 0.0, 0.0)
+
+        # Square-ish grid with about cells_per_zone cells per zone
+        self.n_rows = self.n_cols = max(1, int(math.ceil(math.sqrt(n_zones * self.cells_per_zone))))
+        self.cell_lat = max((self.bounds[1] - self.bounds[0]) / self.n_rows, np.finfo(float).eps)
+        self.cell_lon = max((self.bounds[3] - self.bounds[2]) / self.n_cols, np.finfo(float).eps)
+
+        # Range of cells covered by each zone
+        row_min, col_min = self.cell_coordinates(self.lat_min, self.lon_min)
+        row_max, col_max = self.cell_coordinates(self.lat_max, self.lon_max)
+
+        # Register every zone (in precedence order) in each of its cells
+        cells = [[] for _ in range(self.n_rows * self.n_cols)]
+        for zone_pos in range(n_zones):
+            for row in range(row_min[zone_pos], row_max[zone_pos] + 1):
+                for col in range(col_min[zone_pos], col_max[zone_pos] + 1):
+                    cells[row * self.n_cols + col].append(zone_pos)
+
+        self.cell_start = np.cumsum([0] + [len(cell) for cell in cells])
+        self.cell_zones = np.array([zone_pos for cell in cells for zone_pos in cell], dtype=int)
+
+    def cell_coordinates(self, lats: np.ndarray, lons: np.ndarray) -> tuple:
+        """
+        Returns the row and column of the grid cell in which each coordinate falls
+        (coordinates outside the grid are clipped to the border cells).
+
+        Parameters:
+            lats (np.ndarray): Latitudes.
+            lons (np.ndarray): Longitudes.
+
+        Returns:
+            tuple: (rows, cols) NumPy arrays of ints.
+        """
+
+        rows = np.floor((np.asarray(lats, dtype=float) - self.bounds[0]) / self.cell_lat).astype(int)
+        cols = np.floor((np.asarray(lons, dtype=float) - self.bounds[2]) / self.cell_lon).astype(int)
+
+        return np.clip(rows, 0, self.n_rows - 1), np.clip(cols, 0, self.n_cols - 1)
+
+    def candidate_zones(self, lat: float, lon: float) -> list:
+        """
+        Returns the zones whose bounding box overlaps the grid cell of a coordinate.
+
+        Parameters:
+            lat (float): Latitude of the device.
+            lon (float): Longitude of the device.
+
+        Returns:
+            list: Names of the candidate zones, in precedence order.
+        """
+
+        if not self.in_bounds(np.array([lat]), np.array([lon]))[0]:
+            return []
+
+        rows, cols = self.cell_coordinates(np.array([lat]), np.array([lon]))
+        cell = rows[0] * self.n_cols + cols[0]
+
+        return [self.zone_names[zone_pos] for zone_pos in self.cell_zones[self.cell_start[cell]:self.cell_start[cell + 1]]]
+
+    def in_bounds(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """
+        Returns whether each coordinate is inside the bounding box of all the zones.
+
+        Parameters:
+            lats (np.ndarray): Latitudes.
+            lons (np.ndarray): Longitudes.
+
+        Returns:
+            np.ndarray: Boolean array.
+        """
+
+        return ((self.bounds[0] <= lats) & (lats <= self.bounds[1]) &
+                (self.bounds[2] <= lons) & (lons <= self.bounds[3]))
+
+    def classify(self, lats: np.ndarray, lons: np.ndarray, unknown: str = "Unknown") -> np.ndarray:
+        """
+        Returns the zone in which each coordinate is located, only checking the candidate zones
+        of the grid cell of each coordinate.
+
+        Parameters:
+            lats (np.ndarray): Latitudes of the devices.
+            lons (np.ndarray): Longitudes of the devices.
+            unknown (str, optional): Value returned for the devices outside all the zones. Default is "Unknown".
+
+        Returns:
+            np.ndarray: Array of strings with the zone name of each device.
+        """
+
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+
+        # The last position is used for the devices without zone
+        zone_labels = np.array(self.zone_names + [unknown], dtype=object)
+        zone_pos_out = np.full(len(lats), len(self.zone_names), dtype=int)
+
+        # Only the devices inside the grid can belong to a zone
+        points = np.flatnonzero(self.in_bounds(lats, lons))
+        rows, cols = self.cell_coordinates(lats[points], lons[points])
+        point_cells = rows * self.n_cols + cols
+
+        # Group the devices by cell
+        order = np.argsort(point_cells, kind="stable")
+        points = points[order]
+        point_cells = point_cells[order]
+        cells, cells_first = np.unique(point_cells, return_index=True)
+        cells_last = np.append(cells_first[1:], len(points))
+
+        for cell, first, last in zip(cells, cells_first, cells_last):
+            candidates = self.cell_zones[self.cell_start[cell]:self.cell_start[cell + 1]]
+            if len(candidates) == 0:
+                continue
+
+            cell_points = points[first:last]
+            lat = lats[cell_points, None]
+            lon = lons[cell_points, None]
+
+            # Matrix (devices x candidate zones) indicating if each device is inside each zone
+            inside = ((self.lat_min[candidates] <= lat) & (lat <= self.lat_max[candidates]) &
+                      (self.lon_min[candidates] <= lon) & (lon <= self.lon_max[candidates]))
+            self.refine_inside(inside, candidates, lats[cell_points], lons[cell_points])
+
+            # Apply the exclusions. A device inside an excluded zone is inside its bounding box,
+            # so the excluded zone is also a candidate of the cell
+            if self.exclusions:
+                raw_inside = inside.copy()
+                candidates_list = list(candidates)
+                for zone_pos, excluded_pos in self.exclusions.items():
+                    if zone_pos not in candidates_list:
+                        continue
+                    excluded_columns = [candidates_list.index(pos) for pos in excluded_pos if pos in candidates_list]
+                    if excluded_columns:
+                        inside[:, candidates_list.index(zone_pos)] &= ~raw_inside[:, excluded_columns].any(axis=1)
+
+            # The last matching zone wins (candidates are sorted in precedence order)
+            n_candidates = len(candidates)
+            last_match = n_candidates - 1 - np.argmax(inside[:, ::-1], axis=1)
+            matched = inside.any(axis=1)
+            zone_pos_out[cell_points[matched]] = candidates[last_match[matched]]
+
+        return zone_labels[zone_pos_out]
+
+    def zone_bounds(self, zone: str) -> list:
+        """
+        Returns the bounding box of a zone as [[lat_min, lon_min], [lat_max, lon_max]].
+
+        Parameters:
+            zone (str): Name of the zone.
+
+        Returns:
+            list: South-west and north-east corners of the zone.
+        """
+
+        zone_pos = self.zone_names.index(zone)
+
+        return [[self.lat_min[zone_pos], self.lon_min[zone_pos]], [self.lat_max[zone_pos], self.lon_max[zone_pos]]]
+
+    def zone_outlines(self, zone: str) -> list:
+        """
+        Returns the outline rings of a zone as lists of [lat, lon] positions (the rectangle
+        vertices for rectangle zones).
+
+        Parameters:
+            zone (str): Name of the zone.
+
+        Returns:
+            list: List of rings, each one a list of [lat, lon] positions.
+        """
+
+        zone_pos = self.zone_names.index(zone)
+        rings = self.zone_rings[zone_pos]
+
+        if rings is None:
+            lat_min, lat_max = self.lat_min[zone_pos], self.lat_max[zone_pos]
+            lon_min, lon_max = self.lon_min[zone_pos], self.lon_max[zone_pos]
+            return [[[lat_max, lon_min], [lat_max, lon_max], [lat_min, lon_max], [lat_min, lon_min]]]
+
+        return [np.column_stack([ring_lats, ring_lons]).tolist() for ring_lats, ring_lons in rings]
+
+    def center(self,) -> list:
+        """
+        Returns the center of the bounding box of all the zones.
+
+        Parameters:
+            None
+
+        Returns:
+            list: [lat, lon] of the center.
+        """
+
+        return [(self.bounds[0] + self.bounds[1]) / 2, (self.bounds[2] + self.bounds[3]) / 2]
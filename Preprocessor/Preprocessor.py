@@ -3,18 +3,55 @@ import shutil
 import copy
 
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, time
 import numpy as np
 import random
+import argparse
+import threading
+import time as timer
 from scipy.spatial import cKDTree
 
-from deep_translator import GoogleTranslator
+from Node_classifier.zone_index import ZoneIndex
+from Node_classifier import zone_index, node_classifier
+from Node_classifier.node_classifier import read_classified_nodes, read_classified_nodes_file
+
+from Preprocessor.translator import Translator
+from Preprocessor.stage_graph import StageGraph
+from Preprocessor.processed_data_store import ProcessedDataStore, write_last_run
+from Preprocessor import units, translator
+from Preprocessor.units import convert_weather_units
+from Preprocessor.stage_cache import StageCache
 from langdetect import detect
 import pycountry
 
 
+# Multiplier of the moon illumination of each moon phase (any other phase has a multiplier of 3)
+MOON_PHASE_MULTIPLIERS = {"New Moon": 1, "First Quarter": 2, "Third Quarter": 2}
+
+# Processed sky data of the next day, merged in this order by merge_sky_data
+SKY_DATA_FILES = ["weather_next_data_processed.csv", "light_prices_processed.csv", "moon_phases_processed.csv",
+                  "moonrise_moonset_processed.csv", "sunrise_sunset_processed.csv"]
+
+# Processed weather data of the previous day
+PREVIOUS_DATA_FILE = "weather_previous_data_processed.csv"
+
+# Number of days of weather data before each target day (including it) saved as its previous data
+PREVIOUS_DAYS = 3
+
+# Columns with times of the day compared with the "Hour" of each row
+TIME_COLUMNS = ["Hour", "Moonset", "Moonrise", "Sunset", "Sunrise", "Start_civil_twilight", "End_civil_twilight"]
+
+# Columns of the raw weather data that are not kept: the history (previous weather and next weather in debug mode)
+# and the forecast (next weather in prod mode) of the weather spider
+WEATHER_HISTORY_DROP_COLUMNS = ["Unnamed: 0", "temp_farenheit", "dew_point_farenheit", "wind", "wind_vel", "wind_gust", "Date", "precip_inches", "pressure_inches"]
+WEATHER_FORECAST_DROP_COLUMNS = ["Unnamed: 0", "temp_farenheit", "feels_like_farenheit", "dew_point_farenheit", "wind_vel", "Date", "precip_inches", "pressure_inches"]
+
+# Formats of the output data: a columnar store partitioned by date and zone (see processed_data_store.py)
+# or the legacy CSV files of each zone
+OUTPUT_FORMATS = ["parquet", "csv"]
+
 class Preprocessor:
-    def __init__(self, mode, events_source):
+    def __init__(self, mode, events_source, translation_backend="google", write_temp_data=False, stage_workers=None, start_date=None, end_date=None, output_format="parquet", use_stage_cache=False):
         #Mode debug or prod
         self.mode = mode
 
@@ -35,6 +72,50 @@ class Preprocessor:
         # Initialize a list to store zones (not shown how it is used here)
         self.zones = []
 
+        # JSON with the coordinates vertices of the zones (copied from the Node Classifier output)
+        self.zone_coordinates_file_name = "zone_coordinates.json"
+
+        # Spatial index over the zones, shared with the NodeClassifier (built on first use)
+        self.zone_index = None
+
+        # Events of each events file located in their zone (located once for all the zones, see locate_events)
+        self.located_events = {}
+
+        # Backend used to translate the events ("google" or "identity", see translator.py)
+        # and translator with a persistent cache of translations (created on first use)
+        self.translation_backend = translation_backend
+        self.translator = None
+
+        # Intermediate data of each stage, kept in memory and passed directly to the next stages
+        # (file name in the temp_data folder -> DataFrame). The CSV files are only written if write_temp_data is True (debug)
+        self.temp_data = {}
+        self.write_temp_data = write_temp_data
+
+        # Maximum number of preprocessing stages run at the same time (1 runs them one after another)
+        # and start and duration of each stage of the last run of preprocess_data
+        self.stage_workers = stage_workers
+        self.stage_timings = {}
+
+        # Date-range mode: preprocess all the days from start_date to end_date ("YYYY-MM-DD", both included) at once
+        # and save the output of each day in its own folder. If start_date is None, only the current day is preprocessed
+        self.start_date = pd.Timestamp(start_date) if start_date is not None else None
+        self.end_date = pd.Timestamp(end_date) if end_date is not None else self.start_date
+        if self.start_date is not None and self.end_date < self.start_date:
+            raise ValueError("The end_date can not be before the start_date")
+
+        # Format of the output data ("parquet" saves the store of processed data, "csv" the files of each zone)
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format '{output_format}'. Use 'parquet' or 'csv'")
+        self.output_format = output_format
+
+        # Cache of the outputs of the stages that read the input files (see stage_cache.py): the stages whose input
+        # files, parameters and code have not changed since a previous run load their outputs instead of recomputing them
+        self.stage_cache = StageCache(code_files=[__file__, units.__file__, translator.__file__, zone_index.__file__,
+                                                  node_classifier.__file__]) if use_stage_cache else None
+
+        # Outputs stored by the stage running in each thread (to save them in the stage cache)
+        self.stage_outputs = threading.local()
+
 
     #GET INPUT DATA
     def get_input_data(self,):
@@ -69,11 +150,16 @@ class Preprocessor:
         self.copy_files_to_input_data(lightprice_data_path)
         self.copy_files_to_input_data(rss_data_path)
         self.copy_files_to_input_data(events_data_path)
+
+        # Copy the zone coordinates used to classify the nodes (needed to locate the events in the zones)
+        src_file = os.path.join(nodeclassifier_data_path, self.zone_coordinates_file_name)
+        if os.path.isfile(src_file):
+            shutil.copy2(src_file, os.path.join(self.input_data_path, self.zone_coordinates_file_name))
         
     # >> UTILS GIP
     def copy_files_to_input_data(self, source_dir):
         """
-        Method to copy CSV files from the source directory to the "input_data" folder.
+        Method to copy CSV (and parquet) files from the source directory to the "input_data" folder.
 
         Parameters:
             source_dir (str): The absolute path of the source directory containing CSV files.
@@ -84,18 +170,225 @@ class Preprocessor:
 
         # Iterate over the files in the source directory
         for file_name in os.listdir(source_dir):
-            # Check if the file is a CSV file
-            if file_name.endswith(".csv"):
+            # Check if the file is a CSV or parquet file
+            if file_name.endswith(".csv") or file_name.endswith(".parquet"):
                 src_file = os.path.join(source_dir, file_name)
                 dst_file = os.path.join(self.input_data_path, file_name)
                 # Check if the file is a regular file before copying it
                 if os.path.isfile(src_file):
                     shutil.copy2(src_file, dst_file)
 
+    def get_zone_index(self,):
+        """
+        Returns the ZoneIndex over the zones of zone_coordinates.json, building it on first use.
+        If the zone coordinates are not available returns None.
+
+        Parameters:
+            None
+
+        Returns:
+            ZoneIndex: The spatial index over the zones of the municipality (or None).
+        """
+
+        if self.zone_index is None:
+            json_file = os.path.join(self.input_data_path, self.zone_coordinates_file_name)
+            if os.path.isfile(json_file):
+                self.zone_index = ZoneIndex.from_json(json_file)
+
+        return self.zone_index
+
+    def get_translator(self,):
+        """
+        Returns the Translator of the events (with the persistent translation cache), creating it on first use.
+
+        Parameters:
+            None
+
+        Returns:
+            Translator: The translator of the events.
+        """
+
+        if self.translator is None:
+            self.translator = Translator(self.translation_backend)
+
+        return self.translator
+
+    def store_temp_data(self, df, file_name):
+        """
+        Stores the intermediate data of a stage in memory so the next stages can use it directly.
+        If write_temp_data is True it is also saved as a CSV file in the temp_data folder (to debug the stages).
+
+        Parameters:
+            df (pd.DataFrame): The processed data of the stage.
+            file_name (str): The name of its file in the temp_data folder.
+
+        Returns:
+            None
+        """
+
+        self.temp_data[file_name] = df
+
+        # Keep the outputs of the stage for the stage cache
+        stage_outputs = getattr(self.stage_outputs, "outputs", None)
+        if stage_outputs is not None:
+            stage_outputs[file_name] = df
+
+        if self.write_temp_data:
+            if not os.path.exists(self.temp_data_path):
+                os.makedirs(self.temp_data_path)
+
+            dst_file = os.path.join(self.temp_data_path, file_name)
+            df.to_csv(dst_file, index=False)
+
+    def load_temp_data(self, file_name):
+        """
+        Returns the intermediate data of a stage. If the stage has not been run by this Preprocessor,
+        the data is read from its CSV file in the temp_data folder (if it exists).
+
+        Parameters:
+            file_name (str): The name of the file of the data in the temp_data folder.
+
+        Returns:
+            pd.DataFrame: The processed data of the stage (or None if it is not available).
+        """
+
+        if file_name in self.temp_data:
+            return self.temp_data[file_name]
+
+        file_path = os.path.join(self.temp_data_path, file_name)
+        if os.path.isfile(file_path):
+            return pd.read_csv(file_path)
+
+        return None
+
+    def cached_stage(self, stage_name, function, input_files, params=None):
+        """
+        Wraps the function of a stage that reads input files with the stage cache: if its input files, parameters
+        and the code have not changed since a cached run, its outputs are loaded from the cache (and stored as if
+        the stage had run); otherwise the stage runs and its outputs are saved in the cache.
+        Without stage cache the function is returned unchanged.
+
+        Parameters:
+            stage_name (str): Name of the stage.
+            function (callable): Function (without arguments) that runs the stage.
+            input_files (list): Names of the files of the input_data folder read by the stage.
+            params (callable, optional): Function that returns the parameters of the stage that are not common to all
+                                         the stages (called when the stage runs, after the stages it depends on).
+
+        Returns:
+            callable: The function of the stage.
+        """
+
+        if self.stage_cache is None:
+            return function
+
+        def run_cached_stage():
+            # Parameters common to all the stages: mode and days to preprocess
+            stage_params = {"mode": self.mode, "date_range": self.start_date is not None,
+                            "target_days": [day.strftime("%Y-%m-%d") for day in self.get_target_days()]}
+            if params is not None:
+                stage_params.update(params())
+
+            key = self.stage_cache.key(stage_name, [os.path.join(self.input_data_path, file_name) for file_name in input_files],
+                                       stage_params)
+
+            # Store the cached outputs
+            outputs = self.stage_cache.load(stage_name, key)
+            if outputs is not None:
+                for file_name, df in outputs.items():
+                    self.store_temp_data(df, file_name)
+                return
+
+            # Run the stage keeping the outputs it stores
+            self.stage_outputs.outputs = {}
+            start = timer.perf_counter()
+            try:
+                function()
+                outputs = self.stage_outputs.outputs
+            finally:
+                self.stage_outputs.outputs = None
+
+            self.stage_cache.save(stage_name, key, outputs, timer.perf_counter() - start)
+
+        return run_cached_stage
+
+    def time_strings(self, series):
+        """
+        Converts the times of the day (datetime.time) of a column to strings with the format "HH:MM:SS",
+        the same values read from the CSV files, so the columns can be merged and compared whatever their source.
+
+        Parameters:
+            series (pd.Series): Column with times of the day (datetime.time or str).
+
+        Returns:
+            pd.Series: The column with the times as strings (the other values are not changed).
+        """
+
+        return series.map(lambda value: str(value) if isinstance(value, time) else value)
+
+    def get_target_days(self,):
+        """
+        Returns the days to preprocess: each one of the days of the date range (date-range mode) or only the current day.
+
+        Parameters:
+            None
+
+        Returns:
+            list: The days to preprocess (datetime).
+        """
+
+        # Date-range mode
+        if self.start_date is not None:
+            return list(pd.date_range(self.start_date.normalize(), self.end_date.normalize(), freq="D").to_pydatetime())
+
+        #PROD. CODE
+        if self.mode == "prod":
+            current_date = datetime.combine(datetime.now().date(), time())
+
+
+        #DEBUG. CODE
+        if self.mode == "debug":
+            current_date = datetime(year=2023, month=6, day=26)
+        #---------------
+
+        return [current_date]
+
+    def get_target_dates(self,):
+        """
+        Returns the dates whose data is needed: each target day and the day after it.
+
+        Parameters:
+            None
+
+        Returns:
+            list: The sorted dates (datetime).
+        """
+
+        target_days = self.get_target_days()
+
+        return sorted(set(target_days) | {day + timedelta(days=1) for day in target_days})
+
+    def filter_target_dates(self, df):
+        """
+        Selects the rows of the target dates (see get_target_dates) of a DataFrame with "Year", "Month" and "Day" columns.
+
+        Parameters:
+            df (pd.DataFrame): The data to filter.
+
+        Returns:
+            pd.DataFrame: The rows of the target dates.
+        """
+
+        dates = pd.to_datetime(pd.DataFrame({"year": df["Year"], "month": df["Month"], "day": df["Day"]}))
+
+        return df[dates.isin(self.get_target_dates()).values]
+
     #PREPROCESS DATA
     def preprocess_data(self):
         """
-        Method to preprocess the input data for the Preprocessor.
+        Method to preprocess the input data for the Preprocessor. The preprocessing steps are run as a graph of
+        stages (see stage_graph.py): the steps of each input are independent and run concurrently, and the merges
+        wait for the data they need. The time of each stage is reported at the end.
 
         Parameters:
             None
@@ -104,92 +397,169 @@ class Preprocessor:
             None
         """
 
-        # Preprocess the node classifier data
-        self.preprocess_node_classifier_data("classified_nodes.csv")
-        
-        # Preprocess the RSS data (commented out)
-        #self.preprocess_rss_data("rss_canyelles.csv")
-        
         # Preprocess the Google events data for each zone
         if self.events_source == "google":
             events_filename = "google_events.csv"
         else:
             events_filename = "fake_events.csv"
 
-        for zone in self.zones:
-            self.preprocess_events_data(events_filename, zone=zone, sampling=random.choice(range(1,5)))
+        graph = StageGraph(max_workers=self.stage_workers)
+
+        # Preprocess the node classifier data
+        graph.add_stage("node_classifier", self.preprocess_node_classifier_data, outputs=["classified_nodes"])
+
+        # Preprocess the RSS data (commented out)
+        #graph.add_stage("rss", lambda: self.preprocess_rss_data("rss_canyelles.csv"), outputs=["rss"])
+
+        # Preprocess the events data of each zone (needs the zones of the node classifier data).
+        # The events of each zone are sampled at random, so a cached run reuses the sample of the run that cached it
+        graph.add_stage("events", self.cached_stage("events", lambda: self.preprocess_all_events_data(events_filename, sampling=lambda: random.choice(range(1,5))),
+                                                    [events_filename, self.zone_coordinates_file_name, "classified_nodes.parquet", "classified_nodes.csv"],
+                                                    lambda: {"zones": [str(zone) for zone in self.zones], "sampling": "random 1-4",
+                                                             "translation_backend": self.translation_backend}),
+                        inputs=["classified_nodes"], outputs=["events"])
 
         # Preprocess weather data for the previous day
-        self.preprocess_weather_previous_data("weather_previous.csv")
+        graph.add_stage("weather_previous", self.cached_stage("weather_previous", lambda: self.preprocess_weather_previous_data("weather_previous.csv"), ["weather_previous.csv"]),
+                        outputs=["weather_previous"])
 
         # Preprocess weather data for the next day 
-        self.preprocess_weather_next_data("weather_next.csv")
-        
+        graph.add_stage("weather_next", self.cached_stage("weather_next", lambda: self.preprocess_weather_next_data("weather_next.csv"), ["weather_next.csv"]),
+                        outputs=["weather_next"])
+
         # Preprocess moon phases data 
-        self.preprocess_moon_phases("moon_phases.csv")
-        
+        graph.add_stage("moon_phases", self.cached_stage("moon_phases", lambda: self.preprocess_moon_phases("moon_phases.csv"), ["moon_phases.csv"]),
+                        outputs=["moon_phases"])
+
         # Preprocess moonrise and moonset data    
-        self.preprocess_moonrise_moonset("moonrise_moonset.csv")
-        
+        graph.add_stage("moonrise_moonset", self.cached_stage("moonrise_moonset", lambda: self.preprocess_moonrise_moonset("moonrise_moonset.csv"), ["moonrise_moonset.csv"]),
+                        outputs=["moonrise_moonset"])
+
         # Preprocess sunrise and sunset data
-        self.preprocess_sunrise_sunset("sunrise_sunset.csv")
-        
+        graph.add_stage("sunrise_sunset", self.cached_stage("sunrise_sunset", lambda: self.preprocess_sunrise_sunset("sunrise_sunset.csv"), ["sunrise_sunset.csv"]),
+                        outputs=["sunrise_sunset"])
+
         # Preprocess light prices data
-        self.preprocess_light_prices("light_prices.csv")
-      
+        graph.add_stage("light_prices", self.cached_stage("light_prices", lambda: self.preprocess_light_prices("light_prices.csv"), ["light_prices.csv"]),
+                        outputs=["light_prices"])
+
         # Merge sky-related data (next day's weather, moon phases, sunrise, sunset, etc.)
-        self.merge_sky_data()
-        
+        graph.add_stage("merge_sky_data", self.merge_sky_data,
+                        inputs=["weather_previous", "weather_next", "moon_phases", "moonrise_moonset", "sunrise_sunset", "light_prices"],
+                        outputs=["sky_data"])
+
         # Aggregate sky-related metrics
-        self.aggregated_sky_metrics()
+        graph.add_stage("aggregated_sky_metrics", self.aggregated_sky_metrics, inputs=["sky_data"], outputs=["sky_metrics"])
 
         # Merge events data for each zone
-        self.merge_events_data()
+        graph.add_stage("merge_events_data", self.merge_events_data, inputs=["sky_metrics", "classified_nodes", "events"], outputs=["zones_data"])
+
+        self.stage_timings = graph.run()
+
+        # Report the time of each stage (and the hits and misses of the stage cache)
+        print(graph.report())
+        if self.stage_cache is not None:
+            print(self.stage_cache.report())
 
     # >> UTILS PREPROCCESS DATA
-    def preprocess_node_classifier_data(self, file_name,):
+    def preprocess_node_classifier_data(self, file_name=None,):
         """
         Method to preprocess the node classifier data and 
-        save the processed data as a new CSV file.
+        store the processed data (temp_data): the nodes of each zone, one row per node
+        with its "id", "type", "ebox_id", "lat", "lon" and "zone".
 
         Parameters:
-            file_name (str): The name of the CSV file containing the node classifier data.
+            file_name (str, optional): The name of the file (parquet or csv) containing the node classifier data.
+                                       By default the most recent classified_nodes file of the input_data folder.
 
         Returns:
             None
         """
 
-        # Read data from the node classifier CSV file
-        csv_file = os.path.join(self.input_data_path, file_name)
-        df = pd.read_csv(csv_file)
+        # Read data from the node classifier file (parquet or csv)
+        if file_name:
+            df = read_classified_nodes_file(os.path.join(self.input_data_path, file_name))
+        else:
+            df = read_classified_nodes(self.input_data_path)
 
         # Get unique zones
         self.zones = list(df.zone.unique())
-        
-        # Define aggregation functions for each column
-        agg_functions = {
-            'id': lambda x: list(x),
-            'type': lambda x: list(x),
-            'ebox_id': lambda x: list(x),
-            'coordinates': lambda x: list(x)   
-        }
-        
-        # Group data by 'zone' and apply aggregation functions
-        grouped_df = df.groupby('zone').agg(agg_functions).reset_index()
 
-        # Rename the aggregated columns
-        grouped_df.rename(columns={
-            'id': 'id_list',
-            'type': 'type_list',
-            'ebox_id': 'ebox_id_list',
-            'coordinates': 'coordinates_list'
-        }, inplace=True)
+        # Zone of each node (a normalized table joined with the hourly data of each zone by the "zone" column,
+        # instead of the lists of nodes of the zone repeated in every hour)
+        df_nodes = pd.DataFrame({"id": df["id"].values, "type": df["type"].astype(str).values, "ebox_id": df["ebox_id"].values,
+                                 "lat": df["lat"].values, "lon": df["lon"].values, "zone": df["zone"].astype(str).values})
+
+        # Store the processed data (temp_data)
+        self.store_temp_data(df_nodes, "classified_nodes_processed.csv")
 
-        # Save the processed data to a new CSV file
-        file_name = "classified_nodes_processed.csv"
-        dst_file = os.path.join(self.temp_data_path, file_name)
-        grouped_df.to_csv(dst_file, index=False)          
 
+    def locate_events(self, file_name) -> pd.DataFrame:
+        """
+        Reads the events of a CSV file and locates each one in a zone of the municipality. The events are
+        read and located once and reused for all the zones.
+
+        Parameters:
+            file_name (str): The name of the CSV file containing event data.
+
+        Returns:
+            pd.DataFrame: The events with a new "zone" column.
+        """
+
+        if file_name in self.located_events:
+            return self.located_events[file_name]
+
+        # Read data from the CSV file
+        csv_file = os.path.join(self.input_data_path, file_name)
+        df = pd.read_csv(csv_file)
+
+        # Read the classified nodes (the zones with illumination)
+        df_nodes_zone = read_classified_nodes(self.input_data_path, columns=["lat", "lon", "zone"])
+
+        # Locate each event inside the zones of the municipality using the ZoneIndex
+        zone_index = self.get_zone_index()
+        if zone_index is not None:
+            df['zone'] = zone_index.classify(df['lat'].values, df['lon'].values)
+        else:
+            df['zone'] = "Unknown"
+
+        # For the events outside the zones with illumination, find the zone of the illumination closest 
+        # to each event's location using cKDTree (built once for all the events)
+        outside = ~df['zone'].isin(df_nodes_zone['zone'].unique())
+        if outside.any():
+            tree = cKDTree(df_nodes_zone[['lat', 'lon']])
+            _, indices = tree.query(df.loc[outside, ['lat', 'lon']])
+            df.loc[outside, 'zone'] = df_nodes_zone['zone'].astype(str).values[indices]
+
+        self.located_events[file_name] = df
+
+        return df
+
+    def preprocess_all_events_data(self, file_name, sampling=None):
+        """
+        Preprocesses Google events data from a CSV file for all the zones. The events are located once and
+        split by zone with a single group-by, so the cost grows with the number of events and not with zones x events.
+
+        Parameters:
+            file_name (str): The name of the CSV file containing event data.
+            sampling (int or callable, optional): The number of events to sample in each zone, or a function
+                                                  called for each zone that returns it. If None, all events are considered.
+
+        Returns:
+            None
+        """
+
+        df = self.locate_events(file_name)
+
+        # Split the events by zone
+        events_by_zone = dict(tuple(df.groupby("zone", sort=False)))
+
+        for zone in self.zones:
+            # Zones without events get an empty DataFrame (and an empty output file)
+            df_zone = events_by_zone.get(zone, df.iloc[0:0])
+            zone_sampling = sampling() if callable(sampling) else sampling
+
+            self.preprocess_zone_events_data(df_zone, zone, zone_sampling)
 
     def  preprocess_events_data(self, file_name, zone, sampling=None):
         """
@@ -204,21 +574,25 @@ class Preprocessor:
             None
         """
 
-        # Read data from the CSV file
-        csv_file = os.path.join(self.input_data_path, file_name)
-        df = pd.read_csv(csv_file)
+        # Locate the events (only the first time) and filter data for the current zone
+        df = self.locate_events(file_name)
+        df = df[df["zone"] == zone]
 
-        # Find the zone of the illumination closest to each event's location
-        csv_file = os.path.join(self.input_data_path, "classified_nodes.csv")
-        df_nodes_zone = pd.read_csv(csv_file)
+        self.preprocess_zone_events_data(df, zone, sampling)
 
-        # Use cKDTree to find nearest zones
-        tree = cKDTree(df_nodes_zone[['lat', 'lon']])
-        _, indices = tree.query(df[['lat', 'lon']])
-        df['zone'] = df_nodes_zone.loc[indices, 'zone'].values
+    def preprocess_zone_events_data(self, df, zone, sampling=None):
+        """
+        Preprocesses the Google events of a zone: samples, translates and expands them into one row per hour
+        and stores them (temp_data).
 
-        # Filter data for the current zone
-        df = df[df["zone"] == zone]
+        Parameters:
+            df (pd.DataFrame): The located events of the zone (see locate_events).
+            zone (str): The zone of the events.
+            sampling (int, optional): The number of events to sample. If None, all events in the zone are considered.
+
+        Returns:
+            None
+        """
 
         # If a sampling has been indicated, we reduce the number of events to the indicated sampling
         if sampling:
@@ -245,91 +619,33 @@ class Preprocessor:
             if detected_lang_code != 'en':
                 print(f"Translating events from {detected_lang_name} to English...")
 
-                # > Initialize the translator
-                translator = GoogleTranslator(source='auto', target='en')
-
-                # > Apply translation with retries to each column
-                df['Title'] = df['Title'].apply(lambda x: translator.translate(x))
-                df['Location'] = df['Location'].apply(lambda x: translator.translate(x))
-                df['Description'] = df['Description'].apply(lambda x: translator.translate(x))
-
-        #PROD. CODE
-        if self.mode == "prod":
-            # Get the current date and time
-            current_date = datetime.now()
-            current_year = current_date.year
-            current_month = current_date.month
-            current_day = current_date.day
-        
-
-        #DEBUG. CODE
-        if self.mode == "debug":
-            current_date = datetime(year=2023, month=6, day=26)
-            current_year = current_date.year
-            current_month = current_date.month
-            current_day = current_date.day
-        #---------------
-
-        new_data = []
-        # Iterate over the rows of the DataFrame
-        for index, row in df.iterrows():
-
-            hour_range = row['Schedule']
-
-            start_time, end_time = hour_range.split('-')
-                    
-            # Convert the times into datetime objects
-            start_time = datetime.strptime(((datetime.strptime(start_time, '%H:%M').time()).strftime('%H:%M:%S')), '%H:%M:%S')
-            end_time = datetime.strptime(((datetime.strptime(end_time, '%H:%M').time()).strftime('%H:%M:%S')), '%H:%M:%S' )
-
-            # Truncate date_hours
-            start_time_truncated = self.truncate_hour(start_time)
-            end_time_truncated = self.truncate_hour(end_time)
-
-            # Calculate the time difference between the start time and end time
-            time_diff = end_time - start_time
-
-            # Extract common columns
-            title = row["Title"]
-            location = row["Location"]
-            description = row["Description"]
-            zone = row["zone"]
-            lat = row["lat"]
-            lon = row["lon"]
-
-            # Iterate over the range of hours to create 
-            # as many rows as there are hours between the original time range
-            num_hours = int(time_diff.seconds // 3600)+1
-            change_day=False
-            for hour in range(num_hours):
-
-                new_row = []
-                
-                act_hour = start_time_truncated + timedelta(hours=hour)
-                act_hour = pd.Timestamp(act_hour)
-                act_hour = act_hour.time()
-
-                if act_hour == (pd.Timestamp('00:00:00')).time():
-                    change_day=True
-
-                if change_day:
-                    act_date = current_date + timedelta(days=1)
-                    act_year = act_date.year
-                    act_month = act_date.month
-                    act_day = act_date.day
-                else:
-                    act_year = current_year
-                    act_month = current_month
-                    act_day = current_day
-
-
-                new_row = [title, location, description, zone, lat, lon, act_year, act_month, act_day, act_hour]
-                new_data.append(new_row)
-
-        # Create new df
-        processed_df = pd.DataFrame(new_data, columns=["event_title", "event_location", "event_description", "event_zone", "event_lat", "event_lon", "Year", "Month", "Day", "Hour"])
-        processed_df["Day"] = processed_df["Day"].replace({14: 26, 15: 27})
-        processed_df["Month"] = processed_df["Month"].replace({7: 6})
+                # > Get the translator (only the texts that are not in the translation cache are sent, in batches)
+                translator = self.get_translator()
+
+                # > Apply translation to each column
+                df = df.copy()
+                df['Title'] = translator.translate(df['Title'].tolist(), target='en')
+                df['Location'] = translator.translate(df['Location'].tolist(), target='en')
+                df['Description'] = translator.translate(df['Description'].tolist(), target='en')
+
+        # The events take place in the (first) target day. In date-range mode, the events with a "Date" column
+        # take place in their date
+        target_days = self.get_target_days()
+        current_date = target_days[0]
+        if self.start_date is not None and "Date" in df.columns:
+            current_date = pd.to_datetime(df["Date"]).values
+        elif len(target_days) > 1 and len(df) > 0:
+            # The events of the generator and of Google have no "Date" column: the later days of the range have no events
+            print(f"Warning: the events of zone {zone} have no \"Date\" column, all of them take place in the first day "
+                  f"of the range ({current_date.strftime('%Y-%m-%d')}) and the other days have no events")
+
+        # Expand the events into as many rows as there are hours in their schedule
+        processed_df = self.expand_event_hours(df, current_date)
+
+        # The events of the generator take place in July 14 and 15 (DEBUG. CODE, not in date-range mode)
+        if self.mode == "debug" and self.start_date is None:
+            processed_df["Day"] = processed_df["Day"].replace({14: 26, 15: 27})
+            processed_df["Month"] = processed_df["Month"].replace({7: 6})
 
         # Group by Year, Month, Day, and Hour, and create lists of the corresponding values
         if len(processed_df) > 0:
@@ -356,33 +672,69 @@ class Preprocessor:
 
 
 
-        # Save the processed data to a CSV file
-        file_name = f'google_events_processed_{zone}.csv'
-        dst_file = os.path.join(self.temp_data_path, file_name)
-        grouped_df.to_csv(dst_file, index=False)    
+        # Store the processed data (temp_data)
+        self.store_temp_data(grouped_df, f'google_events_processed_{zone}.csv')
 
-    def truncate_hour(self, date_hour):
+    def expand_event_hours(self, df, current_date):
         """
-        Truncates the given datetime object to the nearest hour.
+        Expands each event into one row per hour of its schedule ("HH:MM-HH:MM"), from the hour of its start
+        (truncated) to the hour of its end. The schedules of all the events are parsed at once. The hours after
+        midnight (and all the hours of the events starting at midnight) are assigned to the day after their day.
 
         Parameters:
-            date_hour (datetime): The datetime object to truncate.
+            df (pd.DataFrame): The events with the Schedule, Title, Location, Description, zone, lat and lon columns.
+            current_date (datetime or array): The day of the events (or the day of each event).
 
         Returns:
-            datetime: The truncated datetime object with minutes set to 0.
+            pd.DataFrame: One row per event and hour with the event columns and the Year, Month, Day and Hour (datetime.time).
         """
-            
-        # Extract the hour and minutes
-        hour = date_hour.hour
-        minutes = date_hour.minute
-
-        # Truncate to the nearest hour
-        minutes = 0
 
-        # Create the new datetime object
-        date_hour_truncated = date_hour.replace(minute=minutes)
-
-        return date_hour_truncated
+        columns = ["event_title", "event_location", "event_description", "event_zone", "event_lat", "event_lon", "Year", "Month", "Day", "Hour"]
+
+        if len(df) == 0:
+            return pd.DataFrame([], columns=columns)
+
+        # Parse the start and end times of all the schedules
+        schedules = df['Schedule'].str.split('-', expand=True)
+        if schedules.shape[1] != 2:
+            raise ValueError("The schedules of the events must have the format 'HH:MM-HH:MM'")
+
+        start_time = pd.to_datetime(schedules[0], format='%H:%M')
+        end_time = pd.to_datetime(schedules[1], format='%H:%M')
+
+        start_hour = start_time.dt.hour.values
+        start_minutes = start_hour * 60 + start_time.dt.minute.values
+        end_minutes = end_time.dt.hour.values * 60 + end_time.dt.minute.values
+
+        # Number of hours of each event (the schedules ending before their start end on the next day)
+        duration_minutes = (end_minutes - start_minutes) % (24 * 60)
+        num_hours = duration_minutes // 60 + 1
+
+        # Repeat each event once per hour and compute the offset of each row from the start of its event
+        event_position = np.repeat(np.arange(len(df)), num_hours)
+        hour_offset = np.arange(len(event_position)) - np.repeat(np.cumsum(num_hours) - num_hours, num_hours)
+
+        # Hours after midnight belong to the next day
+        act_hour = start_hour[event_position] + hour_offset
+        change_day = (start_hour[event_position] == 0) | (act_hour >= 24)
+        act_hour = act_hour % 24
+
+        # Day of each row (the day of its event or the day after it)
+        event_dates = pd.to_datetime(np.broadcast_to(np.asarray(current_date, dtype="datetime64[ns]"), (len(df),))).normalize()
+        row_dates = event_dates[event_position] + pd.to_timedelta(change_day.astype(int), unit="D")
+
+        return pd.DataFrame({
+            "event_title": df["Title"].values[event_position],
+            "event_location": df["Location"].values[event_position],
+            "event_description": df["Description"].values[event_position],
+            "event_zone": df["zone"].values[event_position],
+            "event_lat": df["lat"].values[event_position],
+            "event_lon": df["lon"].values[event_position],
+            "Year": row_dates.year.values.astype(np.int64),
+            "Month": row_dates.month.values.astype(np.int64),
+            "Day": row_dates.day.values.astype(np.int64),
+            "Hour": np.array([time(hour) for hour in range(24)], dtype=object)[act_hour]
+        }, columns=columns)
 
     def preprocess_rss_data(self, file_name,):
         """
@@ -412,39 +764,16 @@ class Preprocessor:
         #Delete unrelated variables
         df = df.drop(columns=["Date"], axis=1)
 
-        #Select only act and next day
-
-        #PROD. CODE
-        if self.mode == "prod":
-            current_date = datetime.now().date()
-            next_date = current_date + timedelta(days=1)
+        # Filter RSS data to current and next day (see get_target_dates)
+        filtered_df = self.filter_target_dates(df)
         
-
-        #DEBUG. CODE
-        if self.mode == "debug":
-            current_date = datetime(year=2023, month=6, day=26)
-            next_date = datetime(year=2023, month=6, day=27)
-        #---------------
-
-        # Filter RSS data to current and next day
-        filtered_df = df[
-                    (df["Year"] == current_date.year)
-                    & (df["Month"] == current_date.month)
-                    & (df["Day"] == current_date.day)
-                    | (df["Year"] == next_date.year)
-                    & (df["Month"] == next_date.month)
-                    & (df["Day"] == next_date.day)
-                ]
-        
-        # Save the processed data to a new CSV file
-        file_name = "rss_canyelles_processed.csv"
-        dst_file = os.path.join(self.temp_data_path, file_name)
-        filtered_df.to_csv(dst_file, index=False)    
+        # Store the processed data (temp_data)
+        self.store_temp_data(filtered_df, "rss_canyelles_processed.csv")
 
     def preprocess_weather_previous_data(self, file_name, filter_dates=False, date_min=None, date_max=None):
         """
         Method to preprocess the weather data for the previous day 
-        and save the processed data as a new CSV file.
+        and store the processed data (temp_data).
 
         Parameters:
             file_name (str): The name of the CSV file containing the weather data for the previous day.
@@ -459,47 +788,17 @@ class Preprocessor:
         csv_file = os.path.join(self.input_data_path, file_name)
         df = pd.read_csv(csv_file)
 
-        # Process temperature columns -> F to C
-        df['temp_farenheit'] = df['temp_farenheit'].str.split().str[0].astype(float)
-        df["temp_celsius"] = df["temp_farenheit"].apply(self.farenheit_to_celsius)
+        # Process the weather columns (units, dates and hours)
+        df = self.process_weather_data(df, ["humidity_percent"], WEATHER_HISTORY_DROP_COLUMNS)
 
-        #Process % columns
-        df['humidity_percent'] = df['humidity_percent'].str.split().str[0].astype(float)
-
-        #Process quantity columns
-        df["precip_inches"] = df['precip_inches'].str.split().str[0].astype(float)
-        df["precip_mm"] = df["precip_inches"].apply(self.inches_to_mm)
-
-        df["pressure_inches"] = df['pressure_inches'].str.split().str[0].astype(float)
-        df["pressure_hPa"] = df['pressure_inches'].apply(self.inches_to_hPa)
-
-        #Process str columns
-        df["condition"] = df["condition"].str.lower()
-
-        #Process date components
-        df["Date"] = pd.to_datetime(df["Date"])
-        df["Year"] = df["Date"].dt.year
-        df["Month"] = df["Date"].dt.month
-        df["Day"] = df["Date"].dt.day
-
-        df["Hour"] = pd.to_datetime(df["Hour"], format="%I:%M %p").dt.time
-
-        #Delete unrelated variables
-        df = df.drop(columns=["Unnamed: 0", "temp_farenheit", "dew_point_farenheit", "wind", "wind_vel", "wind_gust", "Date", "precip_inches", "pressure_inches"], axis=1)
-
-        #Sort values by date
-        df = df.sort_values(by=["Year", "Month", "Day"])
-
-        # Save processed data to a new CSV file named "weather_previous_data_processed.csv"
-        file_name = "weather_previous_data_processed.csv"
-        dst_file = os.path.join(self.temp_data_path, file_name)
-        df.to_csv(dst_file, index=False)    
+        # Store the processed data as "weather_previous_data_processed.csv" (temp_data)
+        self.store_temp_data(df, PREVIOUS_DATA_FILE)
 
 
     def preprocess_weather_next_data(self, file_name, filter_dates=False, date_min=None, date_max=None):
         """
         Method to preprocess the weather data for the next day 
-        and save the processed data as a new CSV file.
+        and store the processed data (temp_data).
 
         Parameters:
             file_name (str): The name of the CSV file containing the weather data for the next day.
@@ -516,126 +815,61 @@ class Preprocessor:
         csv_file = os.path.join(self.input_data_path, file_name)
         df = pd.read_csv(csv_file)
 
+        # Process the weather columns (units, dates and hours) of the forecast (prod) or of the history (debug)
         if self.mode == "prod":
-            #Process temperature columns -> F to C
-            df['temp_farenheit'] = df['temp_farenheit'].str.split().str[0].astype(float)
-            df["temp_celsius"] = df["temp_farenheit"].apply(self.farenheit_to_celsius)
-
-            #Process % columns
-            df['precip_percent'] = df['precip_percent'].str.split().str[0].astype(float)
-            df['cloud_cover_percent'] = df['cloud_cover_percent'].str.split().str[0].astype(float)
-            df['humidity_percent'] = df['humidity_percent'].str.split().str[0].astype(float)
-
-            #Process quantity columns
-            df["precip_inches"] = df['precip_inches'].str.split().str[0].astype(float)
-            df["precip_mm"] = df["precip_inches"].apply(self.inches_to_mm)
-
-            df["pressure_inches"] = df['pressure_inches'].str.split().str[0].astype(float)
-            df["pressure_hPa"] = df['pressure_inches'].apply(self.inches_to_hPa)
-
-            #Process str columns
-            df["condition"] = df["condition"].str.lower()
-
-            #Process date components
-            df["Date"] = pd.to_datetime(df["Date"])
-            df["Year"] = df["Date"].dt.year
-            df["Month"] = df["Date"].dt.month
-            df["Day"] = df["Date"].dt.day
-
-            df["Hour"] = pd.to_datetime(df["Hour"], format="%I:%M %p").dt.time
-
-            #Delete unrelated variables
-            df = df.drop(columns=["Unnamed: 0", "temp_farenheit", "feels_like_farenheit", "dew_point_farenheit", "wind_vel", "Date", "precip_inches", "pressure_inches"], axis=1)
-
-            #Sort values by date
-            df = df.sort_values(by=["Year", "Month", "Day"])
+            df = self.process_weather_data(df, ["precip_percent", "cloud_cover_percent", "humidity_percent"], WEATHER_FORECAST_DROP_COLUMNS)
         
         else:
-            # Process temperature columns -> F to C
-            df['temp_farenheit'] = df['temp_farenheit'].str.split().str[0].astype(float)
-            df["temp_celsius"] = df["temp_farenheit"].apply(self.farenheit_to_celsius)
-
-            #Process % columns
-            df['humidity_percent'] = df['humidity_percent'].str.split().str[0].astype(float)
-
-            #Process quantity columns
-            df["precip_inches"] = df['precip_inches'].str.split().str[0].astype(float)
-            df["precip_mm"] = df["precip_inches"].apply(self.inches_to_mm)
-
-            df["pressure_inches"] = df['pressure_inches'].str.split().str[0].astype(float)
-            df["pressure_hPa"] = df['pressure_inches'].apply(self.inches_to_hPa)
+            df = self.process_weather_data(df, ["humidity_percent"], WEATHER_HISTORY_DROP_COLUMNS)
 
-            #Process str columns
-            df["condition"] = df["condition"].str.lower()
+        # In date-range mode, select only the data of the target dates
+        if self.start_date is not None:
+            df = self.filter_target_dates(df)
 
-            #Process date components
-            df["Date"] = pd.to_datetime(df["Date"])
-            df["Year"] = df["Date"].dt.year
-            df["Month"] = df["Date"].dt.month
-            df["Day"] = df["Date"].dt.day
+        # Store the processed data as "weather_next_data_processed.csv" (temp_data)
+        self.store_temp_data(df, "weather_next_data_processed.csv")
 
-            df["Hour"] = pd.to_datetime(df["Hour"], format="%I:%M %p").dt.time
-
-            #Delete unrelated variables
-            df = df.drop(columns=["Unnamed: 0", "temp_farenheit", "dew_point_farenheit", "wind", "wind_vel", "wind_gust", "Date", "precip_inches", "pressure_inches"], axis=1)
-
-            #Sort values by date
-            df = df.sort_values(by=["Year", "Month", "Day"])
-
-        # Save processed data to a new CSV file named "weather_previous_data_processed.csv"
-        file_name = "weather_next_data_processed.csv"
-        dst_file = os.path.join(self.temp_data_path, file_name)
-        df.to_csv(dst_file, index=False)  
-
-    def farenheit_to_celsius(self, degrees_farenheit: float) -> float:
+    def process_weather_data(self, df, percent_columns, drop_columns):
         """
-        Convert a temperature value from Fahrenheit to Celsius.
+        Processes the raw weather data of the weather spider: parses the columns with units and converts them
+        (F to C, inches to mm, inches of mercury to hPa and mph to km/h, see units.py), splits the dates and parses the hours.
 
         Parameters:
-            degrees_fahrenheit (float): The temperature value in Fahrenheit.
+            df (pd.DataFrame): The raw weather data.
+            percent_columns (list): The columns with percentages.
+            drop_columns (list): The raw columns that are not kept.
 
         Returns:
-            float: The temperature value converted to Celsius.       
+            pd.DataFrame: The processed weather data sorted by date.
         """
 
-        # Convert Fahrenheit to Celsius
-        degrees_celsius = (degrees_farenheit - 32) * (5/9)
-        return round(degrees_celsius,2)
-    
-    def inches_to_mm(self, inches:float) -> float:
-        """
-        Convert a length value from inches to millimeters.
+        # Process temperature, % and quantity columns (F to C, inches to mm, inches to hPa and mph to km/h)
+        df = convert_weather_units(df, percent_columns)
 
-        Parameters:
-            inches (float): The length value in inches.
+        #Process str columns
+        df["condition"] = df["condition"].str.lower()
 
-        Returns:
-            float: The length value converted to millimeters.
-        """
+        #Process date components
+        df["Date"] = pd.to_datetime(df["Date"])
+        df["Year"] = df["Date"].dt.year
+        df["Month"] = df["Date"].dt.month
+        df["Day"] = df["Date"].dt.day
 
-        # Convert inches to millimeters
-        mm = inches * 25.4
-        return mm
-    
-    def inches_to_hPa(self, inches:float) -> float:
-        """
-        Convert a pressure value from inches of mercury to hectopascals (hPa).
+        df["Hour"] = pd.to_datetime(df["Hour"], format="%I:%M %p").dt.time
 
-        Parameters:
-            inches (float): The pressure value in inches of mercury.
+        #Delete unrelated variables
+        df = df.drop(columns=drop_columns, axis=1)
 
-        Returns:
-            float: The pressure value converted to hectopascals (hPa).       
-        """
-        
-        # Convert inches of mercury to hectopascals (hPa)
-        hPa = inches * 33.863889532610884
-        return round(hPa,2)
+        #Sort values by date
+        df = df.sort_values(by=["Year", "Month", "Day"])
+
+        return df
 
 
     def preprocess_moon_phases(self, file_name):
         """
-        Preprocess moon phase data from the input CSV file.
+        Preprocess moon phase data from the input CSV file. The phase of the current and next day is looked up
+        in the calendar of phase changes (see moon_phase_calendar and lookup_moon_phases).
 
         Parameters:
             file_name (str): The name of the CSV file containing moon phase data.
@@ -648,167 +882,75 @@ class Preprocessor:
         csv_file = os.path.join(self.input_data_path, file_name)
         df = pd.read_csv(csv_file)
 
-        # Initialize a list to store the converted moon phase data  
-        converted_data = []
+        # Build the calendar with the dates in which the moon phase changes
+        calendar = self.moon_phase_calendar(df)
 
-        # Iterate over the rows in the DataFrame
-        for i, row in df.iterrows():
-            year = row['Year']
-            dates = row[['New Moon', 'First Quarter', 'Full Moon', 'Third Quarter']]
+        # Look up the moon phase of the current and next day (see get_target_dates)
+        filtered_df = self.lookup_moon_phases(calendar, self.get_target_dates())
 
-            # List of possible moon phases in order
-            phases = ["New Moon", "First Quarter", "Full Moon", "Third Quarter"]
-            phases_dates_list = []
+        # Store the filtered data as "moon_phases_processed.csv" (temp_data)
+        self.store_temp_data(filtered_df, "moon_phases_processed.csv")
 
-            # Process each moon phase date and add it to the phases_dates_list if available
-            if not pd.isna(dates['New Moon']):
-                new_moon_date = datetime.strptime(dates['New Moon'], '%d %b')
-                new_moon_date = new_moon_date.replace(year=year)
-                phases_dates_list.append(new_moon_date)
-                new_moon_date_day = new_moon_date.day
-            else:
-                new_moon_date_day = -1
-            
-            # Similar processing for other moon phases
-            if not pd.isna(dates['First Quarter']):
-                first_quarter_date = datetime.strptime(dates['First Quarter'], '%d %b')
-                first_quarter_date = first_quarter_date.replace(year=year)
-                phases_dates_list.append(first_quarter_date)
-                first_quarter_date_day = first_quarter_date.day
-            else:
-                first_quarter_date_day = -1
+    def moon_phase_calendar(self, df) -> pd.DataFrame:
+        """
+        Builds the calendar of moon phase changes from the moon phases data: one row per date in which a phase
+        starts (the "New Moon", "First Quarter", "Full Moon" and "Third Quarter" dates of each row), sorted by date.
+        The dates of a row that are before its first date (a lunation that crosses the new year) belong to the next year.
 
-            if not pd.isna(dates['Full Moon']):
-                full_moon_date = datetime.strptime(dates['Full Moon'], '%d %b')
-                full_moon_date = full_moon_date.replace(year=year)
-                phases_dates_list.append(full_moon_date)
-                full_moon_date_day = full_moon_date.day
-            else:
-                full_moon_date_day = -1
+        Parameters:
+            df (pd.DataFrame): The moon phases data (a "Year" column and a column with the "%d %b" date of each phase).
 
-            if not pd.isna(dates['Third Quarter']):
-                third_quarter_date = datetime.strptime(dates['Third Quarter'], '%d %b')
-                third_quarter_date = third_quarter_date.replace(year=year)
-                phases_dates_list.append(third_quarter_date)
-                third_quarter_date_day = third_quarter_date.day
-            else:
-                third_quarter_date_day = -1
-                
-            # Calculate the number of days to fill between the start and end date
-            start_date = phases_dates_list[0]
-            end_date = phases_dates_list[-1]
-            days_to_fill = (end_date-start_date).days
-
-            month = start_date.month
-            # Iterate over the days between start and end date to add the corresponding moon phase
-            for j in range(days_to_fill+1):
-                act_date = start_date + timedelta(days=j)
-                day = act_date.day
-                month = act_date.month
-                year = act_date.year
-
-                # Determine the moon phase for the current day based on the available phase dates
-                if day == new_moon_date_day:
-                    phase = 'New Moon'
-                elif day == first_quarter_date_day:
-                    phase = 'First Quarter'
-                elif day == full_moon_date_day:
-                    phase = 'Full Moon'
-                elif day == third_quarter_date_day:
-                    phase = 'Third Quarter'
-                else:
-                    phase = last_phase
-
-                # Append the converted data for the current day and phase
-                if phase is not None:
-                    converted_data.append({'Year': year, 'Month': month, 'Day': day, 'moon_phase': phase})
-                    last_phase = phase
-
-            # Add missing days between the dates of consecutive rows in the input DataFrame
-            if i < len(df) - 1:
-                next_dates = df.loc[i + 1, ['New Moon', 'First Quarter', 'Full Moon', 'Third Quarter']].values
-                next_dates_year = df.loc[i+1, 'Year']
-
-                if pd.notnull(next_dates[0]):
-                    end_date = datetime.strptime(next_dates[0], '%d %b')
-                    end_date = end_date.replace(year=next_dates_year)
-                    missing_days = (end_date - act_date).days
-                    for k in range(1, missing_days):
-                        new_date = act_date + timedelta(days=k)
-                        year = new_date.year
-                        month = new_date.month
-                        day = new_date.day
-                        converted_data.append({'Year': year, 'Month': month, 'Day': day, 'moon_phase': phase})
-                    continue
-                elif pd.notnull(next_dates[1]):
-                    end_date = datetime.strptime(next_dates[1], '%d %b')
-                    end_date = end_date.replace(year=next_dates_year)
-                    missing_days = (end_date - act_date).days
-                    for k in range(1, missing_days):
-                        new_date = act_date + timedelta(days=k)
-                        year = new_date.year
-                        month = new_date.month
-                        day = new_date.day
-                        converted_data.append({'Year': year, 'Month': month, 'Day': day, 'moon_phase': phase})
-                    continue
+        Returns:
+            pd.DataFrame: The calendar with the "date" (datetime) and "moon_phase" columns.
+        """
 
-                elif pd.notnull(next_dates[2]):
-                    end_date = datetime.strptime(next_dates[2], '%d %b')
-                    end_date = end_date.replace(year=next_dates_year)
-                    missing_days = (end_date - act_date).days
-                    for k in range(1, missing_days):
-                        new_date = act_date + timedelta(days=k)
-                        year = new_date.year
-                        month = new_date.month
-                        day = new_date.day
-                        converted_data.append({'Year': year, 'Month': month, 'Day': day, 'moon_phase': phase})
-                    continue
+        phases = ["New Moon", "First Quarter", "Full Moon", "Third Quarter"]
 
-                else:
-                    end_date = datetime.strptime(next_dates[3], '%d %b')
-                    end_date = end_date.replace(year=next_dates_year)
-                    missing_days = (end_date - act_date).days
-                    for k in range(1, missing_days):
-                        new_date = act_date + timedelta(days=k)
-                        month = new_date.month
-                        day = new_date.day
-                        converted_data.append({'Year': year, 'Month': month, 'Day': day, 'moon_phase': phase})
-                    continue
+        # One row per phase date (in the order of the rows and, in each row, of the phases)
+        df = df.reset_index(drop=True)
+        changes = df.reset_index().melt(id_vars=["index", "Year"], value_vars=phases, var_name="moon_phase", value_name="date")
+        changes = changes.dropna(subset=["date"])
+        changes["phase_order"] = changes["moon_phase"].map({phase: i for i, phase in enumerate(phases)})
+        changes = changes.sort_values(by=["index", "phase_order"])
 
-        # Save the converted moon phase data to a new DataFrame
-        converted_df = pd.DataFrame(converted_data)
-        
-        # Sort the converted DataFrame by date
-        converted_df = converted_df.sort_values(by=["Year", "Month", "Day"])
-        
-        # Select only the moon phases for the current and next day (specified in PROD/PREPROD CODE)
+        # Parse the dates with the year of their row
+        dates = pd.to_datetime(changes["date"] + " " + changes["Year"].astype(str), format="%d %b %Y")
+        first_dates = dates.groupby(changes["index"]).transform("first")
+        dates = dates.where(dates >= first_dates, dates + pd.DateOffset(years=1))
 
-        #PROD. CODE
-        if self.mode == "prod":
-            current_date = datetime.now().date()
-            next_date = current_date + timedelta(days=1)
+        calendar = pd.DataFrame({"date": dates.values, "moon_phase": changes["moon_phase"].values})
 
+        return calendar.sort_values(by="date", kind="stable").reset_index(drop=True)
 
-        #DEBUG. CODE
-        if self.mode == "debug":
-            current_date = datetime(year=2023, month=6, day=26)
-            next_date = datetime(year=2023, month=6, day=27)
-        #---------------
+    def lookup_moon_phases(self, calendar, dates) -> pd.DataFrame:
+        """
+        Looks up the moon phase of each date in the calendar of phase changes: the phase of the last change on or
+        before the date (a binary search, O(log n) per date). The dates before the first change or after the last
+        change of the calendar are not returned.
+
+        Parameters:
+            calendar (pd.DataFrame): The calendar of phase changes (see moon_phase_calendar).
+            dates (list): The dates (datetime, date or str) to look up.
 
-        # Filter moon phase data to current and next day
-        filtered_df = converted_df[
-            (converted_df["Year"] == current_date.year)
-            & (converted_df["Month"] == current_date.month)
-            & (converted_df["Day"] == current_date.day)
-            | (converted_df["Year"] == next_date.year)
-            & (converted_df["Month"] == next_date.month)
-            & (converted_df["Day"] == next_date.day)
-        ]
-
-        # Save the filtered moon phase data to a new CSV file named "moon_phases_processed.csv"
-        file_name = "moon_phases_processed.csv"
-        dst_file = os.path.join(self.temp_data_path, file_name)
-        filtered_df.to_csv(dst_file, index=False)
+        Returns:
+            pd.DataFrame: The "Year", "Month", "Day" and "moon_phase" of the dates found in the calendar, sorted by date.
+        """
+
+        dates = pd.to_datetime(pd.Series(dates)).dt.normalize().sort_values()
+        change_dates = calendar["date"].values
+
+        # Position of the last change on or before each date
+        positions = np.searchsorted(change_dates, dates.values, side="right") - 1
+        found = (positions >= 0) & (dates.values <= change_dates[-1]) if len(change_dates) > 0 else np.zeros(len(dates), dtype=bool)
+
+        dates = dates[found]
+
+        return pd.DataFrame({
+            "Year": dates.dt.year.values,
+            "Month": dates.dt.month.values,
+            "Day": dates.dt.day.values,
+            "moon_phase": calendar["moon_phase"].values[positions[found]]
+        })
 
     def preprocess_moonrise_moonset(self, file_name):
         """
@@ -850,34 +992,11 @@ class Preprocessor:
         # Sort values by date
         df = df.sort_values(by=["Year", "Month", "Day"])
 
-        # Select only the moonrise and moonset data for the current and next day (specified in PROD/PREPROD CODE)
-    
-        #PROD. CODE
-        if self.mode == "prod":
-            current_date = datetime.now().date()
-            next_date = current_date + timedelta(days=1)
- 
+        # Filter moon data to current and next day (see get_target_dates)
+        filtered_df = self.filter_target_dates(df)
 
-        #DEBUG. CODE
-        if self.mode == "debug":
-            current_date = datetime(year=2023, month=6, day=26)
-            next_date = datetime(year=2023, month=6, day=27)
-        #---------------
-        
-        # Filter moon data to current and next day
-        filtered_df = df[
-            (df["Year"] == current_date.year)
-            & (df["Month"] == current_date.month)
-            & (df["Day"] == current_date.day)
-            | (df["Year"] == next_date.year)
-            & (df["Month"] == next_date.month)
-            & (df["Day"] == next_date.day)
-        ]
-
-        # Save the filtered moonrise and moonset data to a new CSV file named "moonrise_moonset_processed.csv"
-        file_name = "moonrise_moonset_processed.csv"
-        dst_file = os.path.join(self.temp_data_path, file_name)
-        filtered_df.to_csv(dst_file, index=False)
+        # Store the filtered data as "moonrise_moonset_processed.csv" (temp_data)
+        self.store_temp_data(filtered_df, "moonrise_moonset_processed.csv")
 
     def preprocess_sunrise_sunset(self, file_name):
         """
@@ -911,34 +1030,11 @@ class Preprocessor:
         # Sort values by date
         df = df.sort_values(by=["Year", "Month", "Day"])
 
-        # Select only the sunrise and sunset data for the current and next day (specified in PROD/PREPROD CODE)
-        
-        #PROD. CODE
-        if self.mode == "prod":
-            current_date = datetime.now().date()
-            next_date = current_date + timedelta(days=1)
-    
+        # Filter sun data to current and next day (see get_target_dates)
+        filtered_df = self.filter_target_dates(df)
 
-        #DEBUG. CODE
-        if self.mode == "debug":
-            current_date = datetime(year=2023, month=6, day=26)
-            next_date = datetime(year=2023, month=6, day=27)
-        #---------------
-        
-        # Filter sun data to current and next day
-        filtered_df = df[
-            (df["Year"] == current_date.year)
-            & (df["Month"] == current_date.month)
-            & (df["Day"] == current_date.day)
-            | (df["Year"] == next_date.year)
-            & (df["Month"] == next_date.month)
-            & (df["Day"] == next_date.day)
-        ]
-
-        # Save the filtered sunrise and sunset data to a new CSV file named "sunrise_sunset_processed.csv"
-        file_name = "sunrise_sunset_processed.csv"
-        dst_file = os.path.join(self.temp_data_path, file_name)
-        filtered_df.to_csv(dst_file, index=False)
+        # Store the filtered data as "sunrise_sunset_processed.csv" (temp_data)
+        self.store_temp_data(filtered_df, "sunrise_sunset_processed.csv")
 
     def datetime_to_hours(self, datatime, format="%H:%M:%S"):
         """
@@ -991,16 +1087,20 @@ class Preprocessor:
         # Sort values by date
         df = df.sort_values(by=["Year", "Month", "Day"])
 
-        # Save the processed light prices data to a new CSV file named "light_prices_processed.csv"
-        file_name = "light_prices_processed.csv"
-        dst_file = os.path.join(self.temp_data_path, file_name)
-        df.to_csv(dst_file, index=False)    
+        # In date-range mode, select only the data of the target dates
+        if self.start_date is not None:
+            df = self.filter_target_dates(df)
+
+        # Store the processed light prices data as "light_prices_processed.csv" (temp_data)
+        self.store_temp_data(df, "light_prices_processed.csv")
         
 
 
     def merge_sky_data(self):
         """
-        Merge sky-related dataframes based on common columns.
+        Merge sky-related dataframes based on common columns. The processed data of the stages is merged in
+        a fixed order (SKY_DATA_FILES): the hourly data on "Year", "Month", "Day" and "Hour" and the daily data
+        on "Year", "Month" and "Day".
 
         Parameters:
             None
@@ -1009,34 +1109,46 @@ class Preprocessor:
             None    
         """
 
-        # Loop through the files in the temp_data_path directory.
-        for file_name in os.listdir(self.temp_data_path):
-            # Check if the file is a CSV file and does not contain "classified_nodes" or "google_events" in its name.
-            if file_name.endswith(".csv") and not "classified_nodes" in file_name and not "google_events" in file_name:
-                # Check if the file is related to previous data (contains "previous" in the name) or next data.
-                if not "previous" in file_name:
-                    # Create the file path and read the CSV file
-                    file_path = os.path.join(self.temp_data_path, file_name)
-                    other_df = pd.read_csv(file_path)
-
-                    # If "self.df_next" is empty, assign the "other_df" to it.
-                    if self.df_next.empty:
-                        self.df_next = other_df
-                    
-                    # Otherwise, merge "other_df" with "self.df_next" based on common columns "Year", "Month", "Day", and "Hour".
-                    else:
-                        # Check if the "Hour" column exists in both dataframes to determine the type of merge (inner or outer).
-                        if "Hour" in self.df_next.columns and "Hour" in other_df.columns:
-                            self.df_next = self.df_next.merge(other_df, on=["Year", "Month", "Day", "Hour"], how="inner")
-                        
-                        else:
-                            self.df_next = self.df_next.merge(other_df, on=["Year", "Month", "Day"], how="outer")
+        for file_name in SKY_DATA_FILES:
+            other_df = self.load_temp_data(file_name)
+            if other_df is None:
+                continue
 
+            # The hours are merged as strings (as read from the CSV files)
+            if "Hour" in other_df.columns:
+                other_df = other_df.assign(Hour=self.time_strings(other_df["Hour"]))
+
+            # If "self.df_next" is empty, assign the "other_df" to it.
+            if self.df_next.empty:
+                self.df_next = other_df
+            
+            # Otherwise, merge "other_df" with "self.df_next" based on common columns "Year", "Month", "Day", and "Hour".
+            else:
+                # Check if the "Hour" column exists in both dataframes to determine the type of merge (inner or outer).
+                if "Hour" in self.df_next.columns and "Hour" in other_df.columns:
+                    self.df_next = self.df_next.merge(other_df, on=["Year", "Month", "Day", "Hour"], how="inner")
+                
                 else:
-                    # If the file is related to previous data, read it into the "self.df_previous" dataframe
-                    file_path = os.path.join(self.temp_data_path, file_name)
-                    other_df = pd.read_csv(file_path)
-                    self.df_previous = other_df
+                    self.df_next = self.df_next.merge(other_df, on=["Year", "Month", "Day"], how="outer")
+
+        # In date-range mode, the data of each target day (the day and the day after it) is identified by a "target_date" column
+        # (the data of a date is repeated in the target days that need it)
+        if self.start_date is not None and not self.df_next.empty:
+            target_days = self.get_target_days()
+            target_dates = pd.DataFrame({
+                "target_date": [day.strftime("%Y-%m-%d") for day in target_days for _ in range(2)],
+                "date": [day + timedelta(days=offset) for day in target_days for offset in range(2)]
+            })
+            target_dates = pd.DataFrame({
+                "Year": target_dates["date"].dt.year, "Month": target_dates["date"].dt.month, "Day": target_dates["date"].dt.day,
+                "target_date": target_dates["target_date"]
+            })
+            self.df_next = self.df_next.merge(target_dates, on=["Year", "Month", "Day"], how="inner")
+
+        # The previous data is not merged with the next data
+        df_previous = self.load_temp_data(PREVIOUS_DATA_FILE)
+        if df_previous is not None:
+            self.df_previous = df_previous
                 
         
     def aggregated_sky_metrics(self,):
@@ -1050,46 +1162,29 @@ class Preprocessor:
             None
         """
 
-        # Initialize empty lists to store the computed metrics
-        upper_light_price_mean = []
-        is_night = []
-        is_day = []
-        needs_artif_light = []
-        moon_phase_mult = []
+        # The times of the day are compared as strings (as read from the CSV files)
+        df = self.df_next.assign(**{column: self.time_strings(self.df_next[column])
+                                    for column in TIME_COLUMNS if column in self.df_next.columns})
 
-        # Loop through each row in the DataFrame "self.df_next"
-        for index, row in self.df_next.iterrows():
-            # Compute whether the current row's "light_price_kwh" is higher than the mean of the entire "light_price_kwh" column
-            if row["light_price_kwh"] > self.df_next["light_price_kwh"].mean():
-                upper_light_price_mean.append(True)
-            else:
-                upper_light_price_mean.append(False)
+        # Compute whether each row's "light_price_kwh" is higher than the mean of the entire "light_price_kwh" column
+        # (the mean is computed once for all the rows, or once for each target day in date-range mode)
+        if "target_date" in df.columns:
+            light_price_mean = df.groupby("target_date")["light_price_kwh"].transform("mean")
+        else:
+            light_price_mean = df["light_price_kwh"].mean()
+        upper_light_price_mean = df["light_price_kwh"] > light_price_mean
 
-            # Check if the current row's "Hour" falls within the range of "Moonset" and "Moonrise" times
-            if row["Moonset"] < row["Hour"] < row["Moonrise"]:
-                is_night.append(True)
-            else:
-                is_night.append(False)
+        # Check if each row's "Hour" falls within the range of "Moonset" and "Moonrise" times
+        is_night = (df["Moonset"] < df["Hour"]) & (df["Hour"] < df["Moonrise"])
 
-            # Check if the current row's "Hour" falls within the range of "Sunset" and "Sunrise" times
-            if row["Sunset"] < row["Hour"] < row["Sunrise"]:
-                is_day.append(True)
-            else:
-                is_day.append(False)
-            
-            # Check if the current row's "Hour" falls within the range of "Start_civil_twilight" and "End_civil_twilight" times
-            if row["Start_civil_twilight"] < row["Hour"] < row["End_civil_twilight"]:
-                needs_artif_light.append(False)
-            else:
-                needs_artif_light.append(True)
-        
-            # Map the "moon_phase" value to a corresponding multiplier (1, 2, or 3)
-            if row["moon_phase"] == "New Moon":
-                moon_phase_mult.append(1)
-            elif row["moon_phase"] == "First Quarter" or row["moon_phase"] == "Third Quarter":
-                moon_phase_mult.append(2)
-            else: 
-                moon_phase_mult.append(3)
+        # Check if each row's "Hour" falls within the range of "Sunset" and "Sunrise" times
+        is_day = (df["Sunset"] < df["Hour"]) & (df["Hour"] < df["Sunrise"])
+
+        # Check if each row's "Hour" falls within the range of "Start_civil_twilight" and "End_civil_twilight" times
+        needs_artif_light = ~((df["Start_civil_twilight"] < df["Hour"]) & (df["Hour"] < df["End_civil_twilight"]))
+
+        # Map the "moon_phase" value to a corresponding multiplier (1, 2, or 3 for any other phase)
+        moon_phase_mult = df["moon_phase"].map(MOON_PHASE_MULTIPLIERS).fillna(3).astype(int)
 
         # Add the computed metrics as new columns to the DataFrame "self.df_next"
         self.df_next["upper_light_price_mean"] = upper_light_price_mean
@@ -1100,7 +1195,8 @@ class Preprocessor:
         
     def merge_events_data(self,):
         """
-        Merge the data from the "classified_nodes_processed.csv" file and the corresponding Google events data for each zone.
+        Merge the sky data and the corresponding Google events data for each zone, with the zone of each row in
+        the "zone" column (the key of the nodes of the zone in "classified_nodes_processed.csv").
         Store the merged DataFrames for each zone in "self.df_next_list".
 
         Parameters:
@@ -1110,19 +1206,15 @@ class Preprocessor:
             None        
         """
 
-        # Read the "classified_nodes_processed.csv" file into a DataFrame
-        file_path_classified_nodes = os.path.join(self.temp_data_path, "classified_nodes_processed.csv")
-        classified_nodes_df = pd.read_csv(file_path_classified_nodes)
-
         # Loop through each zone in the list of zones "self.zones"
         for zone in self.zones:
-            # Read the corresponding Google events data for the current zone
-            file_path_google_events = os.path.join(self.temp_data_path, f'google_events_processed_{zone}.csv')
-            google_events_zone = pd.read_csv(file_path_google_events)
+            # Get the corresponding Google events data for the current zone
+            google_events_zone = self.load_temp_data(f'google_events_processed_{zone}.csv')
 
             # Merge the Google events data with the "self.df_next" DataFrame on the columns "Year", "Month", "Day", and "Hour"
-            # If there are no Google events data for the current zone, create a deep copy of "self.df_next" and add NaN values for the missing columns            if len(google_events_zone) > 0:
-            if len(google_events_zone) > 0:    
+            # If there are no Google events data for the current zone, create a deep copy of "self.df_next" and add NaN values for the missing columns
+            if len(google_events_zone) > 0:
+                google_events_zone = google_events_zone.assign(Hour=self.time_strings(google_events_zone["Hour"]))
                 df_merged = self.df_next.merge(google_events_zone, on=["Year", "Month", "Day", "Hour"], how="left")
             else:
                 df_merged = copy.deepcopy(self.df_next)
@@ -1131,11 +1223,8 @@ class Preprocessor:
                     if column != "Year" and column != "Month" and column != "Day" and column != "Hour": 
                         df_merged[column] = np.nan
             
-            # Add additional columns from the "classified_nodes_df" DataFrame for the current zone to the merged DataFrame "df_merged"
-            df_merged["id_list"] = list(classified_nodes_df[classified_nodes_df["zone"] == zone]['id_list'])[0]
-            df_merged["type_list"] = list(classified_nodes_df[classified_nodes_df["zone"] == zone]['type_list'])[0]
-            df_merged["ebox_id_list"] = list(classified_nodes_df[classified_nodes_df["zone"] == zone]['ebox_id_list'])[0]
-            df_merged["coordinates_list"] = list(classified_nodes_df[classified_nodes_df["zone"] == zone]['coordinates_list'])[0]
+            # Add the zone of the rows (the nodes of the zone are kept once in the classified nodes, not in every hour)
+            df_merged["zone"] = zone
 
             # Store the merged DataFrame for the current zone in the list "self.df_next_list"
             self.df_next_list.append((zone, df_merged)) #aqui guardamos el df de esa zona
@@ -1144,9 +1233,11 @@ class Preprocessor:
     #SAVE OUTPUT DATA
     def save_output_data(self):
         """
-        Save the processed data to CSV files in the output data path.
-        Saves the DataFrames from self.df_next_list as separate CSV files based on their corresponding zones.
-        Also saves the self.df_previous DataFrame as a single CSV file.
+        Save the processed data in the output data path. With the "parquet" output format, the data of each
+        target day is saved in the store of processed data (see save_store_output_data). With the "csv" format,
+        saves the DataFrames from self.df_next_list as separate CSV files based on their corresponding zones,
+        the self.df_previous DataFrame as a single CSV file and the nodes of each zone ("processed_data_nodes.csv").
+        The output format and the days of the run are recorded in "last_run.json" (read by the recommender).
         
         Parameters:
             None
@@ -1154,6 +1245,29 @@ class Preprocessor:
         Returns:
             None
         """
+        # The store keeps the data of each day in its own partitions
+        if self.output_format == "parquet":
+            self.save_store_output_data()
+        # In date-range mode, the data of each day is saved in its own folder
+        elif self.start_date is not None:
+            self.save_date_range_output_data()
+        else:
+            self.save_csv_output_data()
+
+        write_last_run(self.output_data_path, self.output_format, [day.strftime("%Y-%m-%d") for day in self.get_target_days()],
+                       date_range=self.start_date is not None)
+
+    def save_csv_output_data(self):
+        """
+        Save the processed data of a single day as CSV files: the data of each zone, the previous data and the nodes of each zone.
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        """
+
         # Check if the "output_data_path" folder exists, if not, create it
         if not os.path.exists(self.output_data_path):
             os.makedirs(self.output_data_path)
@@ -1174,15 +1288,141 @@ class Preprocessor:
         # Save the "df_previous" DataFrame to a CSV file in the output data path
         self.df_previous.to_csv(dst_file, index=False)
 
+        # Save the nodes of each zone (one row per node, joined with the data of the zones by the "zone" column)
+        dst_file = os.path.join(self.output_data_path, "processed_data_nodes.csv")
+        self.load_temp_data("classified_nodes_processed.csv").to_csv(dst_file, index=False)
+
+    def save_date_range_output_data(self):
+        """
+        Save the processed data of the date-range mode: the files of each target day (the same files as the ones
+        of a single day) are saved in the folder "output_data/{YYYY-MM-DD}". The previous data of each day is
+        the weather data of the PREVIOUS_DAYS days up to the day.
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        """
+
+        # Date of each row of the previous data
+        previous_dates = pd.to_datetime(pd.DataFrame({"year": self.df_previous["Year"], "month": self.df_previous["Month"],
+                                                      "day": self.df_previous["Day"]}))
+
+        # Split the data of each zone by target day (once)
+        zones_days = [(zone, dict(tuple(df_zone.groupby("target_date", sort=False)))) for zone, df_zone in self.df_next_list]
+
+        for day in self.get_target_days():
+            target_date = day.strftime("%Y-%m-%d")
+
+            day_data_path = os.path.join(self.output_data_path, target_date)
+            if not os.path.exists(day_data_path):
+                os.makedirs(day_data_path)
+
+            # Save the data of the day of each zone
+            for zone, zone_days in zones_days:
+                if target_date not in zone_days:
+                    continue
+
+                dst_file = os.path.join(day_data_path, f'processed_data_next_{zone}.csv')
+                zone_days[target_date].drop(columns=["target_date"]).to_csv(dst_file, index=False)
+
+            # Save the previous data of the day
+            in_previous_days = (previous_dates > day - timedelta(days=PREVIOUS_DAYS)) & (previous_dates <= day)
+            dst_file = os.path.join(day_data_path, "processed_data_previous.csv")
+            self.df_previous[in_previous_days.values].to_csv(dst_file, index=False)
+
+            # Save the nodes of each zone
+            dst_file = os.path.join(day_data_path, "processed_data_nodes.csv")
+            self.load_temp_data("classified_nodes_processed.csv").to_csv(dst_file, index=False)
+
+
+    def save_store_output_data(self):
+        """
+        Save the processed data of each target day in the store of processed data ("output_data/processed_data",
+        see processed_data_store.py): the sky data once for all the zones, the events of each zone, the previous
+        weather data and the nodes of the zones.
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        """
+
+        store = ProcessedDataStore(os.path.join(self.output_data_path, "processed_data"))
+
+        # The times of the day are stored as strings (as in the CSV files)
+        df_sky = self.df_next.assign(**{column: self.time_strings(self.df_next[column])
+                                        for column in TIME_COLUMNS if column in self.df_next.columns})
+
+        # Events of each zone
+        events_by_zone = {}
+        for zone in self.zones:
+            df_events = self.load_temp_data(f'google_events_processed_{zone}.csv')
+            if len(df_events) > 0:
+                df_events = df_events.assign(Hour=self.time_strings(df_events["Hour"]))
+            events_by_zone[zone] = df_events
+
+        # Nodes of each zone
+        df_nodes = self.load_temp_data("classified_nodes_processed.csv")
+
+        # The hours of the previous data are also stored as strings (the same schema whether the weather data has been
+        # processed in this run or loaded from temp_data)
+        df_previous = self.df_previous.assign(Hour=self.time_strings(self.df_previous["Hour"]))
+
+        # Date of each row of the previous data
+        previous_dates = pd.to_datetime(pd.DataFrame({"year": df_previous["Year"], "month": df_previous["Month"],
+                                                      "day": df_previous["Day"]}))
+
+        for day in self.get_target_days():
+            target_date = day.strftime("%Y-%m-%d")
+
+            # Sky data and previous data of the day (in date-range mode, the previous data is the weather data of the
+            # PREVIOUS_DAYS days up to the day)
+            if self.start_date is not None:
+                df_sky_day = df_sky[df_sky["target_date"] == target_date].drop(columns=["target_date"]).reset_index(drop=True)
+                in_previous_days = (previous_dates > day - timedelta(days=PREVIOUS_DAYS)) & (previous_dates <= day)
+                df_previous_day = df_previous[in_previous_days.values]
+            else:
+                df_sky_day = df_sky
+                df_previous_day = df_previous
+
+            # Events of each zone in the hours of the day
+            sky_hours = pd.MultiIndex.from_frame(df_sky_day[["Year", "Month", "Day", "Hour"]])
+            events_day = {}
+            for zone, df_events in events_by_zone.items():
+                if len(df_events) > 0:
+                    df_events = df_events[pd.MultiIndex.from_frame(df_events[["Year", "Month", "Day", "Hour"]]).isin(sky_hours)]
+                events_day[zone] = df_events
+
+            store.write_date(target_date, df_sky_day, df_previous_day, events_day, df_nodes)
 
 
 #DEBUG MAIN
-def main():
-    preprocessor = Preprocessor(mode="debug", events_source="google")
+def main(start_date=None, end_date=None):
+    preprocessor = Preprocessor(mode="debug", events_source="google", start_date=start_date, end_date=end_date)
     preprocessor.get_input_data()
     preprocessor.preprocess_data()
     preprocessor.save_output_data()
 
 #main()
 
+if __name__ == "__main__":
+    # Date-range mode: preprocess the input data of several days at once (e.g. to backfill the history)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", help="Indicates the executation mode (debug or prod)", type=str, default="prod")
+    parser.add_argument("--events_source", help="Indicates the way to obtain the events (google or generator)", type=str, default="google")
+    parser.add_argument("--start_date", help="First day to preprocess (YYYY-MM-DD). By default, only the current day", type=str, default=None)
+    parser.add_argument("--end_date", help="Last day to preprocess (YYYY-MM-DD). By default, the start date", type=str, default=None)
+    parser.add_argument("--output_format", help="Format of the output data (parquet store or csv files)", type=str, default="parquet")
+    parser.add_argument("--stage_cache", help="Load the outputs of the stages whose inputs have not changed from the stage cache", action='store_true', default=False)
+    args = parser.parse_args()
+
+    preprocessor = Preprocessor(args.mode, args.events_source, start_date=args.start_date, end_date=args.end_date, output_format=args.output_format,
+                                use_stage_cache=args.stage_cache)
+    preprocessor.get_input_data()
+    preprocessor.preprocess_data()
+    preprocessor.save_output_data()
+
 
@@ -0,0 +1,373 @@
+import os
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# Columns shared by the hourly data of the sky and of the events
+HOUR_KEY_COLUMNS = ["Year", "Month", "Day", "Hour"]
+
+# File of the output folder of the Preprocessor with the output format and the days of its last run
+LAST_RUN_FILE = "last_run.json"
+
+
+def write_last_run(output_data_path, output_format, dates, date_range=False):
+    """
+    Records the output format and the days saved by the last run of the Preprocessor in its output folder, so the
+    recommender reads the data of that run (and not an older day of the store or older CSV files).
+
+    Parameters:
+        output_data_path (str): The output folder of the Preprocessor.
+        output_format (str): The output format of the run ("parquet" or "csv").
+        dates (list): The days saved by the run ("YYYY-MM-DD").
+        date_range (bool): If the run was in date-range mode (the CSV files of each day are in the folder of the day).
+
+    Returns:
+        None
+    """
+
+    os.makedirs(output_data_path, exist_ok=True)
+    with open(os.path.join(output_data_path, LAST_RUN_FILE), "w") as file:
+        json.dump({"output_format": output_format, "dates": list(dates), "date_range": date_range}, file)
+
+def read_last_run(output_data_path):
+    """
+    Reads the output format and the days saved by the last run of the Preprocessor (see write_last_run).
+
+    Parameters:
+        output_data_path (str): The output folder of the Preprocessor.
+
+    Returns:
+        dict: The "output_format", "dates" and "date_range" of the last run, or None if it has not been recorded.
+    """
+
+    file_path = os.path.join(output_data_path, LAST_RUN_FILE)
+    if not os.path.isfile(file_path):
+        return None
+
+    with open(file_path) as file:
+        return json.load(file)
+
+
+
+class ProcessedDataStore:
+    """
+    Columnar store (parquet) of the processed data of the Preprocessor, partitioned by date and zone:
+
+        sky/date={YYYY-MM-DD}/data.parquet                  Sky, weather and price data of the day (shared by all the zones)
+        previous/date={YYYY-MM-DD}/data.parquet             Weather data of the previous days
+        events/date={YYYY-MM-DD}/zone={zone}/data.parquet   Events of each zone and hour
+        nodes/date={YYYY-MM-DD}/data.parquet                Nodes of each zone (one row per node)
+
+    The shared data is stored once instead of once per zone, and the nodes are stored once per day and joined with
+    the data of each zone by the "zone" column. The readers only load the partitions and columns requested.
+    """
+
+    def __init__(self, store_path=None):
+        # Folder of the store
+        self.store_path = store_path if store_path else os.path.join("Preprocessor", "output_data", "processed_data")
+
+    def partition_path(self, table, date, zone=None):
+        """
+        Returns the folder of a partition of the store.
+
+        Parameters:
+            table (str): The table ("sky", "previous", "events" or "nodes").
+            date (str): The date of the partition ("YYYY-MM-DD").
+            zone (str, optional): The zone of the partition (only for the events).
+
+        Returns:
+            str: The path of the folder of the partition.
+        """
+
+        path = os.path.join(self.store_path, table, f"date={date}")
+        if zone is not None:
+            path = os.path.join(path, f"zone={zone}")
+
+        return path
+
+    #WRITE
+    def write_date(self, date, df_sky, df_previous, events_by_zone, df_nodes):
+        """
+        Writes the processed data of a day, replacing the previous data of the day (if any).
+
+        Parameters:
+            date (str): The date of the data ("YYYY-MM-DD").
+            df_sky (pd.DataFrame): The sky, weather and price data of each hour.
+            df_previous (pd.DataFrame): The weather data of the previous days.
+            events_by_zone (dict): Dictionary zone -> DataFrame with the events of each hour.
+            df_nodes (pd.DataFrame): The nodes with the "id", "type", "ebox_id", "lat", "lon" and "zone" columns.
+
+        Returns:
+            None
+        """
+
+        for table in ["sky", "previous", "events", "nodes"]:
+            shutil.rmtree(self.partition_path(table, date), ignore_errors=True)
+
+        self.write_table(df_sky, self.partition_path("sky", date))
+        self.write_table(df_previous, self.partition_path("previous", date))
+        self.write_table(df_nodes, self.partition_path("nodes", date))
+
+        for zone, df_events in events_by_zone.items():
+            self.write_table(df_events, self.partition_path("events", date, zone))
+
+    def write_table(self, df, partition_path):
+        """
+        Writes a DataFrame in the parquet file of a partition.
+
+        Parameters:
+            df (pd.DataFrame): The data of the partition.
+            partition_path (str): The folder of the partition.
+
+        Returns:
+            None
+        """
+
+        os.makedirs(partition_path, exist_ok=True)
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), os.path.join(partition_path, "data.parquet"))
+
+    #READ
+    def read_table(self, partition_path, columns=None) -> pd.DataFrame:
+        """
+        Reads the columns of the parquet file of a partition (see table_to_pandas).
+
+        Parameters:
+            partition_path (str): The folder of the partition.
+            columns (list, optional): The columns to read (the ones in the file). By default all the columns.
+
+        Returns:
+            pd.DataFrame: The data of the partition.
+        """
+
+        file_path = os.path.join(partition_path, "data.parquet")
+        if columns is not None:
+            file_columns = pq.read_schema(file_path).names
+            columns = [column for column in columns if column in file_columns]
+
+        return self.table_to_pandas(pq.read_table(file_path, columns=columns))
+
+    def table_to_pandas(self, table) -> pd.DataFrame:
+        """
+        Converts an Arrow table of the store to a DataFrame: the list columns as python lists and the missing values
+        of the object columns and of the lists as NaN (the same values as in the processed DataFrames).
+
+        Parameters:
+            table (pa.Table): The table.
+
+        Returns:
+            pd.DataFrame: The data of the table.
+        """
+
+        df = table.to_pandas()
+
+        for i, field in enumerate(table.schema):
+            if pa.types.is_list(field.type):
+                df[field.name] = [[np.nan if value is None else value for value in values] if values is not None else np.nan
+                                  for values in table.column(i).to_pylist()]
+            if df[field.name].dtype == object:
+                df[field.name] = df[field.name].where(df[field.name].notna(), np.nan)
+
+        return df
+
+    def dates(self,) -> list:
+        """
+        Returns the dates stored.
+
+        Parameters:
+            None
+
+        Returns:
+            list: The sorted dates ("YYYY-MM-DD").
+        """
+
+        sky_path = os.path.join(self.store_path, "sky")
+        if not os.path.isdir(sky_path):
+            return []
+
+        return sorted(folder.split("=", 1)[1] for folder in os.listdir(sky_path) if folder.startswith("date="))
+
+    def zones(self, date) -> list:
+        """
+        Returns the zones stored for a date.
+
+        Parameters:
+            date (str): The date ("YYYY-MM-DD").
+
+        Returns:
+            list: The sorted zones.
+        """
+
+        events_path = self.partition_path("events", date)
+        if not os.path.isdir(events_path):
+            return []
+
+        return sorted(folder.split("=", 1)[1] for folder in os.listdir(events_path) if folder.startswith("zone="))
+
+    def read_sky(self, date, columns=None) -> pd.DataFrame:
+        """
+        Reads the sky, weather and price data of a day.
+
+        Parameters:
+            date (str): The date ("YYYY-MM-DD").
+            columns (list, optional): The columns to read. By default all the columns.
+
+        Returns:
+            pd.DataFrame: The data of each hour.
+        """
+
+        return self.read_table(self.partition_path("sky", date), columns)
+
+    def read_previous(self, date, columns=None) -> pd.DataFrame:
+        """
+        Reads the weather data of the days previous to a day.
+
+        Parameters:
+            date (str): The date ("YYYY-MM-DD").
+            columns (list, optional): The columns to read. By default all the columns.
+
+        Returns:
+            pd.DataFrame: The weather data of each hour.
+        """
+
+        return self.read_table(self.partition_path("previous", date), columns)
+
+    def read_events(self, date, zone, columns=None) -> pd.DataFrame:
+        """
+        Reads the events of a zone of a day.
+
+        Parameters:
+            date (str): The date ("YYYY-MM-DD").
+            zone (str): The zone.
+            columns (list, optional): The columns to read. By default all the columns.
+
+        Returns:
+            pd.DataFrame: The events of each hour (lists with the values of each event).
+        """
+
+        return self.read_table(self.partition_path("events", date, zone), columns)
+
+    def read_nodes(self, date, zone=None, columns=None) -> pd.DataFrame:
+        """
+        Reads the nodes of a day (only the ones of a zone, if indicated).
+
+        Parameters:
+            date (str): The date ("YYYY-MM-DD").
+            zone (str, optional): The zone of the nodes. By default all the zones.
+            columns (list, optional): The columns to read. By default all the columns.
+
+        Returns:
+            pd.DataFrame: The nodes (one row per node).
+        """
+
+        file_path = os.path.join(self.partition_path("nodes", date), "data.parquet")
+        filters = [("zone", "=", zone)] if zone is not None else None
+
+        return pq.read_table(file_path, columns=columns, filters=filters).to_pandas()
+
+    def read_zone_data(self, date, zone, columns=None, df_sky=None) -> pd.DataFrame:
+        """
+        Reads the processed data of a zone of a day: the sky data of each hour with the events of the zone
+        and the zone of the rows (the same data as the "processed_data_next_{zone}.csv" file).
+        The nodes of the zone are read with read_nodes.
+
+        Parameters:
+            date (str): The date ("YYYY-MM-DD").
+            zone (str): The zone.
+            columns (list, optional): The columns to read. By default all the columns.
+            df_sky (pd.DataFrame, optional): The sky data of the day, if already read (to read it once for all the zones).
+
+        Returns:
+            pd.DataFrame: The data of each hour of the zone.
+        """
+
+        if df_sky is None:
+            df_sky = self.read_sky(date, None if columns is None else HOUR_KEY_COLUMNS + list(columns))
+        df = df_sky.copy()
+
+        # Add the events of the zone (NaN in the hours without events)
+        events_columns = None if columns is None else [column for column in columns if column.startswith("events_")]
+        if events_columns is None or events_columns:
+            df_events = self.read_events(date, zone, None if events_columns is None else HOUR_KEY_COLUMNS + events_columns)
+            if len(df_events) > 0:
+                df = df.merge(df_events, on=HOUR_KEY_COLUMNS, how="left")
+            else:
+                for column in df_events.columns:
+                    if column not in HOUR_KEY_COLUMNS:
+                        df[column] = np.nan
+
+        # Add the zone of the rows (the key of the nodes of the zone)
+        df["zone"] = zone
+
+        if columns is not None:
+            df = df[[column for column in df.columns if column in columns]]
+
+        return df
+
+    def read_zones_data(self, date, zones=None, columns=None, df_sky=None) -> pd.DataFrame:
+        """
+        Reads the processed data of several zones of a day stacked in one frame: the sky data of each hour repeated
+        for each zone, with the events of the zone and the zone of the rows (the rows of each zone are the ones of
+        read_zone_data, one zone after another). The events of all the zones are joined with the sky data at once.
+
+        Parameters:
+            date (str): The date ("YYYY-MM-DD").
+            zones (list, optional): The zones. By default all the zones of the day.
+            columns (list, optional): The columns to read. By default all the columns.
+            df_sky (pd.DataFrame, optional): The sky data of the day, if already read.
+
+        Returns:
+            pd.DataFrame: The data of each hour of each zone.
+        """
+
+        zones = self.zones(date) if zones is None else list(zones)
+        if df_sky is None:
+            df_sky = self.read_sky(date, None if columns is None else HOUR_KEY_COLUMNS + list(columns))
+
+        # Sky data of each hour repeated for each zone
+        df = df_sky.iloc[np.tile(np.arange(len(df_sky)), len(zones))].reset_index(drop=True)
+        df["zone"] = np.repeat(np.array(zones, dtype=object), len(df_sky))
+
+        # Add the events of all the zones (NaN in the hours without events)
+        events_columns = None if columns is None else [column for column in columns if column.startswith("events_")]
+        if zones and (events_columns is None or events_columns):
+            events_list = []
+            for zone in zones:
+                df_events = self.read_events(date, zone, None if events_columns is None else HOUR_KEY_COLUMNS + events_columns)
+                df_events["zone"] = zone
+                events_list.append(df_events)
+            # The columns are in the order of the events of the zones with events (the first frames of the concatenation)
+            events_list.sort(key=lambda df_events: len(df_events) == 0)
+            df_events = pd.concat(events_list, ignore_index=True)
+
+            df = df.merge(df_events, on=HOUR_KEY_COLUMNS + ["zone"], how="left")
+
+            # Same order of the columns as read_zone_data (the zone at the end)
+            df = df[[column for column in df.columns if column != "zone"] + ["zone"]]
+
+        if columns is not None:
+            df = df[[column for column in df.columns if column in columns]]
+
+        return df
+
+    def copy_date(self, date, dst_store_path):
+        """
+        Copies the partitions of a day to another store.
+
+        Parameters:
+            date (str): The date ("YYYY-MM-DD").
+            dst_store_path (str): The folder of the other store.
+
+        Returns:
+            None
+        """
+
+        dst_store = ProcessedDataStore(dst_store_path)
+        for table in ["sky", "previous", "events", "nodes"]:
+            dst_path = dst_store.partition_path(table, date)
+            shutil.rmtree(dst_path, ignore_errors=True)
+            shutil.copytree(self.partition_path(table, date), dst_path)
@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import threading
+
+
+class StageCache:
+    """
+    Content-addressed cache of the outputs of the preprocessing stages. The key of a stage run is a hash of
+    the contents of its input files, its parameters and the code version (the source of the modules that process
+    the data), so a stage whose inputs, parameters and code have not changed loads its cached outputs instead of
+    being recomputed. Each entry is a pickle file ("{stage}/{key}.pkl") with the DataFrames stored by the stage
+    and the seconds it took; only the max_entries_per_stage most recent entries of each stage are kept.
+    """
+
+    def __init__(self, cache_path=None, code_files=(), max_entries_per_stage=10):
+        # Folder of the cache
+        self.cache_path = cache_path if cache_path else os.path.join("Preprocessor", "cache", "stages")
+        self.max_entries_per_stage = max_entries_per_stage
+
+        # Code version: hash of the source files of the modules that process the data
+        self.code_version = self.hash_files(code_files)
+
+        # Number of stages loaded from the cache (hits) and computed (misses), seconds saved by the hits
+        # and result of each stage ("hit" or "miss") with the seconds saved
+        self.stats = {"hits": 0, "misses": 0, "seconds_saved": 0.0}
+        self.results = {}
+
+        # The stages run in several threads
+        self.lock = threading.Lock()
+
+    def hash_files(self, file_paths) -> str:
+        """
+        Computes a hash of the names and contents of some files (the missing files are hashed as missing).
+
+        Parameters:
+            file_paths (list): Paths of the files.
+
+        Returns:
+            str: The hexadecimal hash.
+        """
+
+        digest = hashlib.sha256()
+        for file_path in file_paths:
+            digest.update(os.path.basename(file_path).encode("utf-8"))
+            if not os.path.isfile(file_path):
+                digest.update(b"<missing>")
+                continue
+
+            with open(file_path, "rb") as file:
+                for chunk in iter(lambda: file.read(1 << 20), b""):
+                    digest.update(chunk)
+
+        return digest.hexdigest()
+
+    def key(self, stage_name, input_files, params) -> str:
+        """
+        Computes the key of a stage run.
+
+        Parameters:
+            stage_name (str): Name of the stage.
+            input_files (list): Paths of the files read by the stage.
+            params (dict): Parameters of the stage (serializable as JSON).
+
+        Returns:
+            str: The hexadecimal key.
+        """
+
+        digest = hashlib.sha256()
+        digest.update(stage_name.encode("utf-8"))
+        digest.update(self.code_version.encode("utf-8"))
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(self.hash_files(input_files).encode("utf-8"))
+
+        return digest.hexdigest()
+
+    def entry_path(self, stage_name, key) -> str:
+        return os.path.join(self.cache_path, stage_name, f"{key}.pkl")
+
+    def load(self, stage_name, key):
+        """
+        Loads the outputs of a stage run from the cache and records the hit or miss.
+
+        Parameters:
+            stage_name (str): Name of the stage.
+            key (str): Key of the stage run (see key).
+
+        Returns:
+            dict: The outputs of the stage (file name in temp_data -> DataFrame), or None if they are not cached.
+        """
+
+        start = time.perf_counter()
+
+        entry = None
+        entry_path = self.entry_path(stage_name, key)
+        if os.path.isfile(entry_path):
+            try:
+                with open(entry_path, "rb") as file:
+                    entry = pickle.load(file)
+                # Mark the entry as used (the least recently used entries are evicted)
+                os.utime(entry_path)
+            except Exception:
+                entry = None
+
+        with self.lock:
+            if entry is None:
+                self.stats["misses"] += 1
+                self.results[stage_name] = {"result": "miss", "seconds_saved": 0.0}
+                return None
+
+            seconds_saved = max(0.0, entry["seconds"] - (time.perf_counter() - start))
+            self.stats["hits"] += 1
+            self.stats["seconds_saved"] += seconds_saved
+            self.results[stage_name] = {"result": "hit", "seconds_saved": seconds_saved}
+
+        return entry["outputs"]
+
+    def save(self, stage_name, key, outputs, seconds):
+        """
+        Saves the outputs of a stage run in the cache and evicts the least recently used entries of the stage.
+
+        Parameters:
+            stage_name (str): Name of the stage.
+            key (str): Key of the stage run (see key).
+            outputs (dict): The outputs of the stage (file name in temp_data -> DataFrame).
+            seconds (float): The seconds the stage took.
+
+        Returns:
+            None
+        """
+
+        stage_path = os.path.join(self.cache_path, stage_name)
+        os.makedirs(stage_path, exist_ok=True)
+
+        # Write to a temporary file and rename it, so an interrupted run does not leave a broken entry
+        entry_path = self.entry_path(stage_name, key)
+        with open(entry_path + ".tmp", "wb") as file:
+            pickle.dump({"outputs": outputs, "seconds": seconds}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(entry_path + ".tmp", entry_path)
+
+        entries = [os.path.join(stage_path, file_name) for file_name in os.listdir(stage_path) if file_name.endswith(".pkl")]
+        entries.sort(key=os.path.getmtime, reverse=True)
+        for old_entry in entries[self.max_entries_per_stage:]:
+            os.remove(old_entry)
+
+    def report(self,) -> str:
+        """
+        Returns a table with the result of each cached stage (hit or miss) and the seconds saved.
+
+        Parameters:
+            None
+
+        Returns:
+            str: The report of the cache.
+        """
+
+        width = max([len("Stage")] + [len(stage_name) for stage_name in self.results])
+
+        lines = [f"{'Stage':<{width}}  {'Cache':>5}  {'Saved (s)':>9}"]
+        for stage_name, result in self.results.items():
+            lines.append(f"{stage_name:<{width}}  {result['result']:>5}  {result['seconds_saved']:>9.3f}")
+
+        lines.append(f"Cache: {self.stats['hits']} hits, {self.stats['misses']} misses, {self.stats['seconds_saved']:.3f} s saved")
+
+        return "\n".join(lines)
@@ -0,0 +1,157 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class Stage:
+    """
+    Step of a StageGraph: a function with the names of the data it needs (inputs) and the data it produces (outputs).
+    """
+
+    def __init__(self, name, function, inputs=(), outputs=()):
+        self.name = name
+        self.function = function
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+
+
+class StageGraph:
+    """
+    Runs a set of stages in the order given by their inputs and outputs. A stage starts as soon as the stages that
+    produce its inputs have finished, so the independent stages run concurrently on a pool of threads.
+    The stages share their data through the object they belong to (e.g. the Preprocessor), so they run in threads
+    of the same process. The time of each stage is recorded in "timings".
+    """
+
+    def __init__(self, max_workers=None):
+        # Maximum number of stages running at the same time (1 runs the stages one after another)
+        self.max_workers = max_workers
+
+        # Stages of the graph (in the order they were added)
+        self.stages = []
+
+        # Start (seconds since the start of the run) and duration in seconds of each stage of the last run
+        self.timings = {}
+
+        # Duration in seconds of the last run
+        self.total_seconds = 0.0
+
+    def add_stage(self, name, function, inputs=(), outputs=()):
+        """
+        Adds a stage to the graph.
+
+        Parameters:
+            name (str): Name of the stage.
+            function (callable): Function (without arguments) that runs the stage.
+            inputs (list): Names of the data that the stage needs (produced by other stages).
+            outputs (list): Names of the data that the stage produces.
+
+        Returns:
+            None
+        """
+
+        if any(stage.name == name for stage in self.stages):
+            raise ValueError(f"There is already a stage named '{name}'")
+
+        self.stages.append(Stage(name, function, inputs, outputs))
+
+    def dependencies(self,):
+        """
+        Computes the stages that each stage has to wait for (the producers of its inputs).
+
+        Parameters:
+            None
+
+        Returns:
+            dict: Dictionary stage name -> set of names of the stages it depends on.
+        """
+
+        # Stage that produces each data
+        producers = {}
+        for stage in self.stages:
+            for output in stage.outputs:
+                if output in producers:
+                    raise ValueError(f"The data '{output}' is produced by the stages '{producers[output]}' and '{stage.name}'")
+                producers[output] = stage.name
+
+        dependencies = {}
+        for stage in self.stages:
+            missing = [data for data in stage.inputs if data not in producers]
+            if missing:
+                raise ValueError(f"No stage produces the inputs {missing} of the stage '{stage.name}'")
+            dependencies[stage.name] = {producers[data] for data in stage.inputs}
+
+        return dependencies
+
+    def run(self,):
+        """
+        Runs all the stages, each one when its dependencies have finished. If a stage fails, no more stages
+        are started and its exception is raised once the running stages have finished.
+
+        Parameters:
+            None
+
+        Returns:
+            dict: The timings of the stages (see "timings").
+        """
+
+        dependencies = self.dependencies()
+        stages = {stage.name: stage for stage in self.stages}
+
+        self.timings = {}
+        start = time.perf_counter()
+
+        def run_stage(stage):
+            # Run the stage and record when it started and how long it took
+            stage_start = time.perf_counter()
+            stage.function()
+            self.timings[stage.name] = {"start": stage_start - start, "seconds": time.perf_counter() - stage_start}
+
+        pending = [stage.name for stage in self.stages]
+        finished = set()
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                # Start the stages whose dependencies have finished (in the order they were added)
+                for name in [name for name in pending if dependencies[name] <= finished]:
+                    pending.remove(name)
+                    running[executor.submit(run_stage, stages[name])] = name
+
+                if not running:
+                    raise ValueError(f"The stages {pending} have circular dependencies")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    if future.exception() is not None:
+                        # Wait for the running stages and raise the error of the stage
+                        wait(running)
+                        raise future.exception()
+                    finished.add(name)
+
+        self.total_seconds = time.perf_counter() - start
+
+        return self.timings
+
+    def report(self,):
+        """
+        Returns a table with the start and the duration of each stage of the last run.
+
+        Parameters:
+            None
+
+        Returns:
+            str: The report of the timings of the stages.
+        """
+
+        width = max([len("Stage")] + [len(stage.name) for stage in self.stages])
+
+        lines = [f"{'Stage':<{width}}  {'Start (s)':>9}  {'Time (s)':>8}"]
+        for stage in self.stages:
+            if stage.name in self.timings:
+                timing = self.timings[stage.name]
+                lines.append(f"{stage.name:<{width}}  {timing['start']:>9.3f}  {timing['seconds']:>8.3f}")
+
+        stages_seconds = sum(timing["seconds"] for timing in self.timings.values())
+        lines.append(f"Total: {self.total_seconds:.3f} s ({stages_seconds:.3f} s of stages)")
+
+        return "\n".join(lines)
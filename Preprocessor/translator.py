@@ -0,0 +1,296 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from deep_translator import GoogleTranslator
+
+
+class TranslationBackend:
+    """
+    Interface of the services used by the Translator. A backend translates a batch of texts at once.
+    """
+
+    # Name of the backend (the cached translations of each backend are kept apart)
+    name = ""
+
+    def translate_batch(self, texts: list, source: str, target: str) -> list:
+        """
+        Translates a batch of texts.
+
+        Parameters:
+            texts (list): Texts to translate.
+            source (str): Language of the texts ("auto" to detect it).
+            target (str): Language of the translations.
+
+        Returns:
+            list: The translation of each text (in the same order), or None for the texts that could not be translated.
+        """
+
+        raise NotImplementedError
+
+
+class GoogleTranslationBackend(TranslationBackend):
+    """
+    Translates with Google Translate (deep_translator). The texts of a batch are packed in as few requests
+    as possible (joined by new lines, up to the characters limit of a request) instead of one request per text.
+    A request that fails only leaves its own texts untranslated.
+    """
+
+    name = "google"
+
+    def __init__(self, max_request_chars=4500):
+        # Maximum number of characters of each request (Google Translate accepts up to 5000)
+        self.max_request_chars = max_request_chars
+
+    def translate_batch(self, texts: list, source: str, target: str) -> list:
+        """
+        Translates a batch of texts with Google Translate.
+
+        Parameters:
+            texts (list): Texts to translate.
+            source (str): Language of the texts ("auto" to detect it).
+            target (str): Language of the translations.
+
+        Returns:
+            list: The translation of each text (in the same order), or None for the texts of the failed requests.
+        """
+
+        translator = GoogleTranslator(source=source, target=target)
+
+        translations = []
+        for request in self.pack_requests(texts):
+            try:
+                if len(request) == 1:
+                    request_translations = [translator.translate(request[0])]
+                else:
+                    # If the lines do not come back one per text, the texts of the request are translated one by one
+                    translation = translator.translate("\n".join(request))
+                    lines = translation.split("\n") if isinstance(translation, str) else []
+                    if len(lines) == len(request):
+                        request_translations = [line.strip() for line in lines]
+                    else:
+                        request_translations = [translator.translate(text) for text in request]
+            except Exception as e:
+                # The texts of a failed request are left untranslated (not cached, so they are translated in the next run)
+                print(f"Warning: translation request failed ({type(e).__name__}: {e}), {len(request)} texts left untranslated")
+                translations.extend([None] * len(request))
+                continue
+
+            # Google Translate returns nothing for some texts (e.g. only punctuation or emojis): they are kept as they are
+            translations.extend(translation if isinstance(translation, str) and translation.strip() else text
+                                for translation, text in zip(request_translations, request))
+
+        return translations
+
+    def pack_requests(self, texts: list) -> list:
+        """
+        Groups consecutive texts in requests of up to max_request_chars characters. The texts with new lines
+        or longer than the limit go in a request of their own.
+
+        Parameters:
+            texts (list): Texts to translate.
+
+        Returns:
+            list: List of requests (each one a list of texts).
+        """
+
+        requests = []
+        request = []
+        request_chars = 0
+        for text in texts:
+            if "\n" in text or len(text) >= self.max_request_chars:
+                if request:
+                    requests.append(request)
+                    request = []
+                    request_chars = 0
+                requests.append([text])
+                continue
+
+            if request and request_chars + len(text) + 1 > self.max_request_chars:
+                requests.append(request)
+                request = []
+                request_chars = 0
+
+            request.append(text)
+            request_chars += len(text) + 1
+
+        if request:
+            requests.append(request)
+
+        return requests
+
+
+class IdentityTranslationBackend(TranslationBackend):
+    """
+    Local stand-in of a translation service that returns the texts unchanged (for offline runs and benchmarks).
+    """
+
+    name = "identity"
+
+    def translate_batch(self, texts: list, source: str, target: str) -> list:
+        return list(texts)
+
+
+# Translation backends that can be selected by name
+TRANSLATION_BACKENDS = {
+    "google": GoogleTranslationBackend,
+    "identity": IdentityTranslationBackend
+}
+
+
+class TranslationCache:
+    """
+    Persistent cache of translations keyed by source text, target language and backend, stored in a SQLite database.
+    When it holds more than max_entries translations the least recently used ones are evicted.
+    """
+
+    def __init__(self, db_file=None, max_entries=100000):
+        # SQLite database of the cache
+        self.db_file = db_file if db_file else os.path.join("Preprocessor", "cache", "translations.sqlite")
+        self.max_entries = max_entries
+
+        if os.path.dirname(self.db_file):
+            os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+
+        with self.connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "text TEXT NOT NULL, target TEXT NOT NULL, backend TEXT NOT NULL, translation TEXT NOT NULL, "
+                "last_used REAL NOT NULL, PRIMARY KEY (text, target, backend))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)")
+
+    @contextmanager
+    def connect(self,):
+        """
+        Opens a connection to the database that commits the changes (or rolls them back on error) and is closed at the end.
+
+        Parameters:
+            None
+
+        Returns:
+            sqlite3.Connection: Connection to the database.
+        """
+
+        connection = sqlite3.connect(self.db_file)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def get_many(self, texts: list, target: str, backend: str) -> dict:
+        """
+        Returns the cached translations of the texts and marks them as used.
+
+        Parameters:
+            texts (list): Source texts.
+            target (str): Language of the translations.
+            backend (str): Name of the backend that translated them.
+
+        Returns:
+            dict: Dictionary text -> translation with the texts found in the cache.
+        """
+
+        found = {}
+        texts = list(texts)
+        with self.connect() as connection:
+            # Query the texts in chunks (SQLite limits the number of parameters of a query)
+            for start in range(0, len(texts), 500):
+                chunk = texts[start:start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = connection.execute(
+                    f"SELECT text, translation FROM translations WHERE target = ? AND backend = ? AND text IN ({placeholders})",
+                    [target, backend] + chunk
+                ).fetchall()
+                found.update(rows)
+
+            now = time.time()
+            connection.executemany("UPDATE translations SET last_used = ? WHERE text = ? AND target = ? AND backend = ?",
+                                   [(now, text, target, backend) for text in found])
+
+        return found
+
+    def put_many(self, translations: dict, target: str, backend: str) -> None:
+        """
+        Stores translations in the cache and evicts the least recently used ones if it is full.
+
+        Parameters:
+            translations (dict): Dictionary text -> translation.
+            target (str): Language of the translations.
+            backend (str): Name of the backend that translated them.
+
+        Returns:
+            None
+        """
+
+        now = time.time()
+        with self.connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO translations (text, target, backend, translation, last_used) VALUES (?, ?, ?, ?, ?)",
+                [(text, target, backend, translation, now) for text, translation in translations.items()]
+            )
+
+            n_entries = connection.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            if n_entries > self.max_entries:
+                connection.execute(
+                    "DELETE FROM translations WHERE rowid IN "
+                    "(SELECT rowid FROM translations ORDER BY last_used LIMIT ?)",
+                    (n_entries - self.max_entries,)
+                )
+
+
+class Translator:
+    """
+    Translates texts through a TranslationCache: only the texts that are not in the cache (each one once)
+    are sent to the translation backend, in batches.
+    """
+
+    def __init__(self, backend="google", cache=None, batch_size=100):
+        # Translation service (name of TRANSLATION_BACKENDS or a TranslationBackend instance)
+        if isinstance(backend, str):
+            if backend not in TRANSLATION_BACKENDS:
+                raise ValueError(f"Unknown translation backend '{backend}'. Use one of {list(TRANSLATION_BACKENDS)}")
+            backend = TRANSLATION_BACKENDS[backend]()
+        self.backend = backend
+
+        self.cache = cache if cache is not None else TranslationCache()
+
+        # Maximum number of texts sent to the backend at once
+        self.batch_size = batch_size
+
+        # Number of texts found in the cache and translated by the backend
+        self.stats = {"hits": 0, "misses": 0}
+
+    def translate(self, texts: list, target="en", source="auto") -> list:
+        """
+        Translates a list of texts. The values that are not strings or are empty are returned unchanged.
+
+        Parameters:
+            texts (list): Texts to translate.
+            target (str): Language of the translations. Default is English.
+            source (str): Language of the texts. Default is "auto" (detected by the backend).
+
+        Returns:
+            list: The translation of each text (in the same order).
+        """
+
+        # Unique texts to translate
+        unique_texts = list(dict.fromkeys(text for text in texts if isinstance(text, str) and text.strip()))
+
+        translations = self.cache.get_many(unique_texts, target, self.backend.name)
+        missing = [text for text in unique_texts if text not in translations]
+
+        self.stats["hits"] += len(unique_texts) - len(missing)
+        self.stats["misses"] += len(missing)
+
+        # Translate the cache misses in batches (the texts that could not be translated are not cached and are returned unchanged)
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            new_translations = {text: translation for text, translation in zip(batch, self.backend.translate_batch(batch, source, target))
+                                if isinstance(translation, str)}
+            self.cache.put_many(new_translations, target, self.backend.name)
+            translations.update(new_translations)
+
+        return [translations.get(text, text) if isinstance(text, str) else text for text in texts]
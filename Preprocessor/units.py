@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+
+def parse_quantity(values: pd.Series) -> pd.Series:
+    """
+    Parses the number of the raw strings with units of a column (e.g. "72 °F", "0.01 in", "85 %").
+    Each different string is parsed once and the numbers are mapped to the rows with an array operation,
+    so the columns of repeated readings are parsed at the cost of their unique values.
+
+    Parameters:
+        values (pd.Series): The raw strings (the numeric columns are returned as floats).
+
+    Returns:
+        pd.Series: The numbers (float, NaN for the missing values) with the index of the column.
+    """
+
+    # Values already parsed
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float)
+
+    codes, uniques = pd.factorize(values)
+    numbers = pd.Index(uniques, dtype=object).str.split().str[0].astype(float).values
+
+    return pd.Series(np.where(codes >= 0, numbers[codes], np.nan), index=values.index)
+
+def fahrenheit_to_celsius(degrees_fahrenheit):
+    """
+    Converts temperatures from Fahrenheit to Celsius (rounded to 2 decimals).
+
+    Parameters:
+        degrees_fahrenheit (pd.Series or np.ndarray): The temperatures in Fahrenheit.
+
+    Returns:
+        pd.Series or np.ndarray: The temperatures in Celsius.
+    """
+
+    return np.round((degrees_fahrenheit - 32) * (5/9), 2)
+
+def inches_to_mm(inches):
+    """
+    Converts lengths (precipitation) from inches to millimeters.
+
+    Parameters:
+        inches (pd.Series or np.ndarray): The lengths in inches.
+
+    Returns:
+        pd.Series or np.ndarray: The lengths in millimeters.
+    """
+
+    return inches * 25.4
+
+def inches_to_hpa(inches):
+    """
+    Converts pressures from inches of mercury to hectopascals (rounded to 2 decimals).
+
+    Parameters:
+        inches (pd.Series or np.ndarray): The pressures in inches of mercury.
+
+    Returns:
+        pd.Series or np.ndarray: The pressures in hectopascals.
+    """
+
+    return np.round(inches * 33.863889532610884, 2)
+
+def mph_to_kmh(mph):
+    """
+    Converts speeds (wind) from miles per hour to kilometers per hour (rounded to 2 decimals).
+
+    Parameters:
+        mph (pd.Series or np.ndarray): The speeds in miles per hour.
+
+    Returns:
+        pd.Series or np.ndarray: The speeds in kilometers per hour.
+    """
+
+    return np.round(mph * 1.609344, 2)
+
+
+# Conversions of the raw weather columns: raw column -> (processed column, conversion).
+# The processed columns are added in this order
+WEATHER_UNIT_CONVERSIONS = {
+    "temp_farenheit": ("temp_celsius", fahrenheit_to_celsius),
+    "precip_inches": ("precip_mm", inches_to_mm),
+    "pressure_inches": ("pressure_hPa", inches_to_hpa),
+    "wind_vel": ("wind_vel_kmh", mph_to_kmh)
+}
+
+def convert_weather_units(df: pd.DataFrame, percent_columns: list, conversions=None) -> pd.DataFrame:
+    """
+    Parses the raw weather columns with units of a DataFrame and converts them to the units of the processed data.
+    The percentages are parsed in place and the converted columns are added (the raw columns are kept).
+
+    Parameters:
+        df (pd.DataFrame): The raw weather data.
+        percent_columns (list): The columns with percentages (e.g. "85 %").
+        conversions (dict, optional): The conversions to apply (see WEATHER_UNIT_CONVERSIONS). By default all of them.
+
+    Returns:
+        pd.DataFrame: The weather data with the numeric columns.
+    """
+
+    conversions = WEATHER_UNIT_CONVERSIONS if conversions is None else conversions
+
+    # Parse the percentages
+    for column in percent_columns:
+        df[column] = parse_quantity(df[column])
+
+    # Add the converted columns
+    for raw_column, (column, conversion) in conversions.items():
+        df[column] = conversion(parse_quantity(df[raw_column]))
+
+    return df
@@ -6,6 +6,10 @@ import os
 import shutil
 from datetime import datetime, timedelta
 
+# Columns of the recommendations and savings files used in the plots
+RECOMMENDED_COLUMNS = ["Date", "Hour", "real_intensity", "recommended_intensity"]
+SAVINGS_COLUMNS = ["zone", "zone_savings"]
+
 class Visualizer:
     """
     A class for visualizing real intensity vs recommended intensity data 
@@ -91,9 +95,9 @@ class Visualizer:
                 # Extract the zone from the file name
                 zone = (os.path.splitext(file_name)[0]).split("_intensity_")[1]
 
-                #Read the csv and save DataFrame in a variable
+                #Read the csv (only the columns plotted) and save DataFrame in a variable
                 file_path = os.path.join(self.input_data_path, file_name)
-                df = pd.read_csv(file_path)
+                df = pd.read_csv(file_path, usecols=RECOMMENDED_COLUMNS)
 
                 # Combine 'Date' and 'Hour' columns to create a new 'datetime' column
                 df['datetime'] = df['Date'] + ' ' + df['Hour']
@@ -142,9 +146,9 @@ class Visualizer:
         # Loop through each "savings" CSV file in the input_data_path
         for file_name in os.listdir(self.input_data_path):
             if file_name.endswith(".csv") and "savings" in file_name:
-                 #Read the csv and save DataFrame in a variable
+                 #Read the csv (only the columns plotted) and save DataFrame in a variable
                 file_path = os.path.join(self.input_data_path, file_name)
-                df = pd.read_csv(file_path)
+                df = pd.read_csv(file_path, usecols=SAVINGS_COLUMNS)
 
                 # Set the style of seaborn (optional, just for aesthetics)
                 sns.set(style="whitegrid")